@@ -1,5 +1,28 @@
 #Check_I2C_Speed.py
 
+"""
+Check the configured I2C clock and measure what the bus actually delivers.
+
+`profile_bus` times the ways the capture scripts read the ADXL357 and reports,
+per read strategy, the achieved reads per second, latency percentiles and the
+highest ADXL357 ODR the strategy can keep up with. It runs against whatever
+`open_bus` returns, so ACCEL_BUS_BACKEND=sim (or sim-spi/spi) profiles the
+simulated bus or the SPI transport with the same code.
+"""
+
+import time
+from typing import Optional
+
+import numpy as np
+
+import adxl357
+from device_discovery import find_address
+from i2c_bus import open_bus
+
+ADXL357_ADDRESS = 0x1D
+FIFO_BURST_BYTES = adxl357.FIFO_DEPTH * adxl357.FIFO_WORD_BYTES
+
+
 def check_i2c_speed_config():
     try:
         with open('/boot/firmware/config.txt', 'r') as file:
@@ -17,5 +40,101 @@ def check_i2c_speed_config():
         print(f"Error reading /boot/firmware/config.txt: {e}")
 
 
+def read_strategies(bus, address: int) -> dict:
+    """
+    The read strategies to profile.
+
+    Returns:
+        dict: name -> (read function, samples delivered per read, bytes per read, buffered).
+              Buffered strategies (the FIFO) tolerate latency spikes, polled ones do not.
+    """
+    def single_registers():
+        bus.read_byte_data(address, adxl357.REG_ZDATA3)
+        bus.read_byte_data(address, adxl357.REG_ZDATA3 + 1)
+        bus.read_byte_data(address, adxl357.REG_ZDATA3 + 2)
+
+    def fifo_burst():
+        bus.read_byte_data(address, adxl357.REG_FIFO_ENTRIES)
+        adxl357.read_register_block(bus, address, adxl357.REG_FIFO_DATA, FIFO_BURST_BYTES)
+
+    return {
+        "single_register_z": (single_registers, 1, 3, False),
+        "block_3_byte_z": (lambda: bus.read_i2c_block_data(address, adxl357.REG_ZDATA3, 3), 1, 3, False),
+        "block_9_byte_xyz": (lambda: adxl357.read_xyz_raw(bus, address), 1, adxl357.XYZ_DATA_BYTES, False),
+        "fifo_burst_xyz": (fifo_burst, adxl357.FIFO_DEPTH // 3, FIFO_BURST_BYTES + 1, True),
+    }
+
+
+def max_supported_odr(sample_rate: float) -> Optional[float]:
+    """Highest ADXL357 ODR not above `sample_rate`, or None if even the slowest is out of reach."""
+    supported = [odr for odr in adxl357.ODR_RATES_HZ if odr <= sample_rate]
+    return max(supported) if supported else None
+
+
+def profile_bus(bus, address: int = ADXL357_ADDRESS, reads: int = 2000, warmup: int = 50) -> dict:
+    """
+    Time every read strategy back to back.
+
+    Polled strategies must finish every read within one sample period, so their
+    sustainable rate is set by the 99th-percentile latency. The FIFO buffers 32
+    samples, which absorbs latency spikes, so its sustainable rate uses the mean.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int, optional): I2C address of the ADXL357. Defaults to 0x1D.
+        reads (int, optional): Timed reads per strategy. Defaults to 2000.
+        warmup (int, optional): Untimed reads before each strategy. Defaults to 50.
+
+    Returns:
+        dict: Per strategy: reads_per_s, bytes_per_s, latency_us percentiles (p50, p90, p99, max),
+              sample_rate (samples/s the strategy sustains) and max_odr_hz.
+    """
+    results = {}
+    for name, (read, samples_per_read, bytes_per_read, buffered) in read_strategies(bus, address).items():
+        for _ in range(warmup):
+            read()
+        latency_ns = np.empty(reads, dtype=np.int64)
+        start = time.perf_counter_ns()
+        for i in range(reads):
+            t0 = time.perf_counter_ns()
+            read()
+            latency_ns[i] = time.perf_counter_ns() - t0
+        total_s = (time.perf_counter_ns() - start) * 1e-9
+
+        latency_us = latency_ns / 1e3
+        p50, p90, p99 = np.percentile(latency_us, [50, 90, 99])
+        limiting_us = np.mean(latency_us) if buffered else p99
+        sample_rate = samples_per_read / (limiting_us * 1e-6)
+        results[name] = {
+            "reads_per_s": reads / total_s,
+            "bytes_per_s": reads * bytes_per_read / total_s,
+            "latency_us": {"p50": float(p50), "p90": float(p90), "p99": float(p99), "max": float(latency_us.max())},
+            "sample_rate": float(sample_rate),
+            "max_odr_hz": max_supported_odr(sample_rate),
+        }
+    return results
+
+
+def print_bus_profile(results: dict, goal_sampling_rate: Optional[float] = None) -> None:
+    """
+    Print a table of `profile_bus` results.
+
+    Args:
+        results (dict): Output of `profile_bus`.
+        goal_sampling_rate (Optional[float]): Rate to check every strategy against. Defaults to None.
+    """
+    print(f"{'strategy':<18} {'reads/s':>9} {'kB/s':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>9} {'max ODR':>8}")
+    for name, result in results.items():
+        latency = result["latency_us"]
+        odr = f"{result['max_odr_hz']:g}" if result["max_odr_hz"] else "-"
+        line = (f"{name:<18} {result['reads_per_s']:>9.0f} {result['bytes_per_s'] / 1e3:>7.1f} "
+                f"{latency['p50']:>8.1f} {latency['p99']:>8.1f} {latency['max']:>9.1f} {odr:>8}")
+        if goal_sampling_rate:
+            line += "  ok" if (result["max_odr_hz"] or 0) >= goal_sampling_rate else "  too slow"
+        print(line)
+
+
 if __name__ == "__main__":
     check_i2c_speed_config()
+    bus = open_bus(1)
+    print_bus_profile(profile_bus(bus, find_address('adxl357', bus, default=ADXL357_ADDRESS)), adxl357.DEFAULT_ODR_HZ)
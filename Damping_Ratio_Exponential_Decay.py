@@ -13,6 +13,7 @@ from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
 from typing import Optional
+from run_format import load_accelerometer_data
 
 def find_damping_ratio(file_path:Optional[str] = None, show_plot:bool = True, save_fig:bool = True, save_fig_path:Optional[str] = None) -> None:
     """
@@ -31,18 +32,14 @@ def find_damping_ratio(file_path:Optional[str] = None, show_plot:bool = True, sa
         # Open a file selector window
         root = Tk()
         root.withdraw()  # Hide the root window
-        file_path = askopenfilename(title="Select the numpy array file", filetypes=[("Numpy files", "*.npy")])
+        file_path = askopenfilename(title="Select the numpy array file", filetypes=[("Accelerometer runs", "*.npy *.npz")])
 
         if not file_path: 
             print("No file selected")
             return
 
-    # Load the data from the selected file
-    data = np.load(file_path)
-
-    # Assuming data format: [timestamps, accelerometer_data]
-    timestamps = data[0]
-    accelerometer_data = data[1]
+    # Load the data from the selected file (.npy [timestamps, accelerometer_data] or .npz run file)
+    timestamps, accelerometer_data = load_accelerometer_data(file_path)
 
     max_acc = max(accelerometer_data)
 
@@ -154,18 +151,14 @@ def find_damping_ratio(file_path:Optional[str] = None, show_plot:bool = True, sa
         # Open a file selector window
         root = Tk()
         root.withdraw()  # Hide the root window
-        file_path = askopenfilename(title="Select the numpy array file", filetypes=[("Numpy files", "*.npy")])
+        file_path = askopenfilename(title="Select the numpy array file", filetypes=[("Accelerometer runs", "*.npy *.npz")])
 
         if not file_path: 
             print("No file selected")
             return
 
-    # Load the data from the selected file
-    data = np.load(file_path)
-
-    # Assuming data format: [timestamps, accelerometer_data]
-    timestamps = data[0]
-    accelerometer_data = data[1]
+    # Load the data from the selected file (.npy [timestamps, accelerometer_data] or .npz run file)
+    timestamps, accelerometer_data = load_accelerometer_data(file_path)
 
     max_acc = max(accelerometer_data)
 
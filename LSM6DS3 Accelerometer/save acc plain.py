@@ -1,27 +1,31 @@
 import os
+import sys
 import time
 import numpy as np
 from datetime import datetime
-import smbus2 as smbus
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
-
-# I2C address
-I2C_ADDRESS = 0x1D  # 0x1D for the ADXL357
+# The shared bus layer lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from i2c_bus import open_bus
+from device_discovery import find_address
 
 # ADXL357 Register Addresses
 REG_XDATA3 = 0x08
 REG_YDATA3 = 0x0B
 REG_ZDATA3 = 0x0E
 
-# Initialize the I2C bus
-bus = smbus.SMBus(1)
+# Initialize the I2C bus (set ACCEL_BUS_BACKEND=sim to run against the emulator)
+bus = open_bus(1)
+
+# I2C address of the ADXL357, looked up in the cached device scan when a capture starts
+I2C_ADDRESS = None
 
-def read_accel_data():
-    # Read 3 bytes for each axis
-    x = bus.read_i2c_block_data(I2C_ADDRESS, REG_XDATA3, 3)
-    y = bus.read_i2c_block_data(I2C_ADDRESS, REG_YDATA3, 3)
-    z = bus.read_i2c_block_data(I2C_ADDRESS, REG_ZDATA3, 3)
+def read_accel_data(i2c_bus=None):
+    # Read all three axes in one 9-byte transaction, from the module bus unless another one is given
+    i2c = i2c_bus or bus
+    xyz = i2c.read_i2c_block_data(I2C_ADDRESS, REG_XDATA3, 9)
+    x, y, z = xyz[0:3], xyz[3:6], xyz[6:9]
     
     # Combine bytes and apply two's complement
     x_data = (x[0] << 12) | (x[1] << 4) | (x[2] >> 4)
@@ -38,6 +42,9 @@ def save_accelerometer_numpy(x_data, y_data, z_data, timestamps, run_time):
     np.save(os.path.join(run_time, 'accelerometer_data.npy'), np.array([timestamps, x_data, y_data, z_data]))
 
 def collect_accelerometer_data():
+    global I2C_ADDRESS
+    if I2C_ADDRESS is None:
+        I2C_ADDRESS = find_address('adxl357', bus, default=0x1D)
     # Global variables for accelerometer data
     x_axis_data = []
     y_axis_data = []
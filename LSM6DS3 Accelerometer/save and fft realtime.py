@@ -7,19 +7,22 @@ import os
 import time
 import numpy as np
 from datetime import datetime
-import smbus
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
 from collections import deque
 from threading import Thread, Lock
 from itertools import islice
+# The shared bus layer lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from i2c_bus import open_bus
+from device_discovery import find_address
 
-# I2C bus initialization
-bus = smbus.SMBus(1)
+# I2C bus initialization (set ACCEL_BUS_BACKEND=sim to run against the emulator)
+bus = open_bus(1)
 
 # Constants
 sensitivity = 0.061 * 4
-LSM6DS3_ADDR = 0x6A
+LSM6DS3_ADDR = None  # 0x6A or 0x6B, looked up from the cached device scan on first use
 CTRL1_XL = 0x10
 CTRL2_G = 0x11
 CTRL3_C = 0x12
@@ -62,8 +65,16 @@ p2.showGrid(x=False, y=True)
 ax = p2.getAxis('bottom')
 ax.setTicks([[(v, str(v)) for v in np.arange(0, int(freq/2)+1, 100)]])
 
+def resolve_lsm6ds3_address():
+    """Find the LSM6DS3 address on first use, so importing this module does not probe the bus."""
+    global LSM6DS3_ADDR
+    if LSM6DS3_ADDR is None:
+        LSM6DS3_ADDR = find_address('lsm6ds3', bus, default=0x6A)
+    return LSM6DS3_ADDR
+
 # Initialize LSM6DS3
 def init_LSM6DS3():
+    resolve_lsm6ds3_address()
     bus.write_byte_data(LSM6DS3_ADDR, CTRL1_XL, 0b10101100)
     bus.write_byte_data(LSM6DS3_ADDR, CTRL2_G, 0x00)
     bus.write_byte_data(LSM6DS3_ADDR, CTRL3_C, 0x44)
@@ -73,6 +84,7 @@ def init_LSM6DS3():
 # Read accelerometer data
 def read_acc_data():
     global data
+    resolve_lsm6ds3_address()
     while True:
         try:
             z_l = bus.read_byte_data(LSM6DS3_ADDR, OUTZ_L_XL)
@@ -95,7 +107,6 @@ def data_input():
 
 t = Thread(target=data_input)
 t.daemon = True
-t.start()
 
 # Update function for PyQtGraph
 def update():
@@ -109,5 +120,6 @@ timer.start(100)
 
 if __name__ == '__main__':
     init_LSM6DS3()
+    t.start()
     if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
         QtWidgets.QApplication.instance().exec_()
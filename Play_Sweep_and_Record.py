@@ -6,38 +6,53 @@ os.environ['DISPLAY'] = ':0'  # to run the code from ssh but show on the monitor
 import json
 import numpy as np
 from datetime import datetime
-import sounddevice as sd
 import threading
+from functools import partial
 from typing import Optional
 import queue
-from scipy.io import wavfile
-from scipy.signal import chirp
 import time
 from tkinter import filedialog, Tk
-import smbus2 as smbus
-
-# I2C bus initialization
-bus = smbus.SMBus(1)
-
-# Define register addresses for ADXL357
-I2C_ADDRESS = 0x1D  # 0x1D for the ADXL357, SOMETIMES 0X53 depending on configuration
+from i2c_bus import open_bus
+from device_discovery import find_address
+from adxl357 import (SCALE_FACTORS, REG_ZDATA3, XYZ_DATA_BYTES, FifoOverrunError, FifoSampleCounter,
+                     FilterSettings, collect_fifo_blocks, configure_adxl357, decode_raw_counts, decode_raw_to_g,
+                     decode_xyz_raw_to_g, read_xyz_raw, save_filter_settings, set_filter)
+from sample_pacer import DeadlinePacer
+from telemetry import AcquisitionStats, start_telemetry
+from capture_buffer import CaptureBuffer
+from stream_writer import ChunkedWriter
+from run_format import save_run, convert_npy_to_run
+from sample_clock import SampleClock, fit_sample_clock, save_sample_clock
+from shm_sampler import SamplerProcess
+from sweep_stream import (SweepParameters, SweepPlayer, playback_on_sample_index, regenerate_sweep,
+                          save_sweep_parameters)
+from realtime import apply_realtime_policy, restore_policy, save_timing_report, timing_report
+
+# I2C bus initialization (set ACCEL_BUS_BACKEND=sim to run against the emulator)
+bus = open_bus(1)
+
+# I2C address of the ADXL357 (0x1D, or 0x53 depending on its ASEL pin), looked up in the cached device scan on first use
+I2C_ADDRESS = None
+
+def resolve_i2c_address(i2c_bus=None):
+    """Find the ADXL357 address on first use, so importing this module does not probe the bus."""
+    global I2C_ADDRESS
+    if I2C_ADDRESS is None:
+        I2C_ADDRESS = find_address('adxl357', i2c_bus or bus, default=0x1D)
+    return I2C_ADDRESS
 
 # Define the measurement range (options: ±10g, ±20g, ±40g)
 MEASUREMENT_RANGE = 10  # Change this value to 10, 20, or 40 for different ranges
 
-# ADXL357 Register Addresses
-REG_ZDATA3 = 0x0E
-REG_ODR_FILTER = 0x28
-REG_POWER_CTL = 0x2D  # Power Control register
-REG_RESET = 0x2F      # Reset register
-REG_RANGE = 0x2C      # Range register for ADXL357
-
 # Global variables for accelerometer data
-z_axis_data = []  # List to store Z-axis accelerometer data
-timestamps_data = []  # List to store timestamps
-start_time = None  # Start time for data collection
-last_time = None  # Last timestamp for data collection
+capture = None  # CaptureBuffer holding timestamps and Z-axis data of the current run
+start_ns = None  # Start of data collection on the monotonic nanosecond clock
+sample_clock = None  # SampleClock fitted to the last capture
+three_axis = False  # Record X, Y and Z instead of Z only
+timing = None  # Scheduling policy and sample-interval histogram of the last capture
+sensor_filter = FilterSettings()  # ODR and on-chip filter corners; the capture runs at sensor_filter.odr_hz
 running = False  # Flag to control the data collection thread
+stats = AcquisitionStats()  # Counters read by the telemetry thread
 
 # Queue for passing data between threads
 data_queue = queue.Queue()
@@ -111,7 +126,9 @@ def generate_sine_waveform(
         sample_rate: int = 44100
     ) -> tuple[np.ndarray, np.ndarray]:
     """
-    Generate a linear sine sweep waveform.
+    Generate a whole linear sine sweep waveform in memory.
+
+    Playback no longer needs this (see `SweepPlayer`); it is kept for analysis of short sweeps.
 
     Args:
         start_freq (float): Start frequency of the sine sweep.
@@ -122,9 +139,7 @@ def generate_sine_waveform(
     Returns:
         tuple[np.ndarray, np.ndarray]: The generated waveform and its corresponding time array.
     """
-    t = np.linspace(0, sweep_time, int(sample_rate * sweep_time))
-    waveform = chirp(t, f0=start_freq, f1=end_freq, t1=sweep_time, method='linear')
-    return waveform, t
+    return regenerate_sweep(SweepParameters(start_freq, end_freq, sweep_time, sample_rate))
 
 def save_accelerometer_numpy(
         z_data: np.ndarray, 
@@ -136,8 +151,8 @@ def save_accelerometer_numpy(
     Save accelerometer data to a numpy file.
 
     Args:
-        z_data (np.ndarray): Z-axis accelerometer data.
-        timestamps (np.ndarray): Timestamps corresponding to the Z-axis data.
+        z_data (np.ndarray): Z-axis accelerometer data, or (N, 3) X, Y, Z data.
+        timestamps (np.ndarray): Timestamps corresponding to the accelerometer data.
         run_time (str): The timestamp when the session was run.
         filename (str): Filename for saving the data.
 
@@ -145,32 +160,21 @@ def save_accelerometer_numpy(
         str: The file path where the data was saved.
     """
     npy_file_path = os.path.join(run_time, f'{filename}.npy')
-    np.save(npy_file_path, np.array([timestamps, z_data]))
+    values = np.reshape(z_data, (len(z_data), -1))
+    # Write the rows straight into the file instead of stacking a second copy in memory
+    out = np.lib.format.open_memmap(npy_file_path, mode='w+', dtype=np.float64, shape=(1 + values.shape[1], len(values)))
+    out[0] = timestamps
+    out[1:] = values.T
+    out.flush()
+    del out
     return npy_file_path
 
 def init_ADXL357() -> None:
     """
     Initialize the ADXL357 accelerometer by resetting it, setting the ODR, and enabling measurement mode.
     """
-    # Reset the device
-    bus.write_byte_data(I2C_ADDRESS, REG_RESET, 0x52)  # Reset command
-    time.sleep(0.1)  # Wait for the reset to complete
-    
-    # Set ODR to 4000 Hz, no filters applied
-    bus.write_byte_data(I2C_ADDRESS, REG_ODR_FILTER, 0x00)
-    
-    # Set the measurement range
-    if MEASUREMENT_RANGE == 10:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x01)  # ±10g
-    elif MEASUREMENT_RANGE == 20:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x02)  # ±20g
-    elif MEASUREMENT_RANGE == 40:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x03)  # ±40g
-    else:
-        raise ValueError("Invalid measurement range specified. Use 10, 20, or 40.")
-    
-    # Enable measurement mode
-    bus.write_byte_data(I2C_ADDRESS, REG_POWER_CTL, 0x06)
+    # ODR and filter corners from sensor_filter (4000 Hz, no high-pass unless a band was chosen)
+    configure_adxl357(bus, resolve_i2c_address(), MEASUREMENT_RANGE, sensor_filter.register)
 
     print("ADXL357 initialized and set to measurement mode.")
 
@@ -178,61 +182,199 @@ def read_acc_data() -> None:
     """
     Read Z-axis data from the ADXL357 accelerometer, calculate the corresponding time, and store it.
 
-    The function reads data from the accelerometer, calculates the acceleration in g, 
-    and appends it to the global lists z_axis_data and timestamps_data.
+    The function stores the three raw Z-axis bytes, or all nine XYZ bytes read in a single
+    transaction when `three_axis` is set, in the global capture buffer; they are decoded
+    to g in one vectorized pass per chunk or at save time.
     """
-    global last_time
     try:
-        # Read Z-axis data from the accelerometer
-        z = bus.read_i2c_block_data(I2C_ADDRESS, REG_ZDATA3, 3)
-    
-        # Combine bytes and apply two's complement
-        z_data = (z[0] << 12) | (z[1] << 4) | (z[2] >> 4)
-    
-        if z_data & (1 << 19):
-            z_data -= (1 << 20)
-    
-        # Adjust the scaling factor based on the range
-        if MEASUREMENT_RANGE == 10:
-            z_g = z_data * 0.0000187  # Scale for 10g range
-        elif MEASUREMENT_RANGE == 20:
-            z_g = z_data * 0.0000187 * 2  # Scale for 20g range (double the 10g range)
-        elif MEASUREMENT_RANGE == 40:
-            z_g = z_data * 0.0000187 * 4  # Scale for 40g range (four times the 10g range)
-    
-        # Calculate the current time and sampling rate
-        current_time = time.time()
-        if last_time is not None:
-            interval = current_time - last_time
-            sampling_rate = 1 / interval
-        last_time = current_time
-        elapsed_time = current_time - start_time
+        # Read Z-axis (or X, Y and Z) data from the accelerometer
+        if three_axis:
+            z = read_xyz_raw(bus, I2C_ADDRESS)
+        else:
+            z = bus.read_i2c_block_data(I2C_ADDRESS, REG_ZDATA3, 3)
+    except Exception as e:
+        stats.error(e)
+        return
+
+    # Stamp the sample on the monotonic nanosecond clock, relative to the start of the capture
+    current_ns = time.monotonic_ns()
+
+    # Not a read error: a failed stream writer raises here and ends the capture
+    with data_lock:
+        capture.append((current_ns - start_ns) * 1e-9, z)
+    stats.record(current_ns * 1e-9)
+
+def read_fifo_data(duration: float) -> None:
+    """
+    Drain the ADXL357 FIFO in bursts for a specified duration and store the raw Z-axis (or XYZ) words.
 
+    Timestamps are derived from the sample index and the sensor ODR, with the
+    index skipping the samples lost in FIFO overruns. The burst arrival times are
+    fitted against the sample count to measure the real ODR, which is stored in
+    the global sample_clock.
+
+    Args:
+        duration (float): The duration for which to read data in seconds.
+    """
+    global sample_clock
+    arrival_times, arrival_counts = [], []
+    counter = FifoSampleCounter(sensor_filter.odr_hz, on_overrun=stats.error)
+    for block in collect_fifo_blocks(bus, I2C_ADDRESS, duration, sensor_filter.odr_hz, on_overrun=counter.overrun):
+        if not running:
+            break
+        arrival_ns = time.monotonic_ns()
+        timestamps = counter.timestamps(len(block), arrival_ns)
         with data_lock:
-            z_axis_data.append(z_g)
-            timestamps_data.append(elapsed_time)
+            capture.extend(timestamps, block.reshape(len(block), -1) if three_axis else block[:, 2])
+        # Telemetry gets the burst's arrival on the wall clock, not the index-based timestamps
+        stats.record_block(len(block), arrival_ns * 1e-9)
+        arrival_times.append((arrival_ns - start_ns) * 1e-9)
+        arrival_counts.append(counter.n)
+    if counter.lost:
+        print(f"Warning: {counter.overruns} FIFO overruns lost about {counter.lost} samples.")
+    sample_clock = fit_sample_clock(arrival_times, arrival_counts, sensor_filter.odr_hz, source='fifo')
+
+def read_sampler_process(
+        duration: float,
+        use_fifo: bool = False,
+        cpu: Optional[int] = None,
+        rt_priority: Optional[int] = None
+    ) -> Optional[dict]:
+    """
+    Sample in a separate process and copy its samples from shared memory into the global capture buffer.
 
-            print(f"Z: {z_g:.3f}g, Time: {elapsed_time:.6f}s, "
-                  f"Sampling Rate: {sampling_rate:.2f} Hz, len(z_axis_data):{len(z_axis_data)}")
-    except Exception as e:
-        print(f"Error: {e}")
+    The sampler process does the timed bus reads, so GIL contention with audio
+    playback in this process no longer delays them. This function only drains
+    the shared ring buffer every 10 ms.
+
+    Args:
+        duration (float): The duration for which to read data in seconds.
+        use_fifo (bool): Burst-read the sensor FIFO in the sampler process. Defaults to False.
+        cpu (Optional[int]): Core to pin the sampler process to. Defaults to None.
+        rt_priority (Optional[int]): SCHED_FIFO priority for the sampler process. Defaults to None.
+
+    Returns:
+        Optional[dict]: The scheduling policy the sampler process ran with, if one was requested.
+    """
+    global start_ns, sample_clock
+    overruns = 0
 
-def read_data_thread(duration: float) -> None:
+    def store(timestamps: np.ndarray, raw: np.ndarray) -> None:
+        nonlocal overruns
+        with data_lock:
+            capture.extend(timestamps, raw)
+        # FIFO timestamps are index / ODR, so telemetry gets the time the samples reached this process
+        stats.record_block(len(timestamps), time.monotonic_ns() * 1e-9 if use_fifo else timestamps[-1])
+        for _ in range(sampler.overruns - overruns):
+            stats.error(FifoOverrunError("ADXL357 FIFO overrun, samples were lost"))
+        overruns = sampler.overruns
+
+    sampler = SamplerProcess(duration, use_fifo, three_axis, I2C_ADDRESS, MEASUREMENT_RANGE, sensor_filter.odr_hz,
+                             cpu=cpu, fifo_priority=rt_priority)
+    sampler.start()
+    while not sampler.finished:
+        if not running:
+            sampler.stop()
+        sampler.drain(store)
+        time.sleep(0.01)
+    sampler.drain(store)
+    result = sampler.join()
+
+    if "error" in result:
+        print(f"Sampler process failed: {result['error']}")
+    start_ns = result.get("start_ns", start_ns)
+    if result.get("missed"):
+        print(f"Missed {result['missed']} sample deadlines")
+    if result.get("dropped"):
+        print(f"Warning: {result['dropped']} samples were dropped because the ring buffer was full.")
+    if result.get("overruns"):
+        print(f"Warning: {result['overruns']} FIFO overruns lost about {result['lost']} samples.")
+    if result.get("sample_clock"):
+        sample_clock = SampleClock.from_dict(result["sample_clock"])
+    return result.get("policy")
+
+def read_data_thread(
+        duration: float,
+        use_fifo: bool = False,
+        telemetry_interval: Optional[float] = 0.5,
+        stream_path: Optional[str] = None,
+        xyz: bool = False,
+        isolate: bool = False,
+        cpu: Optional[int] = None,
+        rt_priority: Optional[int] = None
+    ) -> None:
     """
     Start a thread that continuously reads accelerometer data for a specified duration.
 
     Args:
         duration (float): The duration for which to read data in seconds.
+        use_fifo (bool): Burst-read the sensor FIFO instead of one transaction per sample. Defaults to False.
+        telemetry_interval (Optional[float]): Seconds between console status lines. None or 0 is silent. Defaults to 0.5.
+        stream_path (Optional[str]): If given, samples are flushed in chunks to this .npy path during
+            the capture and the path is queued instead of the data. Defaults to None.
+        xyz (bool): Record X, Y and Z instead of Z only. Defaults to False.
+        isolate (bool): Run the sampling loop in its own process (see `read_sampler_process`). Defaults to False.
+        cpu (Optional[int]): Core to pin the sampling loop (thread or process) to. Defaults to None.
+        rt_priority (Optional[int]): SCHED_FIFO priority for the sampling loop; falls back to the default
+            scheduler without privileges. Defaults to None.
     """
-    global start_time, last_time, running
-    start_time = time.time()
-    last_time = start_time
+    global start_ns, running, stats, capture, sample_clock, three_axis, timing
+    three_axis = xyz
+    sample_clock = None
+    raw_bytes, decode = (XYZ_DATA_BYTES, decode_xyz_raw_to_g) if xyz else (3, decode_raw_to_g)
+    if stream_path:
+        capture = ChunkedWriter(stream_path, channels=3 if xyz else 1, raw_shape=(raw_bytes,), raw_dtype=np.uint8,
+                                decode=partial(decode, measurement_range=MEASUREMENT_RANGE))
+    else:
+        capture = CaptureBuffer.for_duration(duration, sensor_filter.odr_hz, channels=raw_bytes, dtype=np.uint8)
+    stats, reporter = start_telemetry(telemetry_interval)
+    start_ns = time.monotonic_ns()
     running = True
-    while running and (time.time() - start_time) < duration:
-        read_acc_data()
-    running = False
-    # After reading is done, put the data in the queue
-    data_queue.put((np.array(z_axis_data), np.array(timestamps_data)))
+    policy = None
+    try:
+        if isolate:
+            policy = read_sampler_process(duration, use_fifo, cpu, rt_priority)
+        else:
+            if cpu is not None or rt_priority is not None:
+                policy = apply_realtime_policy(cpu, rt_priority)
+            try:
+                if use_fifo:
+                    read_fifo_data(duration)
+                else:
+                    # Sleep between samples instead of free-running so the audio thread gets CPU time
+                    pacer = DeadlinePacer(sensor_filter.odr_hz)
+                    start_ns = pacer.start()
+                    while running and pacer.elapsed() < duration:
+                        pacer.wait()
+                        read_acc_data()
+                    if pacer.missed:
+                        print(f"Missed {pacer.missed} sample deadlines ({100 * pacer.missed / pacer.index:.2f}%)")
+            finally:
+                if policy is not None:
+                    restore_policy(policy)
+        running = False
+        reporter.stop()
+        # After reading is done, hand the saved path or views of the data to the saving side
+        if stream_path:
+            acc_file_path = capture.close()
+            timestamps = np.load(acc_file_path, mmap_mode='r')[0]
+        else:
+            timestamps = capture.timestamps
+        if sample_clock is None:
+            sample_clock = fit_sample_clock(timestamps, nominal_rate=sensor_filter.odr_hz)
+        # FIFO timestamps are index / ODR, so only the scheduling policy is recorded for them
+        timing = timing_report(policy, None if use_fifo else timestamps, sensor_filter.odr_hz)
+    except Exception as e:
+        # Hand the failure (e.g. a failed stream writer) to the saving side instead of leaving it waiting
+        running = False
+        reporter.stop()
+        data_queue.put(e)
+        raise
+    if stream_path:
+        del timestamps
+        data_queue.put(acc_file_path)
+    else:
+        data_queue.put((timestamps, decode(capture.values, MEASUREMENT_RANGE)))
 
 def check_queue_and_save(
         run_time: str,
@@ -242,7 +384,8 @@ def check_queue_and_save(
         duration: float,
         start_freq: float,
         end_freq: float,
-        filename: str
+        filename: str,
+        compact: bool = False
     ) -> str:
     """
     Check the queue for data, save the data when available, and return the file path.
@@ -256,6 +399,7 @@ def check_queue_and_save(
         start_freq (float): Start frequency of the sine sweep.
         end_freq (float): End frequency of the sine sweep.
         filename (str): Filename for saving the data.
+        compact (bool): Save the accelerometer data as a compact run file. Defaults to False.
 
     Returns:
         str: The file path where the accelerometer data was saved.
@@ -268,10 +412,15 @@ def check_queue_and_save(
             time.sleep(0.1)  # Sleep briefly to avoid busy-waiting
             continue
         else:
+            if isinstance(data, Exception):
+                raise RuntimeError("Recording the accelerometer data failed.") from data
+            # A path means the reader thread already streamed the data to disk
+            streamed_path = data if isinstance(data, str) else None
+            timestamps_acc, waveform_acc = (None, None) if streamed_path else data
             if timestamps_sweep is not None and waveform_sweep is not None:
-                acc_file_path = save_data(*data, run_time, filename, sweep=True, timestamps_sweep=timestamps_sweep, waveform_sweep=waveform_sweep)
+                acc_file_path = save_data(timestamps_acc, waveform_acc, run_time, filename, sweep=True, timestamps_sweep=timestamps_sweep, waveform_sweep=waveform_sweep, acc_file_path=streamed_path, compact=compact, notes=notes)
             else:
-                acc_file_path = save_data(*data, run_time, filename)
+                acc_file_path = save_data(timestamps_acc, waveform_acc, run_time, filename, acc_file_path=streamed_path, compact=compact, notes=notes)
             
             save_notes(notes, run_time, duration, start_freq, end_freq)
             print(f"Data saved to {run_time}")
@@ -284,25 +433,51 @@ def save_data(
         filename: str, 
         sweep: Optional[bool] = False, 
         timestamps_sweep: Optional[np.ndarray] = None, 
-        waveform_sweep: Optional[np.ndarray] = None
+        waveform_sweep: Optional[np.ndarray] = None,
+        acc_file_path: Optional[str] = None,
+        compact: bool = False,
+        notes: str = ''
     ) -> str:
     """
     Save data from the accelerometer and optionally the sweep waveform.
 
     Args:
         timestamps_acc (np.ndarray): Timestamps for the accelerometer data.
-        waveform_acc (np.ndarray): Accelerometer data (Z-axis).
+        waveform_acc (np.ndarray): Accelerometer data, Z-axis or (N, 3) X, Y, Z.
         run_time (str): The timestamp when the session was run.
         filename (str): Filename for saving the data.
         sweep (Optional[bool]): Flag indicating whether sweep data is included. Defaults to False.
         timestamps_sweep (Optional[np.ndarray]): Timestamps for the sweep waveform. Defaults to None.
         waveform_sweep (Optional[np.ndarray]): Sweep waveform data. Defaults to None.
+        acc_file_path (Optional[str]): Path of accelerometer data that was already streamed to disk.
+            When given, the accelerometer data is not saved again. Defaults to None.
+        compact (bool): Save the accelerometer data as a compact run file with int32 counts and metadata
+            instead of a (1 + channels) x N float64 array. The counts are taken from the raw bytes of the
+            global capture buffer. Defaults to False.
+        notes (str): Notes stored in the run file metadata when `compact` is set. Defaults to ''.
 
     Returns:
         str: The file path where the accelerometer data was saved.
     """
     # Save the accelerometer data and return its file path
-    acc_file_path = save_accelerometer_numpy(waveform_acc, timestamps_acc, run_time, filename)
+    if acc_file_path is None and compact:
+        # Counts straight from the captured register bytes, which `waveform_acc` was decoded from
+        counts = decode_raw_counts(capture.values.reshape(len(capture), -1, 3))
+        acc_file_path = save_run(os.path.join(run_time, f'{filename}.npz'), counts if three_axis else counts[:, 0],
+                                 SCALE_FACTORS[MEASUREMENT_RANGE], sensor_filter.odr_hz,
+                                 MEASUREMENT_RANGE, timestamps=timestamps_acc, notes=notes,
+                                 sample_clock=sample_clock.to_dict(), timing=timing,
+                                 sensor_filter=sensor_filter.to_dict())
+    elif compact:
+        acc_file_path = convert_npy_to_run(acc_file_path, MEASUREMENT_RANGE, sensor_filter.odr_hz, notes=notes, remove_npy=True,
+                                           sample_clock=sample_clock.to_dict(), timing=timing,
+                                           sensor_filter=sensor_filter.to_dict())
+    else:
+        if acc_file_path is None:
+            acc_file_path = save_accelerometer_numpy(waveform_acc, timestamps_acc, run_time, filename)
+        save_sample_clock(run_time, sample_clock)
+        save_timing_report(run_time, timing)
+        save_filter_settings(run_time, sensor_filter)
     
     if sweep and timestamps_sweep is not None and waveform_sweep is not None:
         # Save the sweep data separately
@@ -316,7 +491,17 @@ def play_and_record(
         end_freq: Optional[float] = None, 
         volume: Optional[float] = None, 
         notes: Optional[str] = None, 
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        use_fifo: bool = False,
+        telemetry_interval: Optional[float] = 0.5,
+        stream_to_disk: bool = False,
+        compact_format: bool = False,
+        i2c_bus=None,
+        three_axis: bool = False,
+        isolate_sampler: bool = False,
+        sampler_cpu: Optional[int] = None,
+        rt_priority: Optional[int] = None,
+        band: Optional[tuple] = None
     ) -> str:
     """
     Play a sine sweep, record accelerometer data, and save the data.
@@ -328,10 +513,41 @@ def play_and_record(
         volume (Optional[float]): Volume level for the sine sweep. Defaults to None.
         notes (Optional[str]): Notes related to the session. Defaults to None.
         filename (Optional[str]): Filename for saving the data. Defaults to None.
+        use_fifo (bool): Burst-read the sensor FIFO during the sweep. Defaults to False.
+        telemetry_interval (Optional[float]): Seconds between console status lines. None or 0 is silent. Defaults to 0.5.
+        stream_to_disk (bool): Flush accelerometer samples to disk during the sweep. Defaults to False.
+        compact_format (bool): Save the accelerometer data as a compact .npz run file. Defaults to False.
+        i2c_bus: Bus to record from instead of the module bus, e.g. a SimulatedSMBus. Cannot be combined with
+            `isolate_sampler`. Defaults to None.
+        three_axis (bool): Record X, Y and Z with one 9-byte read per sample and save them as (N, 3). Defaults to False.
+        isolate_sampler (bool): Sample in a separate process that hands samples over through shared memory,
+            so playback cannot add jitter through the GIL. The process opens its own bus with `open_bus(1)`,
+            following ACCEL_BUS_BACKEND. Defaults to False.
+        sampler_cpu (Optional[int]): Core to pin the sampling thread or process to, e.g. one kept free with isolcpus.
+            Defaults to None.
+        rt_priority (Optional[int]): Run the sampling loop with SCHED_FIFO at this priority (1-99). Falls back to the
+            default scheduler without privileges; the active policy and an interval histogram are saved with the run.
+            Defaults to None.
+        band (Optional[tuple]): (low, high) frequency band of interest in Hz, e.g. (start_freq, end_freq).
+            The sensor is switched to the lowest ODR whose on-chip low-pass passes `high`, with the high-pass
+            corner a decade below `low`, and sampled at that rate. None keeps the current settings. Defaults to None.
 
     Returns:
         str: The file path where the accelerometer data was saved.
     """
+    global bus, sensor_filter
+    if i2c_bus is not None and isolate_sampler:
+        # A bus object cannot be handed to the spawned sampler, which would silently open bus 1 instead
+        raise ValueError("isolate_sampler opens its own bus in the sampler process and cannot use i2c_bus; "
+                         "select the backend with the ACCEL_BUS_BACKEND environment variable instead.")
+    if i2c_bus is not None:
+        bus = i2c_bus
+    resolve_i2c_address()
+    if band is not None:
+        sensor_filter = FilterSettings.for_band(band[1], band[0])
+        set_filter(bus, I2C_ADDRESS, sensor_filter)
+        print(f"ADXL357 filter: {sensor_filter.describe()}")
+
     previous_inputs = load_inputs()
 
     duration = duration or get_input("Sweep Time (s)", previous_inputs.get('duration'))
@@ -346,20 +562,33 @@ def play_and_record(
     run_time = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     os.makedirs(run_time, exist_ok=True)
     
-    sample_rate = 44100
-    waveform, timestamps_sweep = generate_sine_waveform(float(start_freq), float(end_freq), float(duration), sample_rate)
-    waveform = waveform * float(volume)  # Apply volume control
-
-    wavfile.write(os.path.join(run_time, 'sweep.wav'), sample_rate, waveform.astype(np.float32))
+    # Only the sweep parameters are stored; the waveform can be rebuilt with regenerate_sweep
+    sweep = SweepParameters(float(start_freq), float(end_freq), float(duration), sample_rate=44100, volume=float(volume))
+    save_sweep_parameters(run_time, sweep)
 
-    thread = threading.Thread(target=read_data_thread, args=(float(duration),))
+    stream_path = os.path.join(run_time, f'{filename}.npy') if stream_to_disk else None
+    thread = threading.Thread(target=read_data_thread, args=(float(duration), use_fifo, telemetry_interval, stream_path, three_axis,
+                                                                isolate_sampler, sampler_cpu, rt_priority))
     thread.daemon = True
     thread.start()
 
-    sd.play(waveform, samplerate=sample_rate)
-    sd.wait()
+    # The chirp is generated block by block in the audio callback, so playback starts at once
+    player = SweepPlayer(sweep)
+    player.play()
 
-    acc_file_path = check_queue_and_save(run_time, timestamps_sweep, waveform, notes, float(duration), float(start_freq), float(end_freq), filename)
+    acc_file_path = check_queue_and_save(run_time, None, None, notes, float(duration), float(start_freq), float(end_freq), filename, compact_format)
+
+    # Store when the sweep reached the DAC on the accelerometer timeline (start_ns is final once the data is saved)
+    playback = player.timing(start_ns)
+    if playback:
+        if sample_clock.source == 'fifo':
+            # FIFO timestamps are index / ODR from 0, not times since start_ns
+            playback = playback_on_sample_index(playback, sample_clock)
+        else:
+            playback["time_base"] = 'run_clock'
+        print(f"Sweep started at t = {playback['start_time'] * 1000:.2f} ms on the accelerometer clock "
+              f"(output latency {playback['output_latency'] * 1000:.1f} ms)")
+    save_sweep_parameters(run_time, sweep, playback=playback)
     
     return acc_file_path
 
@@ -1,11 +1,12 @@
 import os
-os.environ['DISPLAY'] = ':0'  # to run the code from ssh but show on the monitor
 
 import numpy as np 
-import matplotlib.pyplot as plt
-from scipy.signal import stft, butter, filtfilt, find_peaks, get_window
-from scipy.fft import fft
-from tkinter import filedialog
+from scipy.signal import butter, filtfilt
+from run_format import load_accelerometer_data
+from sample_clock import fit_sample_clock, sample_rate_for
+from resampling import resample_uniform, timing_analysis
+from spectral import SpectralResult, compute_spectra
+from spectral_cache import cached_filter, cached_spectra
 
 from typing import Optional
 
@@ -20,7 +21,10 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
                             magnitude_scale: str = 'linear',
                             frequency_scale: str = 'log',
                             show_plot=True,
-                            crop_beginning: Optional[int] = False):
+                            crop_beginning: Optional[int] = False,
+                            timing_correction: Optional[str] = None,
+                            exact_length: bool = False,
+                            use_cache: bool = False):
     """
     Load accelerometer data from a numpy file, optionally filter, and plot both FFT and STFT.
 
@@ -29,7 +33,7 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
     fname : str, optional
         Base name of the output plot file.
     file_path : str, optional
-        Path to the numpy file containing accelerometer data.
+        Path to the numpy file (.npy) or run file (.npz) containing accelerometer data.
     output_path : str, optional
         Path where the output plots will be saved.
     window_type : str, optional
@@ -39,7 +43,8 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
     threshold : float, optional
         Minimum height for peak detection in the FFT plot.
     zero_padding : int, optional
-        Number of zeros to pad to the signal for FFT computation.
+        Minimum FFT length; the signal is zero padded to it. The length is rounded up to the next
+        fast FFT length unless exact_length is set.
     annotate_peaks : bool, default=True
         Whether to annotate peaks in the FFT plot.
     magnitude_scale : str, default='linear'
@@ -50,13 +55,24 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
         Whether to display the plots after saving.
     crop_beginning : int, optional
         Crop the beginning of the data up to the highest peak.
+    timing_correction : str, optional
+        How to handle jittered or gapped timestamps: 'linear' or 'cubic' interpolate the data onto a
+        uniform grid before filtering and plotting, 'nufft' computes the FFT plot at the actual sample
+        times. None treats the samples as uniform. Jitter and gaps are reported in every case.
+    exact_length : bool, default=False
+        Use exactly max(len(data), zero_padding) FFT points instead of the next fast length.
+    use_cache : bool, default=False
+        Reuse the filtered data, spectra and STFT of earlier calls on the same data and parameters
+        from the on-disk cache (see spectral_cache.py), so changing only display options does not recompute them.
+        Off by default, since the cache writes up to 512 MB to the home directory.
 
     Returns:
     --------
     None
     """
     if file_path is None:
-        file_path = filedialog.askopenfilename(filetypes=[("Numpy files", "*.npy")])
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(filetypes=[("Accelerometer runs", "*.npy *.npz")])
 
     if not file_path:
         print("No file selected.")
@@ -69,9 +85,7 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
         output_dir = os.path.dirname(output_path)
         os.makedirs(output_dir, exist_ok=True)
 
-    data = np.load(file_path)
-    timestamps = data[0]
-    z_data = data[1]
+    timestamps, z_data = load_accelerometer_data(file_path)
     if crop_beginning: 
         highest_peak_index = np.argmax(z_data)  # find the index of the maximum value in z_data
         timestamps = timestamps[highest_peak_index:] # crop timestamps from the highest peak onward
@@ -81,29 +95,43 @@ def plot_fft_stft_from_file(fname: Optional[str] = None,
         print(f"Data cropped until {timestamps[0]} seconds")
         print(z_data)
     
-    fs = int(len(timestamps) / timestamps[-1])
+    # One stored rate for every analysis step; older recordings get a fit to their timestamps
+    fs = sample_rate_for(file_path, timestamps)
+
+    timing = timing_analysis(timestamps)
+    print(f"Timing: jitter {timing['jitter_us']:.1f} µs rms (max {timing['max_deviation_us']:.1f} µs), "
+          f"{timing['n_gaps']} gaps, {timing['missing_samples']} missing samples")
+    if timing_correction in ('linear', 'cubic'):
+        timestamps, z_data = resample_uniform(timestamps, z_data, fs, timing_correction)
+        print(f"Resampled onto a uniform {fs:.3f} Hz grid ({timing_correction}), {len(z_data)} samples")
+    spectrum = 'nufft' if timing_correction == 'nufft' else 'fft'
     cutoff_freq = 200
-    filtered_z_data = low_pass_filter(z_data, cutoff_freq, fs)
+    if use_cache:
+        filtered_z_data = cached_filter(low_pass_filter, z_data, cutoff_freq, fs)
+    else:
+        filtered_z_data = low_pass_filter(z_data, cutoff_freq, fs)
     filtered_data_path = os.path.join(output_dir, 'filtered_accelerometer_data.npy')
     np.save(filtered_data_path, np.vstack((timestamps, filtered_z_data)))
 
     # Plot without window
-    plot_fft_stft(timestamps, z_data, output_dir, smoothing=smoothing, threshold=threshold,
+    plot_fft_stft(timestamps, z_data, output_dir, freq=fs, smoothing=smoothing, threshold=threshold,
                   window_type=None, zero_padding=zero_padding, annotate_peaks=annotate_peaks,
-                  magnitude_scale=magnitude_scale, frequency_scale=frequency_scale, show_plot=show_plot)
+                  magnitude_scale=magnitude_scale, frequency_scale=frequency_scale, show_plot=show_plot,
+                  spectrum=spectrum, exact_length=exact_length, use_cache=use_cache)
 
     # Plot with specified window if provided
     if window_type:
-        plot_fft_stft(timestamps, z_data, output_dir, fname, smoothing=smoothing, threshold=threshold,
+        plot_fft_stft(timestamps, z_data, output_dir, fname, freq=fs, smoothing=smoothing, threshold=threshold,
                       window_type=window_type, zero_padding=zero_padding, annotate_peaks=annotate_peaks,
-                      magnitude_scale=magnitude_scale, frequency_scale=frequency_scale, show_plot=show_plot)
+                      magnitude_scale=magnitude_scale, frequency_scale=frequency_scale, show_plot=show_plot,
+                      spectrum=spectrum, exact_length=exact_length, use_cache=use_cache)
 
 
 def plot_fft_stft(timestamps: np.ndarray,
                   waveform: np.ndarray,
                   output_dir: str,
                   file_name: Optional[str] = None,
-                  freq: Optional[int] = 44100,
+                  freq: Optional[float] = None,
                   ns: Optional[int] = 1024 * 2,
                   smoothing: Optional[float] = 0,
                   threshold: Optional[float] = 0.005,
@@ -112,7 +140,10 @@ def plot_fft_stft(timestamps: np.ndarray,
                   zero_padding: Optional[int] = None,
                   annotate_peaks: bool = True,
                   magnitude_scale: str = 'linear',
-                  frequency_scale: str = 'log'):
+                  frequency_scale: str = 'log',
+                  spectrum: str = 'fft',
+                  exact_length: bool = False,
+                  use_cache: bool = False):
     """
     Plot the FFT and STFT of a given waveform, optionally applying windowing, zero padding, and peak annotation.
 
@@ -126,8 +157,8 @@ def plot_fft_stft(timestamps: np.ndarray,
         Directory where the output plots will be saved.
     file_name : str, optional
         Base name for the output plot file.
-    freq : int, optional
-        Sampling frequency of the data. Default is 44100 Hz.
+    freq : float, optional
+        Sampling frequency of the data. If None, it is fitted to the timestamps.
     ns : int, optional
         Number of samples per segment for STFT. Default is 2048.
     smoothing : float, optional
@@ -139,50 +170,93 @@ def plot_fft_stft(timestamps: np.ndarray,
     window_type : str, optional
         Type of window function to apply to the data before FFT and STFT.
     zero_padding : int, optional
-        Number of zeros to pad to the signal for FFT computation.
+        Minimum FFT length; the signal is zero padded to it. The length is rounded up to the next
+        fast FFT length unless exact_length is set.
     annotate_peaks : bool, default=True
         Whether to annotate peaks in the FFT plot.
     magnitude_scale : str, default='linear'
         Scale for the magnitude axis in FFT ('linear' or 'log').
     frequency_scale : str, default='log'
         Scale for the frequency axis in FFT and STFT ('linear' or 'log').
+    spectrum : str, default='fft'
+        'fft' treats the samples as uniformly spaced; 'nufft' evaluates the FFT plot at the actual
+        timestamps with a non-uniform FFT, on the same frequency bins. The STFT always uses the samples as they are.
+    exact_length : bool, default=False
+        Use exactly max(len(waveform), zero_padding) FFT points instead of the next fast length.
+    use_cache : bool, default=False
+        Take the spectra and STFT from the on-disk cache when they were computed before.
 
     Returns:
     --------
-    None
+    result : SpectralResult
+        The plotted spectrum, peaks and STFT.
     """
     
-    freq = int((len(timestamps) - 2000) / timestamps[-2001])
-    overlap = ns // 2
+    if freq is None:
+        freq = fit_sample_clock(timestamps).effective_rate
+    compute = cached_spectra if use_cache else compute_spectra
+    result = compute(timestamps, waveform, freq, ns=ns, threshold=threshold, window_type=window_type,
+                     zero_padding=zero_padding, exact_length=exact_length, spectrum=spectrum)
+    render_spectra(result, output_dir, file_name, smoothing=smoothing, show_plot=show_plot,
+                   annotate_peaks=annotate_peaks, magnitude_scale=magnitude_scale, frequency_scale=frequency_scale)
+    return result
 
-    if window_type:
-        window = get_window(window_type, len(waveform))
-        waveform_windowed = waveform * window
-        label_suffix = f' with {window_type.capitalize()} Window'
-    else:
-        waveform_windowed = waveform
-        label_suffix = ' (No Window)'
-
-    # Apply zero padding if specified and valid
-    original_length = len(waveform_windowed)
-    if zero_padding and zero_padding > original_length:
-        padded_length = zero_padding
-        waveform_windowed = np.pad(waveform_windowed, (0, padded_length - original_length), 'constant')
-    else:
-        padded_length = original_length
 
-    # Perform FFT
-    Y = fft(waveform_windowed)
-    f_fft = np.fft.fftfreq(padded_length, d=1 / freq)[:padded_length // 2]
-    magnitude_spectrum = 2.0 / len(waveform_windowed) * np.abs(Y[:padded_length // 2])
+def _pyplot(show_plot: bool):
+    """
+    Import pyplot on first use.
 
-    # Remove non-positive frequencies for log scale
-    positive_freq_indices = f_fft > 0
-    f_fft = f_fft[positive_freq_indices]
-    magnitude_spectrum = magnitude_spectrum[positive_freq_indices]
+    Figures that are only saved use the Agg backend, so no display or GUI
+    toolkit is needed; showing them uses the default backend on the Pi's monitor.
+    """
+    import matplotlib
+    if show_plot:
+        os.environ.setdefault('DISPLAY', ':0')  # to run the code from ssh but show on the monitor
+    else:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_spectra(result: SpectralResult,
+                   output_dir: str,
+                   file_name: Optional[str] = None,
+                   smoothing: Optional[float] = 0,
+                   show_plot: Optional[bool] = True,
+                   annotate_peaks: bool = True,
+                   magnitude_scale: str = 'linear',
+                   frequency_scale: str = 'log'):
+    """
+    Draw and save the FFT and STFT plot of a `compute_spectra` result.
 
-    # Detect peaks before converting to log scale
-    peaks, _ = find_peaks(magnitude_spectrum, height=threshold)
+    Parameters:
+    -----------
+    result : SpectralResult
+        Spectrum, peaks and STFT to draw.
+    output_dir : str
+        Directory where the output plots will be saved.
+    file_name : str, optional
+        Base name for the output plot file.
+    smoothing : float, optional
+        Smoothing factor shown in the title and file name. Default is 0 (no smoothing).
+    show_plot : bool, optional
+        Whether to display the plots after saving. Default is True. Otherwise matplotlib runs headless (Agg).
+    annotate_peaks : bool, default=True
+        Whether to annotate peaks in the FFT plot.
+    magnitude_scale : str, default='linear'
+        Scale for the magnitude axis in FFT ('linear' or 'log').
+    frequency_scale : str, default='log'
+        Scale for the frequency axis in FFT and STFT ('linear' or 'log').
+
+    Returns:
+    --------
+    None
+    """
+    plt = _pyplot(show_plot)
+    window_type, zero_padding = result.window_type, result.zero_padding
+    label_suffix = f' with {window_type.capitalize()} Window' if window_type else ' (No Window)'
+    f_fft, magnitude_spectrum, peaks = result.frequencies, result.magnitude, result.peaks
+    f, t = result.stft_frequencies, result.stft_times
 
     # If magnitude scale is log, convert the magnitude spectrum
     if magnitude_scale == 'log':
@@ -222,9 +296,7 @@ def plot_fft_stft(timestamps: np.ndarray,
     if magnitude_scale == 'log':
         axs[1].set_xscale('log')
     
-    f, t, Zxx = stft(waveform, freq, noverlap=overlap, nperseg=ns, window='hann', nfft=ns * 2)
-    
-    axs[0].pcolormesh(t, f, np.abs(Zxx), shading='auto', cmap='viridis')
+    axs[0].pcolormesh(t, f, result.stft_magnitude, shading='auto', cmap='viridis')
     if frequency_scale == 'log':
         print("Skipping log scale on STFT frequency axis due to non-positive frequency values.")
         axs[0].set_yscale('linear')
@@ -248,6 +320,8 @@ def plot_fft_stft(timestamps: np.ndarray,
     print(f"FFT and STFT plots saved in {output_dir}")
     if show_plot:
         plt.show()
+    else:
+        plt.close(fig)
 
 
 def low_pass_filter(data: np.ndarray, cutoff_freq: float, fs: float, order: Optional[int] = 2) -> np.ndarray:
@@ -0,0 +1,488 @@
+#adxl357.py
+
+"""
+Register map and FIFO helpers for the ADXL357 accelerometer.
+
+The functions here take the bus object and the device address as arguments so
+the same code can drive any of the capture scripts.
+"""
+
+import json
+import os
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+# ADXL357 Register Addresses
+REG_STATUS = 0x04        # DATA_RDY / FIFO_FULL / FIFO_OVR flags
+REG_FIFO_ENTRIES = 0x05  # Number of valid entries (axis words) in the FIFO
+REG_XDATA3 = 0x08
+REG_YDATA3 = 0x0B
+REG_ZDATA3 = 0x0E
+REG_FIFO_DATA = 0x11     # Reads from this register do not auto-increment
+REG_ODR_FILTER = 0x28
+REG_FIFO_SAMPLES = 0x29  # FIFO watermark
+REG_RANGE = 0x2C
+REG_POWER_CTL = 0x2D
+REG_RESET = 0x2F
+
+# STATUS register bits
+STATUS_DATA_RDY = 0x01
+STATUS_FIFO_FULL = 0x02
+STATUS_FIFO_OVR = 0x04
+
+# FIFO_DATA word flags (stored in the low nibble of the third byte)
+FIFO_X_MARKER = 0x01  # Set on the X-axis word, i.e. the first word of each XYZ sample
+FIFO_EMPTY = 0x02     # Set when the FIFO was read while empty
+
+FIFO_DEPTH = 96          # Axis words, i.e. 32 XYZ samples
+FIFO_WORD_BYTES = 3
+XYZ_DATA_BYTES = 9       # XDATA3..ZDATA1 are contiguous
+DEFAULT_ODR_HZ = 4000    # ODR_FILTER = 0x00
+ODR_RATES_HZ = tuple(DEFAULT_ODR_HZ / (1 << code) for code in range(11))  # By ODR_FILTER bits 3:0
+SMBUS_BLOCK_MAX = 32     # Largest read_i2c_block_data transfer
+
+# RANGE register codes for each measurement range in g
+RANGE_CODES = {10: 0x01, 20: 0x02, 40: 0x03}
+RESET_CODE = 0x52
+
+# ODR_FILTER bits 6:4 select the high-pass corner, given here as a fraction of the ODR (0 = HPF off)
+HPF_CORNER_RATIOS = {1: 24.7e-4, 2: 6.2084e-4, 3: 1.5545e-4, 4: 0.3862e-4, 5: 0.0954e-4, 6: 0.0238e-4}
+LPF_CORNER_RATIO = 0.25  # The decimation filter's low-pass corner is ODR / 4
+HPF_MARGIN = 10          # Keep the high-pass corner a decade below the band so it does not attenuate it
+POWER_CTL_MEASURE = 0x06  # Measurement mode, temperature and DRDY off
+POWER_CTL_STANDBY = 0x07
+FILTER_FILE = 'sensor_filter.json'
+
+# Scale in g per LSB for each measurement range
+SCALE_FACTORS = {
+    10: 0.0000187,
+    20: 0.0000187 * 2,
+    40: 0.0000187 * 4,
+}
+
+
+def configure_adxl357(bus, address: int, measurement_range: int = 10, odr_filter: int = 0x00) -> None:
+    """
+    Reset the ADXL357, set the ODR/filter register and range, and enable measurement mode.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        measurement_range (int, optional): The measurement range in g (10, 20, or 40). Defaults to 10.
+        odr_filter (int, optional): Value for the ODR_FILTER register, e.g. `FilterSettings.register`.
+                                    Defaults to 0x00 (4000 Hz, no high-pass).
+    """
+    if measurement_range not in RANGE_CODES:
+        raise ValueError("Invalid measurement range specified. Use 10, 20, or 40.")
+    bus.write_byte_data(address, REG_RESET, RESET_CODE)
+    time.sleep(0.1)  # Wait for the reset to complete
+    bus.write_byte_data(address, REG_ODR_FILTER, odr_filter)
+    bus.write_byte_data(address, REG_RANGE, RANGE_CODES[measurement_range])
+    bus.write_byte_data(address, REG_POWER_CTL, POWER_CTL_MEASURE)
+
+
+class FilterSettings:
+    """
+    Output data rate and on-chip filter corners, i.e. the contents of the ODR_FILTER register.
+
+    Args:
+        odr_hz (float, optional): Output data rate, one of ODR_RATES_HZ. Defaults to 4000.
+        hpf_code (int, optional): High-pass corner code, a key of HPF_CORNER_RATIOS, or 0 for no high-pass.
+                                  Defaults to 0.
+    """
+
+    def __init__(self, odr_hz: float = DEFAULT_ODR_HZ, hpf_code: int = 0):
+        if odr_hz not in ODR_RATES_HZ:
+            raise ValueError(f"Unsupported ODR {odr_hz} Hz. Use one of {', '.join(f'{odr:g}' for odr in ODR_RATES_HZ)}.")
+        if hpf_code and hpf_code not in HPF_CORNER_RATIOS:
+            raise ValueError(f"Invalid high-pass corner code {hpf_code}. Use 0-6.")
+        self.odr_hz = float(odr_hz)
+        self.hpf_code = int(hpf_code)
+
+    @classmethod
+    def for_band(cls, high_hz: float, low_hz: Optional[float] = None) -> "FilterSettings":
+        """
+        The lowest ODR whose low-pass corner still passes `high_hz`, with the highest high-pass corner
+        a decade below `low_hz` to remove the gravity offset and drift.
+
+        Args:
+            high_hz (float): Highest frequency of interest in Hz.
+            low_hz (Optional[float]): Lowest frequency of interest in Hz. None or 0 leaves the high-pass off.
+
+        Returns:
+            FilterSettings: The chosen settings.
+        """
+        usable = [odr for odr in ODR_RATES_HZ if odr * LPF_CORNER_RATIO >= high_hz]
+        if not usable:
+            raise ValueError(f"A {high_hz} Hz band needs more than the {DEFAULT_ODR_HZ * LPF_CORNER_RATIO:g} Hz "
+                             f"the ADXL357 passes at its highest ODR.")
+        odr_hz = min(usable)
+        hpf_code = 0
+        if low_hz:
+            fitting = [code for code, ratio in HPF_CORNER_RATIOS.items() if odr_hz * ratio * HPF_MARGIN <= low_hz]
+            hpf_code = min(fitting, default=0)
+        return cls(odr_hz, hpf_code)
+
+    @classmethod
+    def from_register(cls, value: int) -> "FilterSettings":
+        """Decode an ODR_FILTER register value."""
+        return cls(ODR_RATES_HZ[value & 0x0F], (value >> 4) & 0x07)
+
+    @property
+    def register(self) -> int:
+        return (self.hpf_code << 4) | ODR_RATES_HZ.index(self.odr_hz)
+
+    @property
+    def lpf_corner_hz(self) -> float:
+        return self.odr_hz * LPF_CORNER_RATIO
+
+    @property
+    def hpf_corner_hz(self) -> Optional[float]:
+        return self.odr_hz * HPF_CORNER_RATIOS[self.hpf_code] if self.hpf_code else None
+
+    def to_dict(self) -> dict:
+        return {
+            "odr_hz": self.odr_hz,
+            "hpf_code": self.hpf_code,
+            "odr_filter": self.register,
+            "lpf_corner_hz": self.lpf_corner_hz,
+            "hpf_corner_hz": self.hpf_corner_hz,
+        }
+
+    def describe(self) -> str:
+        """One-line summary for status output, e.g. 'ODR 4000 Hz, low-pass 1000 Hz, high-pass off'."""
+        hpf = f"{self.hpf_corner_hz:.4g} Hz" if self.hpf_code else "off"
+        return f"ODR {self.odr_hz:g} Hz, low-pass {self.lpf_corner_hz:g} Hz, high-pass {hpf}"
+
+    def __repr__(self) -> str:
+        return f"FilterSettings({self.describe()})"
+
+
+def set_filter(bus, address: int, settings: FilterSettings) -> None:
+    """
+    Change the ODR and filter corners of a running ADXL357 without a reset.
+
+    The register is written in standby, as the datasheet requires, and measurement is resumed afterwards.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        settings (FilterSettings): The new settings.
+    """
+    bus.write_byte_data(address, REG_POWER_CTL, POWER_CTL_STANDBY)
+    bus.write_byte_data(address, REG_ODR_FILTER, settings.register)
+    bus.write_byte_data(address, REG_POWER_CTL, POWER_CTL_MEASURE)
+
+
+def save_filter_settings(run_dir: str, settings: FilterSettings) -> str:
+    """
+    Write the filter settings next to the data files of a run.
+
+    Returns:
+        str: Path of the written JSON file.
+    """
+    path = os.path.join(run_dir, FILTER_FILE)
+    with open(path, 'w') as f:
+        json.dump(settings.to_dict(), f, indent=2)
+    return path
+
+
+def read_register_block(bus, address: int, register: int, length: int) -> list[int]:
+    """
+    Read `length` bytes starting at `register` in as few bus transactions as possible.
+
+    Buses that advertise a larger `max_block_length` (e.g. `spi_bus.SPIBus`)
+    read everything in one transfer. On I2C, a single combined write/read
+    message through `i2c_rdwr` is used when the bus supports it. Otherwise
+    longer reads are split into SMBus block reads of at most 32 bytes, which is
+    only valid for FIFO_DATA since it does not auto-increment.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        register (int): First register to read.
+        length (int): Number of bytes to read.
+
+    Returns:
+        list[int]: The bytes read.
+    """
+    if length <= getattr(bus, 'max_block_length', SMBUS_BLOCK_MAX):
+        return bus.read_i2c_block_data(address, register, length)
+
+    if hasattr(bus, 'i2c_rdwr'):
+        from smbus2 import i2c_msg
+        write = i2c_msg.write(address, [register])
+        read = i2c_msg.read(address, length)
+        bus.i2c_rdwr(write, read)
+        return list(read)
+
+    data = []
+    chunk = SMBUS_BLOCK_MAX - SMBUS_BLOCK_MAX % FIFO_WORD_BYTES
+    while len(data) < length:
+        data.extend(bus.read_i2c_block_data(address, register, min(chunk, length - len(data))))
+    return data
+
+
+def read_xyz_raw(bus, address: int) -> list[int]:
+    """
+    Read the undecoded X, Y and Z data registers in a single 9-byte block transaction.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+
+    Returns:
+        list[int]: XDATA3..ZDATA1, three bytes per axis.
+    """
+    return bus.read_i2c_block_data(address, REG_XDATA3, XYZ_DATA_BYTES)
+
+
+def wait_data_ready(bus, address: int, timeout: float = 0.5) -> bool:
+    """
+    Wait until the sensor has converted its first sample after measurement mode was enabled.
+
+    Until then the data registers read as zero, which would be taken for a 0 g sample.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        timeout (float, optional): Seconds to wait. Defaults to 0.5, longer than one sample at the lowest ODR.
+
+    Returns:
+        bool: False if DATA_RDY was not set within `timeout`.
+    """
+    deadline = time.monotonic() + timeout
+    while not bus.read_byte_data(address, REG_STATUS) & STATUS_DATA_RDY:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(1e-4)
+    return True
+
+
+def reset_fifo(bus, address: int, timeout: float = 1.0) -> None:
+    """
+    Discard everything currently held in the FIFO and leave its read pointer on an X-axis word.
+
+    Whole samples are drained in one burst. Since an earlier read may have
+    stopped partway through a sample, words are then read one at a time until
+    an X-axis word has been read, followed by its Y and Z words.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        timeout (float, optional): Seconds to wait for new words while realigning. Defaults to 1.
+    """
+    entries = bus.read_byte_data(address, REG_FIFO_ENTRIES) & 0x7F
+    entries -= entries % 3
+    if entries:
+        read_register_block(bus, address, REG_FIFO_DATA, entries * FIFO_WORD_BYTES)
+
+    deadline = time.monotonic() + timeout
+    remaining = None  # Words left of the sample whose X word has been read
+    while remaining != 0 and time.monotonic() < deadline:
+        flags = bus.read_i2c_block_data(address, REG_FIFO_DATA, FIFO_WORD_BYTES)[2]
+        if flags & FIFO_EMPTY:
+            time.sleep(1e-4)
+        elif remaining is not None:
+            remaining -= 1
+        elif flags & FIFO_X_MARKER:
+            remaining = 2
+
+
+def read_fifo(bus, address: int) -> list[int]:
+    """
+    Burst-read all complete XYZ samples currently in the FIFO.
+
+    Only whole samples (multiples of three axis words) are read so the next
+    burst starts on an X-axis word again.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+
+    Returns:
+        list[int]: Raw FIFO bytes, three per axis word. Empty if no full sample is ready.
+    """
+    entries = bus.read_byte_data(address, REG_FIFO_ENTRIES) & 0x7F
+    entries -= entries % 3
+    if entries == 0:
+        return []
+    return read_register_block(bus, address, REG_FIFO_DATA, entries * FIFO_WORD_BYTES)
+
+
+def align_fifo_words(raw) -> np.ndarray:
+    """
+    Group raw FIFO bytes into whole XYZ samples without decoding them.
+
+    Empty-FIFO words are dropped and grouping starts at every X-axis marker,
+    so a burst that starts mid-sample is realigned.
+
+    Args:
+        raw: Bytes returned by `read_fifo` (list, bytes or uint8 array).
+
+    Returns:
+        np.ndarray: uint8 array of shape (n_samples, 3 axes, 3 bytes).
+    """
+    words = np.asarray(raw, dtype=np.uint8)
+    words = words[:len(words) - len(words) % FIFO_WORD_BYTES].reshape(-1, FIFO_WORD_BYTES)
+    words = words[(words[:, 2] & FIFO_EMPTY) == 0]
+    x_index = np.flatnonzero(words[:, 2] & FIFO_X_MARKER)
+    x_index = x_index[x_index + 2 < len(words)]
+    return words[x_index[:, None] + np.arange(3)]
+
+
+def decode_raw_counts(raw: np.ndarray) -> np.ndarray:
+    """
+    Assemble and sign-extend 20-bit counts from their 3-byte register or FIFO form.
+
+    Args:
+        raw (np.ndarray): uint8 array whose last axis holds the three data bytes (DATA3, DATA2, DATA1).
+
+    Returns:
+        np.ndarray: int32 counts with the last axis removed.
+    """
+    raw = np.asarray(raw, dtype=np.uint8)
+    counts = ((raw[..., 0].astype(np.int32) << 12)
+              | (raw[..., 1].astype(np.int32) << 4)
+              | (raw[..., 2].astype(np.int32) >> 4))
+    # Sign-extend from 20 bits
+    return (counts ^ (1 << 19)) - (1 << 19)
+
+
+def counts_to_g(counts: np.ndarray, measurement_range: int) -> np.ndarray:
+    """
+    Convert raw counts to acceleration in g.
+
+    Args:
+        counts (np.ndarray): Signed counts from `decode_raw_counts`.
+        measurement_range (int): The measurement range in g (10, 20, or 40).
+
+    Returns:
+        np.ndarray: Acceleration in g as float64.
+    """
+    if measurement_range not in SCALE_FACTORS:
+        raise ValueError("Invalid measurement range specified. Use 10, 20, or 40.")
+    return counts * SCALE_FACTORS[measurement_range]
+
+
+def decode_raw_to_g(raw: np.ndarray, measurement_range: int) -> np.ndarray:
+    """Decode 3-byte raw samples straight to g; see `decode_raw_counts` and `counts_to_g`."""
+    return counts_to_g(decode_raw_counts(raw), measurement_range)
+
+
+def decode_xyz_raw_to_g(raw: np.ndarray, measurement_range: int) -> np.ndarray:
+    """
+    Decode 9-byte XYZ samples from `read_xyz_raw` to g.
+
+    Args:
+        raw (np.ndarray): uint8 array of shape (n, 9), or (n, 3, 3) as returned by the FIFO helpers.
+        measurement_range (int): The measurement range in g (10, 20, or 40).
+
+    Returns:
+        np.ndarray: Acceleration in g, shape (n, 3).
+    """
+    raw = np.asarray(raw, dtype=np.uint8).reshape(-1, 3, FIFO_WORD_BYTES)
+    return decode_raw_to_g(raw, measurement_range)
+
+
+def fifo_poll_interval(odr_hz: float, fill_fraction: Optional[float] = 0.5) -> float:
+    """
+    How long the reader can sleep between FIFO drains without risking an overflow.
+
+    Args:
+        odr_hz (float): Output data rate of the sensor.
+        fill_fraction (float, optional): Fraction of the FIFO allowed to fill between drains. Defaults to 0.5.
+
+    Returns:
+        float: Poll interval in seconds.
+    """
+    return (FIFO_DEPTH // 3) * fill_fraction / odr_hz
+
+
+class FifoOverrunError(RuntimeError):
+    """The FIFO filled up between two bursts and the sensor discarded samples."""
+
+
+class FifoSampleCounter:
+    """
+    Sample index of every FIFO burst, counting the samples lost in overruns.
+
+    Pass `overrun` as the `on_overrun` callback of `collect_fifo_blocks` and
+    call `timestamps` once per burst. After an overrun, the index skips the
+    samples the sensor discarded, estimated from the time since the previous
+    burst, so index / ODR stays on time and `n` tracks the real sample count.
+
+    Args:
+        odr_hz (float): Output data rate configured on the sensor.
+        on_overrun (Optional[Callable]): Also called with every `FifoOverrunError`, e.g. `AcquisitionStats.error`.
+                                         Defaults to None.
+    """
+
+    def __init__(self, odr_hz: float, on_overrun: Optional[Callable[[FifoOverrunError], None]] = None):
+        self.odr_hz = odr_hz
+        self.on_overrun = on_overrun
+        self.n = 0
+        self.lost = 0
+        self.overruns = 0
+        self._pending = False
+        self._last_ns = None
+
+    def overrun(self, exc: FifoOverrunError) -> None:
+        self.overruns += 1
+        self._pending = True
+        if self.on_overrun is not None:
+            self.on_overrun(exc)
+
+    def timestamps(self, n_samples: int, arrival_ns: int) -> np.ndarray:
+        """
+        Times (index / ODR) of a burst of `n_samples` that arrived at `arrival_ns` on the monotonic clock.
+
+        Returns:
+            np.ndarray: One timestamp per sample of the burst, in seconds.
+        """
+        if self._pending and self._last_ns is not None:
+            skipped = max(round((arrival_ns - self._last_ns) * 1e-9 * self.odr_hz) - n_samples, 0)
+            self.n += skipped
+            self.lost += skipped
+        self._pending, self._last_ns = False, arrival_ns
+        timestamps = (self.n + np.arange(n_samples)) / self.odr_hz
+        self.n += n_samples
+        return timestamps
+
+
+def collect_fifo_blocks(bus, address: int, duration: float, odr_hz: float = DEFAULT_ODR_HZ,
+                        on_overrun: Optional[Callable[[FifoOverrunError], None]] = None):
+    """
+    Drain the FIFO for `duration` seconds and yield each burst as undecoded XYZ samples.
+
+    The sensor's own ODR sets the sample rate; the caller only needs to keep
+    up with the FIFO, which this loop does by sleeping between bursts.
+    Decoding is left to the caller so it can happen off the acquisition loop.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int): I2C address of the device.
+        duration (float): Capture duration in seconds.
+        odr_hz (float, optional): Output data rate configured on the sensor. Defaults to 4000.
+        on_overrun (Optional[Callable]): Called with a `FifoOverrunError` for every overrun, before the
+                                         burst that follows it is yielded, e.g. `AcquisitionStats.error`.
+                                         Defaults to None, which prints a warning.
+
+    Yields:
+        np.ndarray: uint8 array of shape (n_samples, 3 axes, 3 bytes), see `align_fifo_words`.
+    """
+    poll_interval = fifo_poll_interval(odr_hz)
+    reset_fifo(bus, address)
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        if bus.read_byte_data(address, REG_STATUS) & STATUS_FIFO_OVR:
+            if on_overrun is None:
+                print("Warning: ADXL357 FIFO overrun, samples were lost.")
+            else:
+                on_overrun(FifoOverrunError("ADXL357 FIFO overrun, samples were lost"))
+        samples = align_fifo_words(read_fifo(bus, address))
+        if len(samples):
+            yield samples
+        time.sleep(poll_interval)
@@ -0,0 +1,226 @@
+#batch_analysis.py
+
+"""
+Headless spectral analysis of many recordings at once.
+
+`analyze_tree` finds every recording below a directory, analyses the files on
+a process pool, and writes `spectral_summary.json` (per run: effective sample
+rate, timing, FFT peaks and the STFT dominant frequency) and `spectral_peaks.csv`
+(one row per peak) to the output directory. Nothing is rendered, so it runs
+over ssh without a display:
+
+    python batch_analysis.py "Example Recordings" --window hann --zero-padding 65536 --jobs 4
+"""
+
+import argparse
+import csv
+import fnmatch
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from resampling import resample_uniform, timing_analysis
+from run_format import load_accelerometer_data
+from sample_clock import sample_rate_for
+from spectral import compute_spectra
+from spectral_cache import cached_spectra
+
+SUMMARY_FILE = 'spectral_summary.json'
+PEAKS_FILE = 'spectral_peaks.csv'
+RUN_PATTERNS = ('*.npz', '*.npy')
+# Files next to the recordings that are not accelerometer data
+EXCLUDE_PATTERNS = ('*_sweep.npy', 'filtered_accelerometer_data.npy', 'spectra_*.npz')
+
+
+def find_run_files(root: str, patterns=RUN_PATTERNS, exclude=EXCLUDE_PATTERNS) -> list[str]:
+    """
+    Recordings below `root`, sorted by path.
+
+    Args:
+        root (str): Directory tree to search, or a single file.
+        patterns (tuple, optional): File name patterns to include. Defaults to RUN_PATTERNS.
+        exclude (tuple, optional): File name patterns to skip. Defaults to EXCLUDE_PATTERNS.
+
+    Returns:
+        list[str]: Paths of the matching files.
+    """
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if any(fnmatch.fnmatch(name, p) for p in patterns) and not any(fnmatch.fnmatch(name, p) for p in exclude):
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+
+def analyze_file(file_path: str, window_type: Optional[str] = None, zero_padding: Optional[int] = None,
+                 threshold: float = 0.005, max_peaks: int = 10, timing_correction: Optional[str] = None,
+                 crop_beginning: bool = False, spectra_dir: Optional[str] = None, workers: int = 1,
+                 use_cache: bool = False) -> dict:
+    """
+    FFT, STFT and peak table of one recording, without plotting.
+
+    Uses the same sample rate and `compute_spectra` as `plot_fft_stft_from_file`.
+
+    Args:
+        file_path (str): Path of a run file (.npz) or legacy .npy file.
+        window_type (Optional[str]): Window applied before the FFT. Defaults to None.
+        zero_padding (Optional[int]): Minimum FFT length. Defaults to None.
+        threshold (float, optional): Minimum peak height in g. Defaults to 0.005.
+        max_peaks (int, optional): Highest peaks to keep. Defaults to 10.
+        timing_correction (Optional[str]): 'linear', 'cubic' or 'nufft', as in `plot_fft_stft_from_file`. Defaults to None.
+        crop_beginning (bool, optional): Crop the data before its highest sample. Defaults to False.
+        spectra_dir (Optional[str]): If set, the spectrum and STFT magnitude are saved there as .npz. Defaults to None.
+        workers (int, optional): FFT threads. Defaults to 1, since files already run in parallel.
+        use_cache (bool, optional): Go through the on-disk spectral cache. Defaults to False.
+
+    Returns:
+        dict: file, n_samples, duration_s, fs, timing (see `timing_analysis`), peaks (frequency_hz and
+              amplitude, highest first), stft_dominant_hz (median over segments of the strongest
+              frequency) and, if saved, spectra_file.
+    """
+    timestamps, z_data = load_accelerometer_data(file_path)
+    timestamps, z_data = np.asarray(timestamps, dtype=np.float64), np.asarray(z_data, dtype=np.float64)
+    if crop_beginning:
+        start = np.argmax(z_data)
+        timestamps, z_data = timestamps[start:] - timestamps[start], z_data[start:]
+
+    fs = sample_rate_for(file_path, timestamps)
+    timing = timing_analysis(timestamps)
+    timing.pop("gap_times")
+    if timing_correction in ('linear', 'cubic'):
+        timestamps, z_data = resample_uniform(timestamps, z_data, fs, timing_correction)
+
+    compute = cached_spectra if use_cache else compute_spectra
+    spectra = compute(timestamps, z_data, fs, threshold=threshold, window_type=window_type, zero_padding=zero_padding,
+                      spectrum='nufft' if timing_correction == 'nufft' else 'fft', workers=workers)
+    dominant = spectra.stft_dominant_frequencies()
+
+    result = {
+        "file": file_path,
+        "n_samples": int(len(z_data)),
+        "duration_s": float(timestamps[-1] - timestamps[0]) if len(timestamps) else 0.0,
+        "fs": float(fs),
+        "timing": timing,
+        "peaks": spectra.strongest_peaks(max_peaks),
+        "stft_dominant_hz": float(np.median(dominant)) if len(dominant) else None,
+    }
+    if spectra_dir:
+        os.makedirs(spectra_dir, exist_ok=True)
+        run_dir, name = os.path.split(os.path.splitext(file_path)[0])
+        result["spectra_file"] = os.path.join(spectra_dir, f'spectra_{os.path.basename(run_dir)}_{name}.npz')
+        np.savez_compressed(result["spectra_file"], frequency=spectra.frequencies, magnitude=spectra.magnitude,
+                            stft_frequency=spectra.stft_frequencies, stft_time=spectra.stft_times,
+                            stft_magnitude=spectra.stft_magnitude.astype(np.float32))
+    return result
+
+
+def _analyze_safely(file_path: str, options: dict) -> dict:
+    try:
+        return analyze_file(file_path, **options)
+    except Exception as e:
+        return {"file": file_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def write_summary(results: list[dict], output_dir: str, options: Optional[dict] = None) -> tuple[str, str]:
+    """
+    Write the batch results as JSON and as a flat peak table.
+
+    Args:
+        results (list[dict]): Outputs of `analyze_file`, or dicts with file and error.
+        output_dir (str): Directory for the summary files.
+        options (Optional[dict]): Analysis options, stored in the JSON. Defaults to None.
+
+    Returns:
+        tuple[str, str]: Paths of the JSON summary and the CSV peak table.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, SUMMARY_FILE)
+    with open(summary_path, 'w') as f:
+        json.dump({"created": datetime.now().isoformat(timespec='seconds'), "options": options or {},
+                   "runs": results}, f, indent=2)
+
+    peaks_path = os.path.join(output_dir, PEAKS_FILE)
+    with open(peaks_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "fs", "rank", "frequency_hz", "amplitude"])
+        for result in results:
+            for rank, peak in enumerate(result.get("peaks", []), start=1):
+                writer.writerow([result["file"], f"{result['fs']:.4f}", rank,
+                                 f"{peak['frequency_hz']:.4f}", f"{peak['amplitude']:.6g}"])
+    return summary_path, peaks_path
+
+
+def analyze_tree(root: str, output_dir: Optional[str] = None, jobs: Optional[int] = None,
+                 patterns=RUN_PATTERNS, **options) -> list[dict]:
+    """
+    Analyse every recording below `root` on a process pool and write the summary.
+
+    Args:
+        root (str): Directory tree of run folders.
+        output_dir (Optional[str]): Where the summary goes. Defaults to `root`.
+        jobs (Optional[int]): Worker processes. Defaults to the number of cores.
+        patterns (tuple, optional): File name patterns of the recordings. Defaults to RUN_PATTERNS.
+        **options: Passed on to `analyze_file`.
+
+    Returns:
+        list[dict]: Per-file results in path order; failed files carry an error instead.
+    """
+    output_dir = output_dir or (root if os.path.isdir(root) else os.path.dirname(root) or '.')
+    files = find_run_files(root, patterns)
+    print(f"Analysing {len(files)} recordings from {root}")
+
+    results = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = {pool.submit(_analyze_safely, file_path, options): file_path for file_path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            if "error" in result:
+                print(f"[{done}/{len(files)}] {result['file']}: {result['error']}")
+            else:
+                top = f"{result['peaks'][0]['frequency_hz']:.2f} Hz" if result["peaks"] else "no peaks"
+                print(f"[{done}/{len(files)}] {result['file']}: fs {result['fs']:.2f} Hz, {top}")
+
+    ordered = [results[file_path] for file_path in files]
+    summary_path, peaks_path = write_summary(ordered, output_dir, options)
+    failed = sum("error" in result for result in ordered)
+    print(f"Done in {time.perf_counter() - start:.1f} s, {failed} failed. Summary: {summary_path}, peaks: {peaks_path}")
+    return ordered
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Batch FFT/STFT peak analysis of accelerometer recordings.")
+    parser.add_argument("root", help="directory tree of run folders, or a single recording")
+    parser.add_argument("-o", "--output-dir", help="where to write the summary (default: root)")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--pattern", action="append", help="recording file name pattern, repeatable "
+                                                           f"(default: {' '.join(RUN_PATTERNS)})")
+    parser.add_argument("--window", dest="window_type", help="window before the FFT, e.g. hann")
+    parser.add_argument("--zero-padding", type=int, help="minimum FFT length")
+    parser.add_argument("--threshold", type=float, default=0.005, help="minimum peak height in g")
+    parser.add_argument("--max-peaks", type=int, default=10, help="peaks kept per recording")
+    parser.add_argument("--timing-correction", choices=("linear", "cubic", "nufft"),
+                        help="resample jittered timestamps, or use a non-uniform FFT")
+    parser.add_argument("--crop-beginning", action="store_true", help="crop each recording up to its highest sample")
+    parser.add_argument("--save-spectra", action="store_true", help="also save each spectrum and STFT as .npz")
+    parser.add_argument("--cache", action="store_true", help="reuse spectra from the on-disk cache (spectral_cache.py)")
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir or (args.root if os.path.isdir(args.root) else os.path.dirname(args.root) or '.')
+    analyze_tree(args.root, output_dir, args.jobs, tuple(args.pattern or RUN_PATTERNS),
+                 window_type=args.window_type, zero_padding=args.zero_padding, threshold=args.threshold,
+                 max_peaks=args.max_peaks, timing_correction=args.timing_correction,
+                 crop_beginning=args.crop_beginning, use_cache=args.cache,
+                 spectra_dir=os.path.join(output_dir, 'spectra') if args.save_spectra else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#capture_buffer.py
+
+"""
+Preallocated numpy storage for captured samples.
+
+Replaces per-sample Python list appends, which box every value into a
+float object, with typed arrays sized from the expected capture length.
+"""
+
+import numpy as np
+
+
+class CaptureBuffer:
+    """
+    Linear capture buffer of timestamps and sample values backed by preallocated numpy arrays.
+
+    The arrays are sized for the expected number of samples up front and grow
+    by `chunk` samples if the capture overruns. `timestamps` and `values`
+    return views of the filled part, so the save and analysis paths read the
+    data without copying it.
+
+    Args:
+        capacity (int): Number of samples to preallocate.
+        channels (int, optional): Values per sample (1 for Z only). Defaults to 1.
+        dtype (np.dtype, optional): Type of the stored values. Defaults to np.float64.
+        chunk (int, optional): Number of samples added each time the buffer grows.
+                               Defaults to 10% of the capacity.
+    """
+
+    def __init__(self, capacity: int, channels: int = 1, dtype=np.float64, chunk: int = None):
+        capacity = max(int(capacity), 1)
+        self.channels = channels
+        self.chunk = chunk or max(capacity // 10, 1024)
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        shape = (capacity,) if channels == 1 else (capacity, channels)
+        self._values = np.empty(shape, dtype=dtype)
+        self._n = 0
+
+    @classmethod
+    def for_duration(cls, duration: float, rate_hz: float, margin: float = 0.05, **kwargs) -> "CaptureBuffer":
+        """
+        Create a buffer sized for `duration` seconds at `rate_hz` plus a safety margin.
+
+        Args:
+            duration (float): Capture duration in seconds.
+            rate_hz (float): Expected sample rate in Hz.
+            margin (float, optional): Extra fraction of samples to preallocate. Defaults to 0.05.
+
+        Returns:
+            CaptureBuffer: The new, empty buffer.
+        """
+        return cls(int(duration * rate_hz * (1 + margin)) + 1, **kwargs)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamps)
+
+    def _grow(self, needed: int) -> None:
+        new_capacity = self.capacity
+        while new_capacity < needed:
+            new_capacity += self.chunk
+        self._timestamps = np.resize(self._timestamps, new_capacity)
+        self._values = np.resize(self._values, (new_capacity,) + self._values.shape[1:])
+
+    def append(self, timestamp: float, value) -> None:
+        """
+        Store one sample.
+
+        Args:
+            timestamp (float): Sample time in seconds.
+            value: Sample value, or a sequence of `channels` values.
+        """
+        n = self._n
+        if n == len(self._timestamps):
+            self._grow(n + 1)
+        self._timestamps[n] = timestamp
+        self._values[n] = value
+        self._n = n + 1
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """
+        Store a block of samples.
+
+        Args:
+            timestamps (np.ndarray): Sample times in seconds, shape (k,).
+            values (np.ndarray): Sample values, shape (k,) or (k, channels).
+        """
+        n, k = self._n, len(timestamps)
+        if n + k > len(self._timestamps):
+            self._grow(n + k)
+        self._timestamps[n:n + k] = timestamps
+        self._values[n:n + k] = values
+        self._n = n + k
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """View of the filled timestamps."""
+        return self._timestamps[:self._n]
+
+    @property
+    def values(self) -> np.ndarray:
+        """View of the filled sample values."""
+        return self._values[:self._n]
+
+    def clear(self) -> None:
+        """Forget the stored samples but keep the allocated memory."""
+        self._n = 0
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer that keeps only the most recent `capacity` samples, e.g. a pre-trigger window.
+
+    Args:
+        capacity (int): Number of samples to keep.
+        channels (int, optional): Values per sample (1 for Z only). Defaults to 1.
+        dtype (np.dtype, optional): Type of the stored values. Defaults to np.float64.
+    """
+
+    def __init__(self, capacity: int, channels: int = 1, dtype=np.float64):
+        capacity = max(int(capacity), 1)
+        self.channels = channels
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        shape = (capacity,) if channels == 1 else (capacity, channels)
+        self._values = np.empty(shape, dtype=dtype)
+        self._head = 0  # Next slot to write
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamps)
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """
+        Store a block of samples, overwriting the oldest ones once the buffer is full.
+
+        Args:
+            timestamps (np.ndarray): Sample times in seconds, shape (k,).
+            values (np.ndarray): Sample values, shape (k,) or (k, channels).
+        """
+        capacity = self.capacity
+        k = len(timestamps)
+        if k >= capacity:
+            timestamps, values, k = timestamps[-capacity:], values[-capacity:], capacity
+        first = min(k, capacity - self._head)
+        self._timestamps[self._head:self._head + first] = timestamps[:first]
+        self._values[self._head:self._head + first] = values[:first]
+        self._timestamps[:k - first] = timestamps[first:]
+        self._values[:k - first] = values[first:]
+        self._head = (self._head + k) % capacity
+        self._n = min(self._n + k, capacity)
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        if self._n < self.capacity:
+            return array[:self._n].copy()
+        return np.concatenate((array[self._head:], array[:self._head]))
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Copy of the stored timestamps, oldest first."""
+        return self._ordered(self._timestamps)
+
+    @property
+    def values(self) -> np.ndarray:
+        """Copy of the stored sample values, oldest first."""
+        return self._ordered(self._values)
+
+    def clear(self) -> None:
+        """Forget the stored samples but keep the allocated memory."""
+        self._head = 0
+        self._n = 0
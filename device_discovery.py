@@ -0,0 +1,189 @@
+#device_discovery.py
+
+"""
+Find the accelerometers on a bus once and remember where they are.
+
+`discover_devices` probes every I2C address and identifies the ADXL357 and
+LSM6DS3 by their ID registers. `find_devices` keeps the result in a small
+JSON cache and, on later starts, only re-reads the ID register of each cached
+device; the full scan runs again only if that check fails. Capture scripts
+call `find_address` instead of hardcoding 0x1D or 0x53.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+import lsm6ds3
+from i2c_bus import open_bus
+
+DEVICE_CACHE_ENV = 'ACCEL_DEVICE_CACHE'
+DEVICE_CACHE_FILE = 'i2c_devices.json'
+CACHE_VERSION = 1
+
+# ADXL357 identification registers and their fixed values
+REG_DEVID_AD = 0x00
+REG_PARTID = 0x02
+ADXL357_DEVID_AD = 0xAD
+ADXL357_PARTID = 0xED
+
+# Addresses each part can be strapped to
+CANDIDATE_ADDRESSES = {
+    'adxl357': (0x1D, 0x53),
+    'lsm6ds3': (lsm6ds3.DEFAULT_ADDRESS, 0x6B),
+}
+SCAN_RANGE = range(0x03, 0x78)
+
+
+def identify(bus, address: int) -> Optional[str]:
+    """
+    Identify the part at `address` from its ID registers.
+
+    Returns:
+        Optional[str]: 'adxl357', 'lsm6ds3', or None if nothing known answers there.
+    """
+    try:
+        if address in CANDIDATE_ADDRESSES['adxl357'] and \
+                bus.read_byte_data(address, REG_DEVID_AD) == ADXL357_DEVID_AD and \
+                bus.read_byte_data(address, REG_PARTID) == ADXL357_PARTID:
+            return 'adxl357'
+        if address in CANDIDATE_ADDRESSES['lsm6ds3'] and \
+                bus.read_byte_data(address, lsm6ds3.REG_WHO_AM_I) == lsm6ds3.WHO_AM_I_VALUE:
+            return 'lsm6ds3'
+    except OSError:
+        pass
+    return None
+
+
+def scan_addresses(bus) -> list[int]:
+    """
+    Addresses that acknowledge on the bus.
+
+    Buses without `write_quick` (the SPI transport, which reaches exactly one
+    device) report only the default ADXL357 address.
+    """
+    if not hasattr(bus, 'write_quick'):
+        return [CANDIDATE_ADDRESSES['adxl357'][0]]
+    found = []
+    for address in SCAN_RANGE:
+        try:
+            bus.write_quick(address)
+            found.append(address)
+        except OSError:
+            pass
+    return found
+
+
+def discover_devices(bus, bus_number: int = 1) -> list[dict]:
+    """
+    Probe the whole bus and identify what answers.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        bus_number (int, optional): Number of that bus, stored with each device. Defaults to 1.
+
+    Returns:
+        list[dict]: One entry per responding address with its address, kind ('adxl357', 'lsm6ds3' or None)
+                    and bus_number.
+    """
+    return [{"address": address, "kind": identify(bus, address), "bus_number": bus_number}
+            for address in scan_addresses(bus)]
+
+
+def _cache_path(cache_path: Optional[str]) -> str:
+    return cache_path or os.environ.get(DEVICE_CACHE_ENV) or DEVICE_CACHE_FILE
+
+
+def _bus_key(bus, bus_number: int) -> str:
+    return f"{type(bus).__module__}.{type(bus).__name__}:{bus_number}"
+
+
+def load_device_cache(cache_path: Optional[str] = None) -> dict:
+    """
+    Read the device cache.
+
+    Returns:
+        dict: Cached topologies by bus, empty if there is no usable cache.
+    """
+    path = _cache_path(cache_path)
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("buses", {})
+
+
+def save_device_cache(buses: dict, cache_path: Optional[str] = None) -> str:
+    """
+    Write cached topologies by bus.
+
+    Returns:
+        str: Path of the written JSON file.
+    """
+    path = _cache_path(cache_path)
+    with open(path, 'w') as f:
+        json.dump({"version": CACHE_VERSION, "buses": buses}, f, indent=2)
+    return path
+
+
+def find_devices(bus=None, bus_number: int = 1, cache_path: Optional[str] = None, rescan: bool = False) -> list[dict]:
+    """
+    The devices on a bus, from the cache if it is still valid, otherwise from a fresh scan.
+
+    The cache is valid when it was written for the same kind of bus, holds at
+    least one identified device, and every identified device still answers
+    with the right ID.
+
+    Args:
+        bus (optional): Open bus to use. Defaults to `open_bus(bus_number)`.
+        bus_number (int, optional): The I2C bus number. Defaults to 1.
+        cache_path (Optional[str]): Cache file. Defaults to $ACCEL_DEVICE_CACHE or i2c_devices.json.
+        rescan (bool, optional): Ignore the cache and probe the bus. Defaults to False.
+
+    Returns:
+        list[dict]: See `discover_devices`.
+    """
+    bus = bus if bus is not None else open_bus(bus_number)
+    key = _bus_key(bus, bus_number)
+    buses = load_device_cache(cache_path)
+    cached = buses.get(key)
+    if cached and not rescan:
+        identified = [device for device in cached["devices"] if device["kind"]]
+        if identified and all(identify(bus, device["address"]) == device["kind"] for device in identified):
+            return cached["devices"]
+        print("The I2C device cache is out of date, rescanning the bus.")
+
+    devices = discover_devices(bus, bus_number)
+    buses[key] = {"scanned_at": datetime.now().isoformat(timespec='seconds'), "devices": devices}
+    try:
+        save_device_cache(buses, cache_path)
+    except OSError as e:
+        print(f"Could not write the device cache: {e}")
+    return devices
+
+
+def find_address(kind: str = 'adxl357', bus=None, bus_number: int = 1, default: Optional[int] = None,
+                 cache_path: Optional[str] = None) -> Optional[int]:
+    """
+    Address of the first device of `kind` on the bus.
+
+    Args:
+        kind (str, optional): 'adxl357' or 'lsm6ds3'. Defaults to 'adxl357'.
+        bus (optional): Open bus to use. Defaults to `open_bus(bus_number)`.
+        bus_number (int, optional): The I2C bus number. Defaults to 1.
+        default (Optional[int]): Returned, with a warning, if no such device is found. Defaults to None.
+        cache_path (Optional[str]): Cache file. Defaults to $ACCEL_DEVICE_CACHE or i2c_devices.json.
+
+    Returns:
+        Optional[int]: The I2C address.
+    """
+    for device in find_devices(bus, bus_number, cache_path):
+        if device["kind"] == kind:
+            return device["address"]
+    if default is not None:
+        print(f"No {kind} found on I2C bus {bus_number}, using address {default:#04x}.")
+    return default
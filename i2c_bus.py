@@ -0,0 +1,54 @@
+#i2c_bus.py
+
+"""
+Pluggable I2C bus layer.
+
+Every capture script opens its bus through `open_bus`, which returns a real
+smbus2.SMBus on the Raspberry Pi, a `sim_bus.SimulatedSMBus` for the
+simulated backend, or a `spi_bus.SPIBus` that reaches the ADXL357 over SPI.
+The backend is chosen explicitly or with the environment variable
+ACCEL_BUS_BACKEND (smbus, sim, spi or sim-spi).
+"""
+
+import os
+from typing import Optional
+
+BUS_BACKEND_ENV = 'ACCEL_BUS_BACKEND'
+BUS_BACKENDS = ('smbus', 'sim', 'spi', 'sim-spi')
+SPI_BUS_ENV = 'ACCEL_SPI_BUS'
+SPI_DEVICE_ENV = 'ACCEL_SPI_DEVICE'
+
+
+def open_bus(bus_number: int = 1, backend: Optional[str] = None, **sim_options):
+    """
+    Open the bus the accelerometer is on.
+
+    The SPI backends only reach the ADXL357. SPI bus and chip select come from
+    $ACCEL_SPI_BUS and $ACCEL_SPI_DEVICE (both default 0), since `bus_number`
+    names an I2C bus.
+
+    Args:
+        bus_number (int): The I2C bus number, /dev/i2c-<bus_number> on the Pi. Defaults to 1.
+        backend (Optional[str]): 'smbus' for the hardware bus, 'sim' for the emulator, 'spi' for the
+                                 ADXL357 on spidev, or 'sim-spi' for the SPI transport against the emulator.
+                                 Defaults to $ACCEL_BUS_BACKEND, or 'smbus' if it is unset.
+        **sim_options: Passed on to `SimulatedSMBus` when the simulated backend is used.
+
+    Returns:
+        An smbus2.SMBus compatible bus object.
+    """
+    backend = (backend or os.environ.get(BUS_BACKEND_ENV) or 'smbus').lower()
+    if backend == 'smbus':
+        import smbus2
+        return smbus2.SMBus(bus_number)
+    if backend == 'sim':
+        from sim_bus import SimulatedSMBus
+        return SimulatedSMBus(**sim_options)
+    if backend == 'spi':
+        from spi_bus import SPIBus
+        return SPIBus(int(os.environ.get(SPI_BUS_ENV, 0)), int(os.environ.get(SPI_DEVICE_ENV, 0)))
+    if backend == 'sim-spi':
+        from sim_bus import FakeSpiDev
+        from spi_bus import SPIBus
+        return SPIBus(spi=FakeSpiDev())
+    raise ValueError(f"Unknown bus backend {backend!r}. Use one of {', '.join(BUS_BACKENDS)}.")
@@ -20,14 +20,23 @@ from scipy.signal import chirp, resample, stft
 from scipy.fft import fft
 from scipy.interpolate import interp1d
 from mpl_toolkits.mplot3d import Axes3D
-import smbus2 as smbus
+from i2c_bus import open_bus
+from device_discovery import find_address
 import json
+from telemetry import AcquisitionStats, start_telemetry
 
-# I2C bus initialization
-bus = smbus.SMBus(1)
+# I2C bus initialization (set ACCEL_BUS_BACKEND=sim to run against the emulator)
+bus = open_bus(1)
 
-# Define register addresses for ADXL357
-I2C_ADDRESS = 0x1D  # 0x1D for the ADXL357, SOMETIMES 0X53 depending on configuration
+# I2C address of the ADXL357 (0x1D, or 0x53 depending on its ASEL pin), looked up in the cached device scan on first use
+I2C_ADDRESS = None
+
+def resolve_i2c_address(i2c_bus=None):
+    """Find the ADXL357 address on first use, so importing this module does not probe the bus."""
+    global I2C_ADDRESS
+    if I2C_ADDRESS is None:
+        I2C_ADDRESS = find_address('adxl357', i2c_bus or bus, default=0x1D)
+    return I2C_ADDRESS
 
 # Define the measurement range (options: ±10g, ±20g, ±40g)
 MEASUREMENT_RANGE = 10  # Change this value to 10, 20, or 40 for different ranges
@@ -45,6 +54,7 @@ timestamps_data = []  # List to store timestamps
 start_time = None  # Start time for data collection
 last_time = None  # Last timestamp for data collection
 running = False  # Flag to control the data collection thread
+stats = AcquisitionStats()  # Counters read by the telemetry thread
 
 # Queue for passing data between threads
 data_queue = queue.Queue()
@@ -98,6 +108,7 @@ def load_inputs(duration_entry, start_freq_entry, end_freq_entry, notes_entry) -
 
 def init_ADXL357():
     """Initialize the ADXL357 accelerometer."""
+    resolve_i2c_address()
     # Reset the device
     bus.write_byte_data(I2C_ADDRESS, REG_RESET, 0x52)  # Reset command
     time.sleep(0.1)  # Wait for the reset to complete
@@ -141,32 +152,30 @@ def read_acc_data():
         elif MEASUREMENT_RANGE == 40:
             z_g = z_data * 0.0000187 * 4  # Scale for 40g range (four times the 10g range)
     
-        # Calculate the current time and sampling rate
+        # Calculate the current time
         current_time = time.time()
-        if last_time is not None:
-            interval = current_time - last_time
-            sampling_rate = 1 / interval
         last_time = current_time
         elapsed_time = current_time - start_time
 
         with data_lock:
             z_axis_data.append(z_g)
             timestamps_data.append(elapsed_time)
-
-            print(f"Z: {z_g:.3f}g, Time: {elapsed_time:.6f}s, "
-                  f"Sampling Rate: {sampling_rate:.2f} Hz, len(z_axis_data):{len(z_axis_data)}")
+        stats.record(current_time)
     except Exception as e:
-        print(f"Error: {e}")
+        stats.error(e)
 
 # Thread function to continuously read data
-def read_data_thread(duration):
-    global start_time, last_time, running
+def read_data_thread(duration, telemetry_interval=0.5):
+    global start_time, last_time, running, stats
+    resolve_i2c_address()
+    stats, reporter = start_telemetry(telemetry_interval)
     start_time = time.time()
     last_time = start_time
     running = True
     while running and (time.time() - start_time) < duration:
         read_acc_data()
     running = False
+    reporter.stop()
     # After reading is done, put the data in the queue
     data_queue.put((z_axis_data, timestamps_data))
 
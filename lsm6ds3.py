@@ -0,0 +1,70 @@
+#lsm6ds3.py
+
+"""
+Register map and read helpers for the LSM6DS3 accelerometer, in the same form as adxl357.py.
+"""
+
+import numpy as np
+
+DEFAULT_ADDRESS = 0x6A
+
+# LSM6DS3 Register Addresses
+REG_WHO_AM_I = 0x0F
+REG_CTRL1_XL = 0x10   # Accelerometer ODR (bits 7:4) and full scale (bits 3:2)
+REG_CTRL3_C = 0x12    # BDU and register auto-increment
+REG_OUTX_L_XL = 0x28  # OUTX_L_XL..OUTZ_H_XL are contiguous, little-endian
+REG_OUTZ_L_XL = 0x2C
+
+WHO_AM_I_VALUE = 0x69
+
+# CTRL1_XL full-scale codes and sensitivity in mg/LSB for each range in g
+FULL_SCALE_CODES = {2: 0b00, 16: 0b01, 4: 0b10, 8: 0b11}
+SENSITIVITY_MG = {2: 0.061, 4: 0.122, 8: 0.244, 16: 0.488}
+ODR_6660_HZ = 0b1010
+
+XYZ_DATA_BYTES = 6
+
+
+def configure_lsm6ds3(bus, address: int = DEFAULT_ADDRESS, full_scale: int = 8, odr_code: int = ODR_6660_HZ) -> None:
+    """
+    Set the accelerometer ODR and full scale and enable block data update with register auto-increment.
+
+    Args:
+        bus: An open smbus2.SMBus (or compatible) object.
+        address (int, optional): I2C address of the device. Defaults to 0x6A.
+        full_scale (int, optional): Full scale in g (2, 4, 8, or 16). Defaults to 8.
+        odr_code (int, optional): CTRL1_XL ODR bits. Defaults to 6.66 kHz.
+    """
+    if full_scale not in FULL_SCALE_CODES:
+        raise ValueError("Invalid full scale specified. Use 2, 4, 8, or 16.")
+    bus.write_byte_data(address, REG_CTRL1_XL, (odr_code << 4) | (FULL_SCALE_CODES[full_scale] << 2))
+    bus.write_byte_data(address, REG_CTRL3_C, 0x44)
+
+
+def read_xyz_raw(bus, address: int = DEFAULT_ADDRESS) -> list[int]:
+    """Read OUTX_L_XL..OUTZ_H_XL in one 6-byte block transaction."""
+    return bus.read_i2c_block_data(address, REG_OUTX_L_XL, XYZ_DATA_BYTES)
+
+
+def read_z_raw(bus, address: int = DEFAULT_ADDRESS) -> list[int]:
+    """Read OUTZ_L_XL and OUTZ_H_XL in one 2-byte block transaction."""
+    return bus.read_i2c_block_data(address, REG_OUTZ_L_XL, 2)
+
+
+def decode_raw_counts(raw: np.ndarray) -> np.ndarray:
+    """
+    Assemble signed 16-bit counts from little-endian register bytes.
+
+    Args:
+        raw (np.ndarray): uint8 array of shape (n, 2 * axes).
+
+    Returns:
+        np.ndarray: int32 counts of shape (n, axes).
+    """
+    raw = np.ascontiguousarray(raw, dtype=np.uint8)
+    return raw.view('<i2').astype(np.int32)
+
+
+def scale_for(full_scale: int) -> float:
+    """g per LSB for a full scale in g."""
+    return SENSITIVITY_MG[full_scale] / 1000
@@ -29,7 +29,7 @@ def get_file_path():
     print("Please select a file manually.")
     root = Tk()
     root.withdraw()  # Hide the main Tkinter window
-    file_path = askopenfilename(title="Select the numpy file", filetypes=[("Numpy files", "*.npy")])
+    file_path = askopenfilename(title="Select the numpy file", filetypes=[("Accelerometer runs", "*.npy *.npz")])
     if file_path and os.path.exists(file_path):
         last_saved_file_path = file_path  # Update the global path
         return file_path
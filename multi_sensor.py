@@ -0,0 +1,336 @@
+#multi_sensor.py
+
+"""
+Simultaneous acquisition from several accelerometers on one or more I2C buses.
+
+Sensors that share a bus are read one after another on every tick of a
+single deadline pacer. Each bus in use gets its own worker thread (the bus
+ioctl releases the GIL, so buses are read in parallel), and all pacers share
+one monotonic time origin. The streams are saved together as one
+multi-channel run file.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+import adxl357
+import lsm6ds3
+from capture_buffer import CaptureBuffer
+from device_discovery import find_devices
+from i2c_bus import open_bus
+from run_format import RUN_FILE_NAME, save_run
+from sample_clock import fit_sample_clock
+from sample_pacer import DeadlinePacer
+from telemetry import start_telemetry
+
+SENSOR_KINDS = ('adxl357', 'lsm6ds3')
+
+
+class SensorSpec:
+    """
+    One sensor taking part in a multi-sensor capture.
+
+    Args:
+        kind (str): 'adxl357' or 'lsm6ds3'. Defaults to 'adxl357'.
+        address (Optional[int]): I2C address. Defaults to 0x1D for the ADXL357 and 0x6A for the LSM6DS3.
+        bus_number (int): I2C bus the sensor is on. Defaults to 1.
+        three_axis (bool): Record X, Y and Z instead of Z only. Defaults to False.
+        measurement_range (Optional[int]): Range in g. Defaults to 10 for the ADXL357 and 8 for the LSM6DS3.
+        name (Optional[str]): Label used for the channel names. Defaults to '<kind>_<address>'.
+    """
+
+    def __init__(self, kind: str = 'adxl357', address: Optional[int] = None, bus_number: int = 1,
+                 three_axis: bool = False, measurement_range: Optional[int] = None, name: Optional[str] = None):
+        if kind not in SENSOR_KINDS:
+            raise ValueError(f"Unknown sensor kind {kind!r}. Use one of {', '.join(SENSOR_KINDS)}.")
+        self.kind = kind
+        self.address = address if address is not None else (0x1D if kind == 'adxl357' else lsm6ds3.DEFAULT_ADDRESS)
+        self.bus_number = bus_number
+        self.three_axis = three_axis
+        self.measurement_range = measurement_range or (10 if kind == 'adxl357' else 8)
+        self.name = name or f"{kind}_{self.address:#04x}"
+
+    @property
+    def channels(self) -> int:
+        return 3 if self.three_axis else 1
+
+    @property
+    def channel_names(self) -> list[str]:
+        return [f"{self.name}.{axis}" for axis in ('xyz' if self.three_axis else 'z')]
+
+    @property
+    def raw_bytes(self) -> int:
+        if self.kind == 'adxl357':
+            return adxl357.XYZ_DATA_BYTES if self.three_axis else 3
+        return lsm6ds3.XYZ_DATA_BYTES if self.three_axis else 2
+
+    @property
+    def scale(self) -> float:
+        if self.kind == 'adxl357':
+            return adxl357.SCALE_FACTORS[self.measurement_range]
+        return lsm6ds3.scale_for(self.measurement_range)
+
+    def configure(self, bus, rate_hz: float = adxl357.DEFAULT_ODR_HZ) -> None:
+        """
+        Reset/configure the sensor for measurement.
+
+        An ADXL357 gets the lowest ODR that is at least `rate_hz`, so it is not read faster than it
+        produces new samples. The LSM6DS3 keeps its 6.66 kHz default.
+        """
+        if self.kind == 'adxl357':
+            odr_hz = min((odr for odr in adxl357.ODR_RATES_HZ if odr >= rate_hz), default=adxl357.DEFAULT_ODR_HZ)
+            adxl357.configure_adxl357(bus, self.address, self.measurement_range,
+                                      adxl357.FilterSettings(odr_hz).register)
+            # Otherwise the first reads return zeros, which look like 0 g samples
+            adxl357.wait_data_ready(bus, self.address)
+        else:
+            lsm6ds3.configure_lsm6ds3(bus, self.address, self.measurement_range)
+
+    def reader(self, bus):
+        """A zero-argument function returning one raw sample from this sensor on `bus`."""
+        address = self.address
+        if self.kind == 'adxl357':
+            if self.three_axis:
+                return lambda: adxl357.read_xyz_raw(bus, address)
+            return lambda: bus.read_i2c_block_data(address, adxl357.REG_ZDATA3, 3)
+        return (lambda: lsm6ds3.read_xyz_raw(bus, address)) if self.three_axis else (lambda: lsm6ds3.read_z_raw(bus, address))
+
+    def decode_counts(self, raw: np.ndarray) -> np.ndarray:
+        """Convert a block of raw samples to int32 counts of shape (n, channels)."""
+        if self.kind == 'adxl357':
+            return adxl357.decode_raw_counts(np.reshape(raw, (len(raw), self.channels, 3)))
+        return lsm6ds3.decode_raw_counts(raw)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "address": self.address,
+            "bus_number": self.bus_number,
+            "three_axis": self.three_axis,
+            "measurement_range": self.measurement_range,
+            "name": self.name,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "SensorSpec":
+        return cls(**values)
+
+
+def discovered_sensors(bus_numbers: tuple = (1,), three_axis: bool = False, buses: Optional[dict] = None) -> list:
+    """
+    A SensorSpec for every accelerometer found on the given buses, from the device cache where it is valid.
+
+    Args:
+        bus_numbers (tuple, optional): I2C buses to look at. Defaults to (1,).
+        three_axis (bool, optional): Record X, Y and Z of every sensor. Defaults to False.
+        buses (Optional[dict]): Already opened buses by bus number. Defaults to None.
+
+    Returns:
+        list[SensorSpec]: The sensors, in bus and address order.
+    """
+    buses = buses or {}
+    sensors = []
+    for bus_number in bus_numbers:
+        for device in find_devices(buses.get(bus_number), bus_number):
+            if device["kind"] in SENSOR_KINDS:
+                sensors.append(SensorSpec(device["kind"], device["address"], bus_number, three_axis))
+    return sensors
+
+
+class MultiSensorCapture:
+    """
+    Capture from a list of sensors on a common clock.
+
+    Args:
+        sensors (list[SensorSpec]): The sensors to record.
+        rate_hz (float, optional): Tick rate of every bus worker. Each tick reads every sensor on that
+                                   bus once, so the bus must sustain rate_hz x sensors reads. Defaults to 4000.
+        buses (Optional[dict]): Already opened buses by bus number, e.g. simulated ones.
+                                Missing buses are opened with `open_bus`. Defaults to None.
+    """
+
+    def __init__(self, sensors: list, rate_hz: float = adxl357.DEFAULT_ODR_HZ, buses: Optional[dict] = None):
+        if not sensors:
+            raise ValueError("At least one sensor is required.")
+        names = [sensor.name for sensor in sensors]
+        if len(set(names)) != len(names):
+            raise ValueError("Sensor names must be unique.")
+        self.sensors = list(sensors)
+        self.rate_hz = rate_hz
+        self.buses = dict(buses or {})
+        self.groups = {}
+        for sensor in self.sensors:
+            self.groups.setdefault(sensor.bus_number, []).append(sensor)
+        self.ticks = {}
+        self.buffers = {}
+        self.missed = {}
+        self.errors = {sensor.name: 0 for sensor in self.sensors}
+        self.failed = {sensor.name: [] for sensor in self.sensors}
+        self.start_ns = None
+
+    def _worker(self, bus_number: int, duration: float, stats) -> None:
+        bus = self.buses[bus_number]
+        sensors = self.groups[bus_number]
+        readers = [sensor.reader(bus) for sensor in sensors]
+        buffers = [self.buffers[sensor.name] for sensor in sensors]
+        failed = [self.failed[sensor.name] for sensor in sensors]
+        ticks = self.ticks[bus_number]
+        start_ns = self.start_ns
+
+        pacer = DeadlinePacer(self.rate_hz)
+        pacer.start(start_ns)
+        while pacer.elapsed() < duration:
+            tick = pacer.wait()
+            ticks.append(pacer.deadline_ns(tick) * 1e-9, tick)
+            # Interleave the sensors that share this bus within the tick
+            for sensor, read, buffer, failed_reads in zip(sensors, readers, buffers, failed):
+                try:
+                    raw = read()
+                except OSError as e:
+                    # A placeholder keeps the stream aligned with the ticks; `assemble` fills it in
+                    raw = [0] * sensor.raw_bytes
+                    failed_reads.append(len(buffer))
+                    self.errors[sensor.name] += 1
+                    stats.error(e)
+                buffer.append((time.monotonic_ns() - start_ns) * 1e-9, raw)
+            stats.record((time.monotonic_ns() - start_ns) * 1e-9)
+        self.missed[bus_number] = pacer.missed
+
+    def run(self, duration: float, telemetry_interval: Optional[float] = 0.5) -> "MultiSensorCapture":
+        """
+        Configure every sensor and record for `duration` seconds.
+
+        Returns:
+            MultiSensorCapture: self, for chaining into `save`.
+        """
+        for bus_number in self.groups:
+            if bus_number not in self.buses:
+                self.buses[bus_number] = open_bus(bus_number)
+        for sensor in self.sensors:
+            sensor.configure(self.buses[sensor.bus_number], self.rate_hz)
+
+        for bus_number in self.groups:
+            self.ticks[bus_number] = CaptureBuffer.for_duration(duration, self.rate_hz, dtype=np.int64)
+        for sensor in self.sensors:
+            self.buffers[sensor.name] = CaptureBuffer.for_duration(duration, self.rate_hz, channels=sensor.raw_bytes,
+                                                                   dtype=np.uint8)
+
+        stats, reporter = start_telemetry(telemetry_interval)
+        # One origin for every worker puts all streams on the same clock
+        self.start_ns = time.monotonic_ns()
+        workers = [threading.Thread(target=self._worker, args=(bus_number, duration, stats), daemon=True)
+                   for bus_number in self.groups]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        reporter.stop()
+
+        for bus_number, missed in self.missed.items():
+            if missed:
+                print(f"Bus {bus_number}: missed {missed} tick deadlines")
+        return self
+
+    def _all_ticks(self) -> np.ndarray:
+        """Every tick that at least one bus read, in order."""
+        return np.unique(np.concatenate([self.ticks[bus].values for bus in self.groups]))
+
+    def assemble(self) -> tuple[np.ndarray, np.ndarray, dict]:
+        """
+        Put every stream on one tick grid.
+
+        Ticks that one bus missed but another did not, and reads that failed,
+        are filled by linear interpolation between that sensor's neighbouring
+        samples; the number filled per sensor and their sample indices are reported.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, dict]: Run timestamps (s, from the first sensor's reads),
+                                                 int32 counts (n_ticks, channels) and assembly details.
+        """
+        all_ticks = self._all_ticks()
+        primary = self.sensors[0]
+        primary_ticks = self.ticks[primary.bus_number].values
+        timestamps = np.interp(all_ticks, primary_ticks, self.buffers[primary.name].timestamps)
+
+        columns, interpolated, interpolated_indices, time_offsets = [], {}, {}, {}
+        for sensor in self.sensors:
+            ticks = self.ticks[sensor.bus_number].values
+            buffer = self.buffers[sensor.name]
+            counts = sensor.decode_counts(buffer.values)
+            valid = np.ones(len(ticks), dtype=bool)
+            valid[self.failed[sensor.name]] = False
+            if not valid.any():
+                raise ValueError(f"Every read from {sensor.name} failed.")
+            if valid.all() and len(ticks) == len(all_ticks):
+                columns.append(counts)
+            else:
+                columns.append(np.column_stack([np.rint(np.interp(all_ticks, ticks[valid], counts[valid, c]))
+                                                for c in range(sensor.channels)]).astype(np.int32))
+            missing = np.flatnonzero(~np.isin(all_ticks, ticks[valid]))
+            interpolated[sensor.name] = int(len(missing))
+            interpolated_indices[sensor.name] = missing.tolist()
+            # Mean read time relative to the run timestamps, from the order of reads within a tick
+            time_offsets[sensor.name] = float(np.mean(buffer.timestamps - np.interp(ticks, primary_ticks,
+                                                                                    self.buffers[primary.name].timestamps)))
+        details = {"interpolated_samples": interpolated, "interpolated_indices": interpolated_indices,
+                   "sensor_time_offsets": time_offsets}
+        return timestamps, np.hstack(columns), details
+
+    def save(self, file_path: str, notes: str = '') -> str:
+        """
+        Save all streams as one multi-channel run file.
+
+        Per-channel scale factors are stored as a list, so `AccelerometerRun.data` returns g for every channel.
+
+        Returns:
+            str: Path of the saved run file.
+        """
+        timestamps, counts, details = self.assemble()
+        scale = [sensor.scale for sensor in self.sensors for _ in range(sensor.channels)]
+        channels = [name for sensor in self.sensors for name in sensor.channel_names]
+        # Fit against the tick numbers, so missed ticks do not stretch the period
+        clock = fit_sample_clock(timestamps, self._all_ticks(), nominal_rate=self.rate_hz)
+        return save_run(file_path, counts, scale, self.rate_hz, self.sensors[0].measurement_range,
+                        timestamps=timestamps, notes=notes, channels=channels,
+                        sensors=[sensor.to_dict() for sensor in self.sensors],
+                        read_errors=self.errors, sample_clock=clock.to_dict(), **details)
+
+
+def collect_multi_sensor_data(sensors: list, duration: float, custom_name: str = 'multi',
+                              rate_hz: float = adxl357.DEFAULT_ODR_HZ, telemetry_interval: Optional[float] = 0.5,
+                              buses: Optional[dict] = None) -> str:
+    """
+    Record several sensors at once into a new run directory.
+
+    Args:
+        sensors (list[SensorSpec]): The sensors to record.
+        duration (float): Capture duration in seconds.
+        custom_name (str, optional): Appended to the run directory name. Defaults to 'multi'.
+        rate_hz (float, optional): Sample rate per sensor. Defaults to 4000.
+        telemetry_interval (Optional[float]): Seconds between console status lines. None or 0 is silent. Defaults to 0.5.
+        buses (Optional[dict]): Already opened buses by bus number. Defaults to None.
+
+    Returns:
+        str: Path of the saved run file.
+    """
+    run_time = datetime.now().strftime(f'%m-%d_%H-%M-%S_{custom_name}')
+    os.makedirs(run_time, exist_ok=True)
+    capture = MultiSensorCapture(sensors, rate_hz, buses).run(duration, telemetry_interval)
+    file_path = capture.save(os.path.join(run_time, RUN_FILE_NAME), notes=custom_name)
+    print(f"Data saved to directory: {run_time}")
+    return file_path
+
+
+if __name__ == "__main__":
+    # Two ADXL357s on bus 1 plus an LSM6DS3 on bus 3, e.g. root and tip of the beam and a reference point
+    filepath = collect_multi_sensor_data([
+        SensorSpec('adxl357', 0x1D, name='root'),
+        SensorSpec('adxl357', 0x53, name='tip'),
+        SensorSpec('lsm6ds3', 0x6A, bus_number=3, name='reference'),
+    ], duration=10.0, rate_hz=2000)
+    print(f"Run saved at: {filepath}")
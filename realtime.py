@@ -0,0 +1,160 @@
+#realtime.py
+
+"""
+Opt-in real-time scheduling for acquisition loops and the timing report stored with each run.
+
+`apply_realtime_policy` pins the calling thread to a core and/or requests
+SCHED_FIFO. Anything the OS refuses (no CAP_SYS_NICE, not Linux, ...) is
+recorded instead of raised, so captures still run unprivileged. The
+resulting policy and a histogram of the inter-sample intervals are written
+to `timing_report.json` next to the data.
+"""
+
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+TIMING_REPORT_FILE = 'timing_report.json'
+
+
+def current_policy() -> dict:
+    """
+    Scheduling state of the calling thread.
+
+    Returns:
+        dict: policy name, priority and the CPUs the thread may run on.
+    """
+    state = {"policy": "unknown", "priority": None, "cpus": None}
+    if hasattr(os, 'sched_getscheduler'):
+        policy = os.sched_getscheduler(0)
+        names = {getattr(os, name): name for name in ('SCHED_OTHER', 'SCHED_FIFO', 'SCHED_RR', 'SCHED_BATCH', 'SCHED_IDLE')
+                 if hasattr(os, name)}
+        state["policy"] = names.get(policy, str(policy))
+        state["priority"] = os.sched_getparam(0).sched_priority
+    if hasattr(os, 'sched_getaffinity'):
+        state["cpus"] = sorted(os.sched_getaffinity(0))
+    return state
+
+
+def apply_realtime_policy(cpu: Optional[int] = None, fifo_priority: Optional[int] = None) -> dict:
+    """
+    Pin the calling thread to `cpu` and/or switch it to SCHED_FIFO at `fifo_priority`.
+
+    On Linux, pid 0 in the sched_* calls refers to the calling thread, so this
+    only affects the acquisition thread or process that calls it.
+
+    Args:
+        cpu (Optional[int]): Core to run on, ideally one excluded from general scheduling with isolcpus. Defaults to None.
+        fifo_priority (Optional[int]): SCHED_FIFO priority (1-99). Needs root or CAP_SYS_NICE. Defaults to None.
+
+    Returns:
+        dict: The state before the change (for `restore_policy`), what was requested, the resulting
+              state and any errors that made the call fall back.
+    """
+    report = {"previous": current_policy(), "requested": {"cpu": cpu, "fifo_priority": fifo_priority}, "errors": []}
+
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except (AttributeError, OSError, ValueError) as e:
+            report["errors"].append(f"affinity: {e}")
+
+    if fifo_priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(fifo_priority))
+        except (AttributeError, OSError) as e:
+            report["errors"].append(f"SCHED_FIFO: {e}")
+
+    for error in report["errors"]:
+        print(f"Warning: real-time setting not applied ({error}), continuing with the default scheduler.")
+    report.update(current_policy())
+    return report
+
+
+def restore_policy(report: dict) -> None:
+    """
+    Undo `apply_realtime_policy` so saving and analysis do not run with real-time priority.
+
+    Args:
+        report (dict): The value returned by `apply_realtime_policy`.
+    """
+    previous = report.get("previous", {})
+    try:
+        if previous.get("policy") == "SCHED_OTHER" and report.get("policy") != "SCHED_OTHER":
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        if previous.get("cpus") and previous["cpus"] != report.get("cpus"):
+            os.sched_setaffinity(0, previous["cpus"])
+    except (AttributeError, OSError):
+        pass
+
+
+def jitter_histogram(timestamps: np.ndarray, nominal_rate: float, bin_us: float = 5.0, max_periods: float = 4.0) -> dict:
+    """
+    Histogram and summary statistics of the intervals between consecutive samples.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds.
+        nominal_rate (float): Configured sample rate in Hz.
+        bin_us (float, optional): Histogram bin width in µs. Defaults to 5.
+        max_periods (float, optional): Upper histogram edge in nominal periods; longer intervals are
+                                       counted in `overflow`. Defaults to 4.
+
+    Returns:
+        dict: JSON-serializable bin edges, counts and interval statistics in µs.
+    """
+    intervals_us = np.diff(np.asarray(timestamps, dtype=np.float64)) * 1e6
+    if len(intervals_us) == 0:
+        return {"n_intervals": 0}
+
+    period_us = 1e6 / nominal_rate
+    edges = np.arange(0.0, max_periods * period_us + bin_us, bin_us)
+    counts, _ = np.histogram(intervals_us, bins=edges)
+    p50, p99, p999 = np.percentile(intervals_us, [50, 99, 99.9])
+    return {
+        "n_intervals": int(len(intervals_us)),
+        "nominal_period_us": period_us,
+        "bin_us": bin_us,
+        "counts": counts.tolist(),
+        "overflow": int(np.count_nonzero(intervals_us >= edges[-1])),
+        "mean_us": float(intervals_us.mean()),
+        "std_us": float(intervals_us.std()),
+        "p50_us": float(p50),
+        "p99_us": float(p99),
+        "p999_us": float(p999),
+        "max_us": float(intervals_us.max()),
+        "rate_std_hz": float(np.std(1e6 / intervals_us[intervals_us > 0])),
+    }
+
+
+def timing_report(policy: Optional[dict], timestamps: Optional[np.ndarray], nominal_rate: float) -> dict:
+    """
+    Combine the scheduling policy of a run with the jitter histogram of its timestamps.
+
+    Args:
+        policy (Optional[dict]): Value returned by `apply_realtime_policy`, or None if nothing was requested.
+        timestamps (Optional[np.ndarray]): Per-sample host timestamps, or None when they are index / ODR (FIFO).
+        nominal_rate (float): Configured sample rate in Hz.
+
+    Returns:
+        dict: The report, JSON-serializable.
+    """
+    if policy is None:
+        policy = dict(current_policy(), requested=None, errors=[])
+    policy = {key: value for key, value in policy.items() if key != "previous"}
+    jitter = jitter_histogram(timestamps, nominal_rate) if timestamps is not None else None
+    return {"scheduling": policy, "jitter": jitter}
+
+
+def save_timing_report(run_dir: str, report: dict) -> str:
+    """
+    Write a timing report next to the data files of a run.
+
+    Returns:
+        str: Path of the written JSON file.
+    """
+    path = os.path.join(run_dir, TIMING_REPORT_FILE)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
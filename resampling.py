@@ -0,0 +1,178 @@
+#resampling.py
+
+"""
+Timing checks and uniform-grid conversion for captured timestamps.
+
+Polled captures carry scheduling jitter, and failed bus reads leave gaps, so
+the samples are not evenly spaced. `timing_analysis` measures both from the
+stored timestamps. Analysis can then either move the samples onto a uniform
+grid with `resample_uniform`, or evaluate the spectrum directly at the real
+sample times with `nonuniform_spectrum`, a type-1 non-uniform FFT by Gaussian
+gridding. Both are vectorized and work in chunks, so multi-million-sample
+runs stay within memory.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from sample_clock import SampleClock, fit_sample_clock
+
+SPREAD_CHUNK = 1 << 18  # Samples spread onto the NUFFT grid per pass
+PHASE_WINDOW = 257  # Samples averaged when tracking the clock phase
+
+
+def tick_clock(timestamps: np.ndarray) -> tuple[np.ndarray, SampleClock]:
+    """
+    Assign every sample to a tick of the sample clock and fit the clock to them.
+
+    A plain least-squares fit over indices 0..N-1 stretches the period when
+    samples are missing. Here each sample is instead rounded to the nearest
+    tick of the median period, after removing the slowly drifting phase of the
+    samples against that period (a moving circular mean), so missing samples
+    advance the tick count and jitter well below half a period does not.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds, increasing.
+
+    Returns:
+        tuple[np.ndarray, SampleClock]: Tick index of every sample and the clock fitted to them.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    n = len(timestamps)
+    if n < 3:
+        return np.arange(n, dtype=np.float64), fit_sample_clock(timestamps)
+
+    cycles = (timestamps - timestamps[0]) / np.median(np.diff(timestamps))
+    phasors = np.concatenate(([0], np.cumsum(np.exp(2j * np.pi * cycles))))
+    half = min(PHASE_WINDOW, n) // 2
+    lo = np.maximum(np.arange(n) - half, 0)
+    hi = np.minimum(np.arange(n) + half + 1, n)
+    drift = np.unwrap(np.angle(phasors[hi] - phasors[lo])) / (2 * np.pi)
+
+    ticks = np.rint(cycles - drift)
+    # At least one tick between consecutive samples
+    steps = np.arange(n)
+    ticks = np.maximum.accumulate(ticks - steps) + steps
+    ticks -= ticks[0]
+    return ticks, fit_sample_clock(timestamps, ticks)
+
+
+def timing_analysis(timestamps: np.ndarray) -> dict:
+    """
+    Jitter and gaps in a capture's timestamps.
+
+    Gaps are ticks of the clock from `tick_clock` without a sample; jitter is
+    the offset of each sample from its tick.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds.
+
+    Returns:
+        dict: n_samples, rate (fitted), jitter_us (std of the offsets from the ticks), max_deviation_us,
+              n_gaps, missing_samples (ticks without a sample), longest_gap_s and gap_times
+              (last sample before each gap).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    ticks, clock = tick_clock(timestamps)
+    deviation = timestamps - (clock.offset + ticks / clock.effective_rate)
+    skipped = np.diff(ticks) - 1
+    gaps = np.flatnonzero(skipped > 0)
+    return {
+        "n_samples": int(len(timestamps)),
+        "rate": float(clock.effective_rate),
+        "jitter_us": float(np.std(deviation) * 1e6) if len(deviation) else 0.0,
+        "max_deviation_us": float(np.max(np.abs(deviation)) * 1e6) if len(deviation) else 0.0,
+        "n_gaps": int(len(gaps)),
+        "missing_samples": int(skipped[gaps].sum()),
+        "longest_gap_s": float((skipped[gaps].max() + 1) / clock.effective_rate) if len(gaps) else 0.0,
+        "gap_times": timestamps[gaps].tolist(),
+    }
+
+
+def resample_uniform(timestamps: np.ndarray, values: np.ndarray, rate: Optional[float] = None,
+                     method: str = 'linear') -> tuple[np.ndarray, np.ndarray]:
+    """
+    Interpolate samples onto a uniform time grid.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds, increasing.
+        values (np.ndarray): Samples, shape (N,) or (N, channels).
+        rate (Optional[float]): Grid rate in Hz. Defaults to the rate of `tick_clock`.
+        method (str, optional): 'linear' (np.interp) or 'cubic' (scipy CubicSpline). Defaults to 'linear'.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The grid times, starting at the first timestamp, and the values on it.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values)
+    rate = rate or tick_clock(timestamps)[1].effective_rate
+    n = int(np.floor((timestamps[-1] - timestamps[0]) * rate)) + 1
+    grid = timestamps[0] + np.arange(n) / rate
+
+    if method == 'linear':
+        if values.ndim == 1:
+            return grid, np.interp(grid, timestamps, values)
+        return grid, np.column_stack([np.interp(grid, timestamps, values[:, c]) for c in range(values.shape[1])])
+    if method == 'cubic':
+        from scipy.interpolate import CubicSpline
+        return grid, CubicSpline(timestamps, values, axis=0)(grid)
+    raise ValueError("Resampling method must be 'linear' or 'cubic'.")
+
+
+def nonuniform_spectrum(timestamps: np.ndarray, values: np.ndarray, n_freqs: int, df: float,
+                        tolerance_digits: int = 8) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Single-sided amplitude spectrum evaluated at the actual sample times.
+
+    Computes |sum_j x_j dt_j exp(-2 pi i f_k t_j)| * 2 / T for f_k = k * df, k = 0..n_freqs-1,
+    where dt_j is the time each sample represents, so gaps do not bias the
+    amplitudes. For uniform sampling this equals the 2/N-scaled FFT magnitude.
+    Uses a type-1 NUFFT with Gaussian gridding (Greengard & Lee, 2004):
+    O(N + M log M) instead of the O(N M) of a direct sum or Lomb-Scargle.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds.
+        values (np.ndarray): Real samples, shape (N,).
+        n_freqs (int): Number of frequency bins.
+        df (float): Bin spacing in Hz.
+        tolerance_digits (int, optional): Approximate accuracy in digits; sets the kernel width. Defaults to 8.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Frequencies in Hz and the amplitude at each.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    # Time each sample stands for: half the interval to each neighbour
+    edges = np.concatenate(([timestamps[0]], 0.5 * (timestamps[1:] + timestamps[:-1]), [timestamps[-1]]))
+    dt = np.diff(edges)
+    if len(timestamps) > 1:
+        dt[0] += 0.5 * (timestamps[1] - timestamps[0])
+        dt[-1] += 0.5 * (timestamps[-1] - timestamps[-2])
+    total = dt.sum()
+    weights = values * dt
+
+    # Frequencies k * df are periodic in time with period 1/df, so t maps onto [0, 2 pi)
+    x = np.mod(2 * np.pi * df * (timestamps - timestamps[0]), 2 * np.pi)
+
+    modes = 2 * n_freqs
+    grid_size = 2 * modes
+    spread = max(tolerance_digits, 2)
+    tau = np.pi * spread / (modes * modes * 2 * (2 - 0.5))
+    h = 2 * np.pi / grid_size
+    offsets = np.arange(-spread + 1, spread + 1)
+
+    grid = np.zeros(grid_size, dtype=np.float64)
+    for start in range(0, len(x), SPREAD_CHUNK):
+        xc = x[start:start + SPREAD_CHUNK]
+        wc = weights[start:start + SPREAD_CHUNK]
+        nearest = np.floor(xc / h).astype(np.int64)
+        index = nearest[:, None] + offsets
+        kernel = np.exp(-((xc[:, None] - index * h) ** 2) / (4 * tau))
+        grid += np.bincount(np.mod(index, grid_size).ravel(), weights=(wc[:, None] * kernel).ravel(),
+                            minlength=grid_size)
+
+    k = np.arange(n_freqs)
+    spectrum = np.fft.rfft(grid)[:n_freqs] / grid_size
+    spectrum *= np.sqrt(np.pi / tau) * np.exp(k * k * tau)
+    return k * df, 2.0 / total * np.abs(spectrum)
@@ -0,0 +1,270 @@
+#run_format.py
+
+"""
+Compact on-disk format for accelerometer runs.
+
+A run is a single uncompressed `.npz` file holding:
+    counts                 int32 raw sensor counts, shape (N,) or (N, channels)
+    timestamp_deltas_ns    optional int32/int64 nanosecond steps between samples
+    metadata               JSON string with scale, ODR, range, start time, notes, ...
+
+When `timestamp_deltas_ns` is absent the timebase is implicit (index / ODR).
+Members are stored uncompressed so they can be memory-mapped straight from
+the archive instead of being read into memory.
+
+Three-axis runs store counts as (N, 3) in X, Y, Z order.
+
+`load_accelerometer_data` also reads the older (1 + channels) x N float64
+`.npy` files, i.e. [timestamps, z] or [timestamps, x, y, z].
+"""
+
+import json
+import os
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+RUN_FORMAT_VERSION = 1
+RUN_FILE_NAME = 'accelerometer_run.npz'
+
+
+def _memmap_npz_member(file_path: str, name: str) -> Optional[np.ndarray]:
+    """
+    Memory-map one uncompressed member of an `.npz` archive.
+
+    Returns:
+        Optional[np.ndarray]: A read-only memmap, or None if the member is missing or compressed.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        try:
+            info = archive.getinfo(name + '.npy')
+        except KeyError:
+            return None
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+
+    with open(file_path, 'rb') as f:
+        # Local file header: 30 fixed bytes, then the file name and extra field
+        f.seek(info.header_offset + 26)
+        name_length = int.from_bytes(f.read(2), 'little')
+        extra_length = int.from_bytes(f.read(2), 'little')
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if dtype.hasobject or 0 in shape:
+        return None
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def save_run(
+        file_path: str,
+        counts: np.ndarray,
+        scale: float,
+        odr_hz: float,
+        measurement_range: int,
+        timestamps: Optional[np.ndarray] = None,
+        start_time: Optional[str] = None,
+        notes: str = '',
+        **extra_metadata
+    ) -> str:
+    """
+    Save raw counts and run metadata to a single compact `.npz` file.
+
+    Args:
+        file_path (str): Destination path; `.npz` is appended by numpy if missing.
+        counts (np.ndarray): Raw signed counts, shape (N,) or (N, channels).
+        scale (float): g per count.
+        odr_hz (float): Output data rate the sensor was configured for.
+        measurement_range (int): The measurement range in g (10, 20, or 40).
+        timestamps (Optional[np.ndarray]): Sample times in seconds. If None the timebase is index / ODR.
+        start_time (Optional[str]): Wall-clock start of the run. Defaults to now.
+        notes (str): Free-form notes. Defaults to ''.
+        **extra_metadata: Any further JSON-serializable metadata.
+
+    Returns:
+        str: The path of the saved file.
+    """
+    if not file_path.endswith('.npz'):
+        file_path += '.npz'
+
+    metadata = {
+        "format_version": RUN_FORMAT_VERSION,
+        "scale": scale,
+        "odr_hz": odr_hz,
+        "measurement_range": measurement_range,
+        "start_time": start_time or datetime.now().isoformat(timespec='seconds'),
+        "notes": notes,
+        "n_samples": int(len(counts)),
+    }
+    metadata.update(extra_metadata)
+
+    arrays = {"counts": np.asarray(counts, dtype=np.int32)}
+    if timestamps is not None and len(timestamps):
+        timestamps_ns = np.rint(np.asarray(timestamps, dtype=np.float64) * 1e9).astype(np.int64)
+        metadata["first_timestamp_ns"] = int(timestamps_ns[0])
+        deltas = np.diff(timestamps_ns)
+        # Sample steps are far below 2**31 ns (~2.1 s) unless the capture stalled
+        if len(deltas) == 0 or (deltas.min() >= np.iinfo(np.int32).min and deltas.max() <= np.iinfo(np.int32).max):
+            deltas = deltas.astype(np.int32)
+        arrays["timestamp_deltas_ns"] = deltas
+
+    np.savez(file_path, metadata=np.array(json.dumps(metadata)), **arrays)
+    return file_path
+
+
+class AccelerometerRun:
+    """
+    Lazily loaded view of a run saved with `save_run`.
+
+    Nothing but the metadata is read when the run is opened; `counts` is
+    memory-mapped from the archive and the derived arrays are computed on
+    first access.
+
+    Args:
+        file_path (str): Path of the `.npz` run file.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with np.load(file_path) as archive:
+            self.metadata = json.loads(str(archive["metadata"]))
+        self._counts = None
+        self._timestamps = None
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Raw signed counts, shape (N,) or (N, channels)."""
+        if self._counts is None:
+            self._counts = _memmap_npz_member(self.file_path, "counts")
+            if self._counts is None:
+                with np.load(self.file_path) as archive:
+                    self._counts = archive["counts"]
+        return self._counts
+
+    @property
+    def data(self) -> np.ndarray:
+        """Acceleration in g."""
+        return self.counts * self.metadata["scale"]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Sample times in seconds, from the stored deltas or from index / ODR."""
+        if self._timestamps is None:
+            with np.load(self.file_path) as archive:
+                if "timestamp_deltas_ns" in archive.files:
+                    steps = archive["timestamp_deltas_ns"].astype(np.int64)
+                    timestamps_ns = np.empty(len(steps) + 1, dtype=np.int64)
+                    timestamps_ns[0] = self.metadata["first_timestamp_ns"]
+                    np.cumsum(steps, out=timestamps_ns[1:])
+                    timestamps_ns[1:] += timestamps_ns[0]
+                    self._timestamps = timestamps_ns / 1e9
+                else:
+                    self._timestamps = np.arange(self.metadata["n_samples"]) / self.metadata["odr_hz"]
+        return self._timestamps
+
+    def __len__(self) -> int:
+        return self.metadata["n_samples"]
+
+
+def load_run(file_path: str) -> AccelerometerRun:
+    """
+    Open a run saved with `save_run`.
+
+    Args:
+        file_path (str): Path of the `.npz` run file.
+
+    Returns:
+        AccelerometerRun: The lazily loaded run.
+    """
+    return AccelerometerRun(file_path)
+
+
+def is_run_file(file_path: str) -> bool:
+    """True if `file_path` is a compact run file rather than a legacy `.npy` array."""
+    return file_path.endswith('.npz')
+
+
+def load_accelerometer_axes(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load timestamps and every recorded axis from either a run file or a legacy `.npy` file.
+
+    Legacy files are memory-mapped, so only the parts that are used are read from disk.
+
+    Args:
+        file_path (str): Path of a `.npz` run file or a [timestamps, data...] `.npy` file.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Timestamps in seconds and acceleration in g of shape (N, channels).
+    """
+    if is_run_file(file_path):
+        run = load_run(file_path)
+        return run.timestamps, run.data.reshape(len(run), -1)
+
+    data = np.load(file_path, mmap_mode='r')
+    return data[0], data[1:].T
+
+
+def load_accelerometer_data(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load timestamps and Z-axis acceleration from either a run file or a legacy `.npy` file.
+
+    For three-axis recordings Z is the last channel.
+
+    Args:
+        file_path (str): Path of a `.npz` run file or a [timestamps, data...] `.npy` file.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Timestamps in seconds and acceleration in g.
+    """
+    timestamps, axes = load_accelerometer_axes(file_path)
+    return timestamps, axes[:, -1]
+
+
+def convert_npy_to_run(
+        npy_file_path: str,
+        measurement_range: int,
+        odr_hz: float,
+        run_file_path: Optional[str] = None,
+        notes: str = '',
+        remove_npy: bool = False,
+        **extra_metadata
+    ) -> str:
+    """
+    Convert a legacy [timestamps, data...] float64 `.npy` file into a compact run file.
+
+    The g values are turned back into exact counts with the range scale factor.
+
+    Args:
+        npy_file_path (str): Path of the legacy file.
+        measurement_range (int): The measurement range the data was recorded with (10, 20, or 40).
+        odr_hz (float): Output data rate the data was recorded with.
+        run_file_path (Optional[str]): Destination path. Defaults to the source path with a `.npz` suffix.
+        notes (str): Notes to store with the run. Defaults to ''.
+        remove_npy (bool): Delete the source file after converting. Defaults to False.
+        **extra_metadata: Further metadata passed on to `save_run`.
+
+    Returns:
+        str: The path of the run file.
+    """
+    from adxl357 import SCALE_FACTORS
+
+    scale = SCALE_FACTORS[measurement_range]
+    data = np.load(npy_file_path, mmap_mode='r')
+    values = data[1] if data.shape[0] == 2 else data[1:].T
+    counts = np.rint(values / scale).astype(np.int32)
+    if run_file_path is None:
+        run_file_path = os.path.splitext(npy_file_path)[0] + '.npz'
+    run_file_path = save_run(run_file_path, counts, scale, odr_hz, measurement_range,
+                             timestamps=data[0], notes=notes, **extra_metadata)
+    del data
+    if remove_npy:
+        os.remove(npy_file_path)
+    return run_file_path
@@ -0,0 +1,154 @@
+#sample_clock.py
+
+"""
+Sample-clock model for a capture.
+
+A run's timeline is described by t_k = offset + k / effective_rate, fitted
+by least squares against the monotonic host clock. The model is stored with
+the run so every analysis uses the same sample rate instead of re-estimating
+it from the timestamps.
+"""
+
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+SAMPLE_CLOCK_FILE = 'sample_clock.json'
+
+
+class SampleClock:
+    """
+    Linear model of the sensor sample clock against the host monotonic clock.
+
+    Args:
+        nominal_rate (float): Rate the sensor or pacer was configured for, in Hz.
+        effective_rate (float): Measured rate in Hz.
+        offset (float): Time of sample 0 on the run clock in seconds.
+        residual_std (float): Standard deviation of the sample times around the fit in seconds.
+        source (str): 'timestamps' for per-sample host stamps, 'fifo' for FIFO burst arrivals.
+    """
+
+    def __init__(self, nominal_rate: float, effective_rate: float, offset: float = 0.0,
+                 residual_std: float = 0.0, source: str = 'timestamps'):
+        self.nominal_rate = nominal_rate
+        self.effective_rate = effective_rate
+        self.offset = offset
+        self.residual_std = residual_std
+        self.source = source
+
+    def to_dict(self) -> dict:
+        return {
+            "nominal_rate": self.nominal_rate,
+            "effective_rate": self.effective_rate,
+            "offset": self.offset,
+            "residual_std": self.residual_std,
+            "source": self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "SampleClock":
+        return cls(**values)
+
+    def __repr__(self) -> str:
+        return (f"SampleClock(nominal_rate={self.nominal_rate}, effective_rate={self.effective_rate:.4f}, "
+                f"offset={self.offset:.6f}, residual_std={self.residual_std:.2e}, source={self.source!r})")
+
+
+def fit_sample_clock(
+        times: np.ndarray,
+        indices: Optional[np.ndarray] = None,
+        nominal_rate: Optional[float] = None,
+        source: str = 'timestamps'
+    ) -> SampleClock:
+    """
+    Fit t = offset + index / rate by least squares.
+
+    Args:
+        times (np.ndarray): Times in seconds on one monotonic clock.
+        indices (Optional[np.ndarray]): Sample index belonging to each time. Defaults to 0..N-1.
+        nominal_rate (Optional[float]): Configured rate, stored alongside the fit. Defaults to the fitted rate.
+        source (str): Where the times came from, stored in the model. Defaults to 'timestamps'.
+
+    Returns:
+        SampleClock: The fitted model.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    indices = np.arange(len(times), dtype=np.float64) if indices is None else np.asarray(indices, dtype=np.float64)
+    if len(times) < 2:
+        rate = nominal_rate or 0.0
+        return SampleClock(nominal_rate or rate, rate, float(times[0]) if len(times) else 0.0, 0.0, source)
+
+    # Centre both axes so the fit stays well conditioned for long runs
+    index_mean, time_mean = indices.mean(), times.mean()
+    di = indices - index_mean
+    period = np.dot(di, times - time_mean) / np.dot(di, di)
+    offset = time_mean - period * index_mean
+    residual_std = float(np.std(times - (offset + period * indices)))
+    rate = 1.0 / period
+    return SampleClock(nominal_rate or rate, float(rate), float(offset), residual_std, source)
+
+
+def save_sample_clock(run_dir: str, clock: SampleClock) -> str:
+    """
+    Write the clock model next to the data files of a run.
+
+    Args:
+        run_dir (str): Directory of the run.
+        clock (SampleClock): The model to store.
+
+    Returns:
+        str: Path of the written JSON file.
+    """
+    path = os.path.join(run_dir, SAMPLE_CLOCK_FILE)
+    with open(path, 'w') as f:
+        json.dump(clock.to_dict(), f, indent=2)
+    return path
+
+
+def load_sample_clock(file_path: str) -> Optional[SampleClock]:
+    """
+    Find the stored clock model for a data file.
+
+    Run files carry it in their metadata; `.npy` files use a `sample_clock.json`
+    in the same directory.
+
+    Args:
+        file_path (str): Path of a `.npz` run file or `.npy` data file.
+
+    Returns:
+        Optional[SampleClock]: The stored model, or None for runs recorded before it existed.
+    """
+    if file_path.endswith('.npz'):
+        from run_format import load_run
+        values = load_run(file_path).metadata.get("sample_clock")
+        return SampleClock.from_dict(values) if values else None
+
+    path = os.path.join(os.path.dirname(file_path), SAMPLE_CLOCK_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return SampleClock.from_dict(json.load(f))
+    return None
+
+
+def sample_rate_for(file_path: str, timestamps: np.ndarray) -> float:
+    """
+    The sample rate analysis should use for a data file.
+
+    Uses the stored clock model when there is one. Older recordings fall back
+    to `resampling.tick_clock`, which fits the timestamps against their ticks
+    so missing samples do not stretch the period.
+
+    Args:
+        file_path (str): Path of the data file.
+        timestamps (np.ndarray): Timestamps loaded from it.
+
+    Returns:
+        float: Sample rate in Hz.
+    """
+    clock = load_sample_clock(file_path)
+    if clock is None:
+        from resampling import tick_clock
+        clock = tick_clock(timestamps)[1]
+    return clock.effective_rate
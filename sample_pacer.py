@@ -0,0 +1,89 @@
+#sample_pacer.py
+
+"""
+Absolute-deadline pacing for polled acquisition loops.
+
+Sample k is due at t0 + k / rate on the monotonic nanosecond clock, so timing
+errors in one iteration do not carry over into the next one.
+"""
+
+import time
+
+
+class DeadlinePacer:
+    """
+    Paces a loop to a fixed rate using absolute deadlines and a hybrid sleep.
+
+    Most of the wait is spent in `time.sleep`, which frees the core for other
+    threads (e.g. audio playback), and only the last `spin_ns` nanoseconds are
+    busy-waited to hit the deadline precisely.
+
+    Args:
+        rate_hz (float): Target loop rate in Hz.
+        spin_ns (int, optional): Busy-wait window before each deadline in nanoseconds. Defaults to 200 µs.
+    """
+
+    def __init__(self, rate_hz: float, spin_ns: int = 200_000):
+        self.rate_hz = rate_hz
+        self.period_ns = int(round(1e9 / rate_hz))
+        self.spin_ns = spin_ns
+        self.t0_ns = None
+        self.index = 0
+        self.missed = 0
+
+    def start(self, t0_ns: int = None) -> int:
+        """
+        Set the time origin; the first deadline is the start time itself.
+
+        Args:
+            t0_ns (int, optional): Origin in monotonic nanoseconds, so several pacers can share one
+                                   timeline. Defaults to now.
+
+        Returns:
+            int: The start time in monotonic nanoseconds.
+        """
+        self.t0_ns = time.monotonic_ns() if t0_ns is None else t0_ns
+        self.index = 0
+        self.missed = 0
+        return self.t0_ns
+
+    def deadline_ns(self, index: int) -> int:
+        """Absolute monotonic time at which sample `index` is due."""
+        return self.t0_ns + index * self.period_ns
+
+    def wait(self) -> int:
+        """
+        Block until the next deadline and advance to the one after it.
+
+        If the loop has fallen more than one period behind, the deadlines that
+        can no longer be met are skipped and counted in `missed` rather than
+        being run back to back.
+
+        Returns:
+            int: Index of the deadline that was waited for.
+        """
+        if self.t0_ns is None:
+            self.start()
+
+        deadline = self.deadline_ns(self.index)
+        now = time.monotonic_ns()
+        late = now - deadline
+        if late > self.period_ns:
+            skipped = late // self.period_ns
+            self.missed += skipped
+            self.index += skipped
+            deadline = self.deadline_ns(self.index)
+
+        remaining = deadline - now
+        if remaining > self.spin_ns:
+            time.sleep((remaining - self.spin_ns) / 1e9)
+        while time.monotonic_ns() < deadline:
+            pass
+
+        index = self.index
+        self.index += 1
+        return index
+
+    def elapsed(self) -> float:
+        """Seconds since `start` on the monotonic clock."""
+        return (time.monotonic_ns() - self.t0_ns) / 1e9
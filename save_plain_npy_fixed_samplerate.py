@@ -1,139 +1,149 @@
 import os
 os.environ['DISPLAY'] = ':0'  # to run the code from SSH but show on the monitor do not delete
 import time
+from functools import partial
 import numpy as np
 from datetime import datetime
-import smbus2 as smbus
-
-# I2C address
-I2C_ADDRESS = 0x1D  # 0x1D for the ADXL357, SOMETIMES 0X53 depending on configuration
-goal_sampling_rate = 4000  # Hz
-# ADXL357 Register Addresses
-REG_ZDATA3 = 0x0E
-REG_ODR_FILTER = 0x28
-REG_POWER_CTL = 0x2D  # Power Control register
-REG_RESET = 0x2F      # Reset register
-REG_RANGE = 0x2C      # Range register for ADXL357
-
-# Initialize the I2C bus
-bus = smbus.SMBus(1)
-
-def init_ADXL357(MEASUREMENT_RANGE):
+from i2c_bus import open_bus
+from device_discovery import find_address
+from adxl357 import (DEFAULT_ODR_HZ, REG_ZDATA3, SCALE_FACTORS, XYZ_DATA_BYTES, FifoSampleCounter, FilterSettings,
+                     collect_fifo_blocks, configure_adxl357, decode_raw_counts, decode_raw_to_g, decode_xyz_raw_to_g,
+                     read_xyz_raw, save_filter_settings)
+from sample_pacer import DeadlinePacer
+from telemetry import start_telemetry
+from capture_buffer import CaptureBuffer
+from stream_writer import ChunkedWriter
+from run_format import RUN_FILE_NAME, save_run, convert_npy_to_run
+from sample_clock import fit_sample_clock, save_sample_clock
+from realtime import apply_realtime_policy, restore_policy, save_timing_report, timing_report
+
+goal_sampling_rate = DEFAULT_ODR_HZ  # Hz, used when no analysis band is given
+
+# Initialize the I2C bus (set ACCEL_BUS_BACKEND=sim to run against the emulator)
+bus = open_bus(1)
+
+# I2C address of the ADXL357 (0x1D, or 0x53 depending on its ASEL pin), looked up in the cached device scan on first use
+I2C_ADDRESS = None
+
+def resolve_i2c_address(i2c_bus=None):
+    """Find the ADXL357 address on first use, so importing this module does not probe the bus."""
+    global I2C_ADDRESS
+    if I2C_ADDRESS is None:
+        I2C_ADDRESS = find_address('adxl357', i2c_bus or bus, default=0x1D)
+    return I2C_ADDRESS
+
+def init_ADXL357(MEASUREMENT_RANGE, i2c_bus=None, odr_filter=0x00):
     """
     Initializes the ADXL357 accelerometer by resetting the device, setting the output data rate (ODR),
     configuring the measurement range, and enabling measurement mode.
 
     Parameters:
     MEASUREMENT_RANGE (int): The measurement range in g (10, 20, or 40).
+    i2c_bus (optional): Bus to use instead of the module bus, e.g. a SimulatedSMBus.
+    odr_filter (int, optional): ODR_FILTER register value, see `FilterSettings.register`. Defaults to 0x00.
     """
-    # Reset the device
-    bus.write_byte_data(I2C_ADDRESS, REG_RESET, 0x52)  # Reset command
-    time.sleep(0.1)  # Wait for the reset to complete
-    
-    # Set ODR to 4000 Hz, no filters applied
-    bus.write_byte_data(I2C_ADDRESS, REG_ODR_FILTER, 0x00)
-
-    # Set the measurement range
-    if MEASUREMENT_RANGE == 10:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x01)  # ±10g
-    elif MEASUREMENT_RANGE == 20:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x02)  # ±20g
-    elif MEASUREMENT_RANGE == 40:
-        bus.write_byte_data(I2C_ADDRESS, REG_RANGE, 0x03)  # ±40g
-    else:
-        raise ValueError("Invalid measurement range specified. Use 10, 20, or 40.")
-    
-    bus.write_byte_data(I2C_ADDRESS, REG_POWER_CTL, 0x06)  # Enable measurement mode
+    i2c_bus = i2c_bus or bus
+    configure_adxl357(i2c_bus, resolve_i2c_address(i2c_bus), MEASUREMENT_RANGE, odr_filter)
 
-def read_accel_data(MEASUREMENT_RANGE):
+def read_accel_raw(i2c_bus=None):
     """
-    Reads the Z-axis acceleration data from the ADXL357 accelerometer and converts it to g units.
+    Reads the three undecoded Z-axis data bytes (ZDATA3, ZDATA2, ZDATA1) from the ADXL357.
+
+    Decoding is left to `decode_raw_to_g`, which converts whole blocks at once after the capture.
 
     Parameters:
-    MEASUREMENT_RANGE (int): The measurement range in g (10, 20, or 40).
+    i2c_bus (optional): Bus to use instead of the module bus.
 
     Returns:
-    float: The Z-axis acceleration in g.
+    list: The three Z-axis data bytes.
     """
-    # Read 3 bytes for Z-axis
-    z = bus.read_i2c_block_data(I2C_ADDRESS, REG_ZDATA3, 3)
-    
-    # Combine bytes and apply two's complement
-    z_data = (z[0] << 12) | (z[1] << 4) | (z[2] >> 4)
-    
-    # Apply two's complement correction
-    if z_data & (1 << 19):
-        z_data -= (1 << 20)
-    
-    # Convert raw data to g units based on the measurement range
-    if MEASUREMENT_RANGE == 10:
-        z_g = z_data * 0.0000187  # Scale for 10g range
-    elif MEASUREMENT_RANGE == 20:
-        z_g = z_data * 0.0000187 * 2  # Scale for 20g range (double the 10g range)
-    elif MEASUREMENT_RANGE == 40:
-        z_g = z_data * 0.0000187 * 4  # Scale for 40g range (four times the 10g range)
-
-    return z_g
+    return (i2c_bus or bus).read_i2c_block_data(I2C_ADDRESS, REG_ZDATA3, 3)
 
 def save_accelerometer_numpy(z_data, timestamps, run_time):
     """
     Saves the accelerometer data and timestamps to a numpy array file.
 
     Parameters:
-    z_data (list): List of Z-axis acceleration data.
-    timestamps (list): List of timestamps corresponding to the acceleration data.
+    z_data (np.ndarray): Z-axis acceleration data, or (N, 3) X, Y, Z data for three-axis captures.
+    timestamps (np.ndarray): Timestamps corresponding to the acceleration data.
     run_time (str): The directory name where the data will be saved.
 
     Returns:
-    str: The file path of the saved numpy array.
+    str: The file path of the saved numpy array, [timestamps, z] or [timestamps, x, y, z].
     """
-    np.save(os.path.join(run_time, 'accelerometer_data.npy'), np.array([timestamps, z_data]))
-    return os.path.join(run_time, 'accelerometer_data.npy')
+    npy_file_path = os.path.join(run_time, 'accelerometer_data.npy')
+    values = np.reshape(z_data, (len(z_data), -1))
+    # Write the rows straight into the file instead of stacking a second copy in memory
+    out = np.lib.format.open_memmap(npy_file_path, mode='w+', dtype=np.float64, shape=(1 + values.shape[1], len(values)))
+    out[0] = timestamps
+    out[1:] = values.T
+    out.flush()
+    del out
+    return npy_file_path
 
-def collect_accelerometer_data(duration=None, custom_name=None, measurement_range=10):
+def collect_accelerometer_data(duration=None, custom_name=None, measurement_range=10, use_fifo=False,
+                               telemetry_interval=0.5, stream_to_disk=False, compact_format=False, i2c_bus=None,
+                               three_axis=False, rt_cpu=None, rt_priority=None, band=None):
     """
-    Collects Z-axis accelerometer data for a specified duration and saves it to a numpy array.
+    Collects Z-axis (or X, Y and Z) accelerometer data for a specified duration and saves it to a numpy array.
 
     Parameters:
     duration (float, optional): The duration for data collection in seconds. If None, the user is prompted to input a value.
     custom_name (str, optional): A custom name to append to the directory where data is saved. If None, the user is prompted to input a value.
     measurement_range (int, optional): The measurement range in g (10, 20, or 40). Defaults to 10g.
+    use_fifo (bool, optional): Burst-read the sensor FIFO instead of polling ZDATA once per sample.
+        The sample rate is then set by the sensor ODR and timestamps are index / ODR. Defaults to False.
+    telemetry_interval (float, optional): Seconds between console status lines during the capture.
+        None or 0 keeps the console silent. Defaults to 0.5.
+    stream_to_disk (bool, optional): Flush samples to disk in chunks from a background thread during the
+        capture instead of keeping the whole run in memory. Defaults to False.
+    compact_format (bool, optional): Save an accelerometer_run.npz file with int32 counts and run metadata
+        instead of the 2 x N float64 accelerometer_data.npy. Defaults to False.
+    i2c_bus (optional): Bus to capture from instead of the module bus, e.g. a SimulatedSMBus from
+        `open_bus(backend='sim')` for hardware-free runs and benchmarks. Defaults to None.
+    three_axis (bool, optional): Record X, Y and Z, read in one 9-byte transaction per sample, and save them
+        as an (N, 3) array. Defaults to False.
+    rt_cpu (int, optional): Pin the acquisition loop to this CPU core during the capture. Defaults to None.
+    rt_priority (int, optional): Run the acquisition loop with SCHED_FIFO at this priority (1-99) during the
+        capture. Needs root or CAP_SYS_NICE; without it the capture runs on the default scheduler.
+        The active policy and a histogram of the sample intervals are saved with the run. Defaults to None.
+    band (float or tuple, optional): Frequency band of interest in Hz, as the highest frequency or a
+        (low, high) pair. The lowest ODR whose on-chip low-pass still passes `high` is used, with the
+        high-pass corner a decade below `low`, and the capture runs at that ODR. None keeps
+        `goal_sampling_rate` without filters. Defaults to None.
 
     Returns:
-    str: The file path of the saved numpy array.
+    str: The file path of the saved numpy array or run file.
     """
-    # Global variables for accelerometer data
-    z_axis_data = []
-    timestamps_data = []
-    intervals = []
-    start_time = None
-    last_time = None
+    i2c_bus = i2c_bus or bus
+    resolve_i2c_address(i2c_bus)
+    if band is None:
+        sensor_filter = FilterSettings(goal_sampling_rate)
+    elif np.isscalar(band):
+        sensor_filter = FilterSettings.for_band(band)
+    else:
+        sensor_filter = FilterSettings.for_band(band[1], band[0])
+    sample_rate = sensor_filter.odr_hz
+    capture = None
+    start_ns = None
+    if three_axis:
+        read_raw, raw_bytes, decode = partial(read_xyz_raw, i2c_bus, I2C_ADDRESS), XYZ_DATA_BYTES, decode_xyz_raw_to_g
+    else:
+        read_raw, raw_bytes, decode = partial(read_accel_raw, i2c_bus), 3, decode_raw_to_g
 
     def read_acc_data():
-        nonlocal last_time
         try:
-            # Read data
-            z = read_accel_data(measurement_range)
-
-            # Calculate the current time and elapsed time
-            current_time = time.time()
-            if last_time is not None:
-                interval = current_time - last_time
-                intervals.append(interval)
-                sampling_rate = 1 / interval
-            else:
-                interval = 0
-                sampling_rate = 0
-            last_time = current_time
-            elapsed_time = current_time - start_time
-
-            z_axis_data.append(z)
-            timestamps_data.append(elapsed_time)
-
-            print(f"Z: {z:.6f}, Time: {elapsed_time:.6f}s, "
-                  f"Sampling Rate: {sampling_rate:.2f} Hz")
+            # Read raw bytes; decoding happens in one vectorized pass after the capture
+            z_raw = read_raw()
         except Exception as e:
-            print(f"Error: {e}")
+            stats.error(e)
+            return
+
+        # Stamp the sample on the monotonic nanosecond clock, relative to the start of the capture.
+        # A failed stream writer raises from append, which ends the capture rather than counting as a read error.
+        current_ns = time.monotonic_ns()
+        capture.append((current_ns - start_ns) * 1e-9, z_raw)
+        stats.record(current_ns * 1e-9)
 
     # Load last run settings if available
     try:
@@ -151,34 +161,106 @@ def collect_accelerometer_data(duration=None, custom_name=None, measurement_rang
         custom_name = input(f"Enter a custom name to append to the folder [{last_custom_name}]: ") or last_custom_name
     if measurement_range is None:
         measurement_range = int(input("Enter the measurement range (10, 20, or 40): "))
-    
-    start_time = time.time()  # Initialize start_time
-    last_time = start_time  # Initialize last_time
 
-    init_ADXL357(measurement_range)
+
+    init_ADXL357(measurement_range, i2c_bus, sensor_filter.register)
+    print(f"ADXL357 filter: {sensor_filter.describe()}")
 
     # Create directory for the current run
     run_time = datetime.now().strftime(f'%m-%d_%H-%M-%S_{custom_name}')
     os.makedirs(run_time, exist_ok=True)
 
-    while (time.time() - start_time) < duration:
-        loop_start_time = time.time()
-        
-        read_acc_data()
+    # Captures hold the raw data bytes (N x 3 or N x 9 uint8) and are decoded per chunk or at save time
+    if stream_to_disk:
+        capture = ChunkedWriter(os.path.join(run_time, 'accelerometer_data.npy'), channels=3 if three_axis else 1,
+                                raw_shape=(raw_bytes,), raw_dtype=np.uint8,
+                                decode=partial(decode, measurement_range=measurement_range))
+    else:
+        capture = CaptureBuffer.for_duration(duration, sample_rate, channels=raw_bytes, dtype=np.uint8)
+    stats, reporter = start_telemetry(telemetry_interval)
+    policy = None
+    if rt_cpu is not None or rt_priority is not None:
+        policy = apply_realtime_policy(rt_cpu, rt_priority)
+
+    try:
+        if use_fifo:
+            # Burst arrival times against the running sample count give the sensor's real ODR. The
+            # count includes the samples lost in overruns, which would otherwise drag the rate down.
+            arrival_times, arrival_counts = [], []
+            counter = FifoSampleCounter(sample_rate, on_overrun=stats.error)
+            start_ns = time.monotonic_ns()
+            for block in collect_fifo_blocks(i2c_bus, I2C_ADDRESS, duration, sample_rate, on_overrun=counter.overrun):
+                arrival_ns = time.monotonic_ns()
+                timestamps = counter.timestamps(len(block), arrival_ns)
+                capture.extend(timestamps, block.reshape(len(block), -1) if three_axis else block[:, 2])
+                # Telemetry gets the burst's arrival on the wall clock, not the index-based timestamps
+                stats.record_block(len(block), arrival_ns * 1e-9)
+                arrival_times.append((arrival_ns - start_ns) * 1e-9)
+                arrival_counts.append(counter.n)
+            print(f"Read {len(capture)} samples from the FIFO ({len(capture) / duration:.2f} Hz)")
+            if counter.lost:
+                print(f"Warning: {counter.overruns} FIFO overruns lost about {counter.lost} samples.")
+        else:
+            # Sample k is due at t0 + k / sample_rate, so loop overruns do not accumulate
+            pacer = DeadlinePacer(sample_rate)
+            start_ns = pacer.start()
+            while pacer.elapsed() < duration:
+                pacer.wait()
+                read_acc_data()
 
-        # Calculate time spent in the loop and adjust accordingly
-        loop_end_time = time.time()
-        elapsed_loop_time = loop_end_time - loop_start_time
-        if elapsed_loop_time < (1.0 / goal_sampling_rate):  # If the loop runs faster than desired sample rate
-            while time.time() - loop_start_time < (1.0 / goal_sampling_rate):
-                pass  # Busy-wait until the next sample time
+            if pacer.missed:
+                print(f"Missed {pacer.missed} sample deadlines ({100 * pacer.missed / pacer.index:.2f}%)")
+    except KeyboardInterrupt:
+        print("Capture interrupted, saving the samples recorded so far.")
+    finally:
+        if policy is not None:
+            restore_policy(policy)
+        reporter.stop()
 
     # Save data and return the filepath
-    npy_file_path = save_accelerometer_numpy(z_axis_data, timestamps_data, run_time)
+    if stream_to_disk:
+        npy_file_path = capture.close()
+        timestamps = np.load(npy_file_path, mmap_mode='r')[0]
+    else:
+        timestamps = capture.timestamps
+
+    if use_fifo:
+        clock = fit_sample_clock(arrival_times, arrival_counts, sample_rate, source='fifo')
+    else:
+        clock = fit_sample_clock(timestamps, nominal_rate=sample_rate)
+        if len(timestamps) > 1:
+            sampling_rate_std = np.std(1 / np.diff(timestamps))
+            print(f"Standard Deviation of Sampling Rate: {sampling_rate_std:.6f} Hz")
+    print(f"Effective sampling rate: {clock.effective_rate:.3f} Hz (nominal {sample_rate} Hz)")
 
-    if intervals:
-        sampling_rate_std = np.std([1 / interval for interval in intervals])
-        print(f"Standard Deviation of Sampling Rate: {sampling_rate_std:.6f} Hz")
+    # FIFO timestamps are index / ODR, so only the scheduling policy is meaningful there
+    timing = timing_report(policy, None if use_fifo else timestamps, sample_rate)
+    if timing["jitter"] and timing["jitter"]["n_intervals"]:
+        jitter = timing["jitter"]
+        print(f"Sample interval p50/p99/max: {jitter['p50_us']:.1f} / {jitter['p99_us']:.1f} / {jitter['max_us']:.1f} µs "
+              f"({timing['scheduling']['policy']})")
+
+    if compact_format and stream_to_disk:
+        del timestamps
+        npy_file_path = convert_npy_to_run(npy_file_path, measurement_range, sample_rate,
+                                           os.path.join(run_time, RUN_FILE_NAME), notes=custom_name, remove_npy=True,
+                                           sample_clock=clock.to_dict(), timing=timing,
+                                           sensor_filter=sensor_filter.to_dict())
+    elif compact_format:
+        # FIFO timestamps are index / ODR, so they only need to be stored when overruns left gaps
+        counts = decode_raw_counts(capture.values.reshape(len(capture), -1, 3))
+        gapless = use_fifo and not counter.lost
+        npy_file_path = save_run(os.path.join(run_time, RUN_FILE_NAME), counts if three_axis else counts[:, 0],
+                                 SCALE_FACTORS[measurement_range], sample_rate, measurement_range,
+                                 timestamps=None if gapless else capture.timestamps, notes=custom_name,
+                                 sample_clock=clock.to_dict(), timing=timing, sensor_filter=sensor_filter.to_dict())
+    else:
+        if not stream_to_disk:
+            z_data = decode(capture.values, measurement_range)
+            npy_file_path = save_accelerometer_numpy(z_data, capture.timestamps, run_time)
+        save_sample_clock(run_time, clock)
+        save_timing_report(run_time, timing)
+        save_filter_settings(run_time, sensor_filter)
 
     print(f"Data saved to directory: {run_time}")
 
@@ -0,0 +1,326 @@
+#shm_sampler.py
+
+"""
+Process-isolated ADXL357 sampler.
+
+The sampling loop runs in its own process, so it does not compete for the
+GIL with audio playback or plotting in the main process, and publishes raw
+samples into a `multiprocessing.shared_memory` ring buffer. The ring has a
+single producer and a single consumer: the sampler only ever advances the
+write index and the reader only ever advances the read index, and the reader
+sees the samples as numpy views of the shared block. Both indices are read
+and written under a shared `multiprocessing` lock, which orders the index
+update after the sample data on weakly ordered CPUs such as ARM64; the lock
+is never held while samples are copied. The sampler process is started with
+the 'spawn' method, so it does not inherit locks held by the telemetry or
+audio threads of the main process at the moment it starts, and it opens its
+own bus rather than sharing a bus object with the main process.
+"""
+
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from adxl357 import (
+    DEFAULT_ODR_HZ, REG_POWER_CTL, REG_ZDATA3, XYZ_DATA_BYTES, FifoSampleCounter, FilterSettings, collect_fifo_blocks,
+    configure_adxl357, read_xyz_raw,
+)
+from i2c_bus import open_bus
+from realtime import apply_realtime_policy
+from sample_clock import fit_sample_clock
+from sample_pacer import DeadlinePacer
+
+# Header slots (int64) in front of the sample arrays
+_WRITE, _READ, _DONE, _STOP, _DROPPED, _OVERRUNS = range(6)
+HEADER_SLOTS = 8
+# A fresh interpreter for the sampler instead of a fork of a process with running threads
+MP_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class SharedRingBuffer:
+    """
+    Single-producer single-consumer ring of (timestamp, raw bytes) samples in shared memory.
+
+    Indices count samples since the start and only grow; the slot of sample i
+    is i % capacity. A full ring drops new samples and counts them instead of
+    overwriting samples the reader has not seen yet.
+
+    Plain numpy stores give no ordering guarantee between cores, and on ARM64
+    the reader could see a new write index before the sample data behind it.
+    The read and write indices are therefore only read and written while
+    holding a shared lock, whose acquire and release act as memory barriers.
+    The lock is held for a single index access, never while samples are copied.
+
+    Args:
+        capacity (int): Number of samples the ring holds.
+        raw_bytes (int): Raw bytes per sample (3 for Z only, 9 for XYZ).
+        name (Optional[str]): Name of an existing block to attach to. Defaults to None, which creates a new one.
+        lock (optional): The creator's `lock`, required when attaching. Defaults to None, which creates one.
+    """
+
+    def __init__(self, capacity: int, raw_bytes: int, name: Optional[str] = None, lock=None):
+        self.capacity = int(capacity)
+        self.raw_bytes = raw_bytes
+        self.lock = lock if lock is not None else MP_CONTEXT.Lock()
+        size = 8 * HEADER_SLOTS + self.capacity * (8 + raw_bytes)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        buf = self.shm.buf
+        self._header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=buf)
+        self.timestamps = np.ndarray(self.capacity, dtype=np.float64, buffer=buf, offset=8 * HEADER_SLOTS)
+        self.raw = np.ndarray((self.capacity, raw_bytes), dtype=np.uint8, buffer=buf,
+                              offset=8 * HEADER_SLOTS + 8 * self.capacity)
+        if name is None:
+            self._header[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return int(self._header[_DROPPED])
+
+    @property
+    def overruns(self) -> int:
+        """FIFO overruns the producer has seen so far."""
+        return int(self._header[_OVERRUNS])
+
+    def count_overrun(self, exc=None) -> None:
+        """Count one FIFO overrun (producer side); usable as an `on_overrun` callback."""
+        self._header[_OVERRUNS] += 1
+
+    @property
+    def done(self) -> bool:
+        return bool(self._header[_DONE])
+
+    def mark_done(self) -> None:
+        self._header[_DONE] = 1
+
+    @property
+    def stop_requested(self) -> bool:
+        return bool(self._header[_STOP])
+
+    def request_stop(self) -> None:
+        self._header[_STOP] = 1
+
+    def _load(self, slot: int) -> int:
+        with self.lock:
+            return int(self._header[slot])
+
+    def _store(self, slot: int, value: int) -> None:
+        with self.lock:
+            self._header[slot] = value
+
+    def write(self, timestamp: float, raw) -> bool:
+        """
+        Publish one sample (producer side).
+
+        Returns:
+            bool: False if the ring was full and the sample was dropped.
+        """
+        w = int(self._header[_WRITE])
+        if w - self._load(_READ) >= self.capacity:
+            self._header[_DROPPED] += 1
+            return False
+        slot = w % self.capacity
+        self.timestamps[slot] = timestamp
+        self.raw[slot] = raw
+        # The index is only advanced once the sample is in place
+        self._store(_WRITE, w + 1)
+        return True
+
+    def write_block(self, timestamps: np.ndarray, raw: np.ndarray) -> int:
+        """
+        Publish a block of samples (producer side).
+
+        Returns:
+            int: Number of samples written; the rest were dropped because the ring was full.
+        """
+        w = int(self._header[_WRITE])
+        n = min(len(timestamps), self.capacity - (w - self._load(_READ)))
+        self._header[_DROPPED] += len(timestamps) - n
+        for start, stop, offset in self._segments(w, n):
+            self.timestamps[start:stop] = timestamps[offset:offset + stop - start]
+            self.raw[start:stop] = raw[offset:offset + stop - start]
+        self._store(_WRITE, w + n)
+        return n
+
+    def _segments(self, first: int, n: int) -> list[tuple[int, int, int]]:
+        """Slot ranges covering samples first..first+n-1 as (start, stop, offset into the block)."""
+        start = first % self.capacity
+        head = min(n, self.capacity - start)
+        segments = [(start, start + head, 0)] if head > 0 else []
+        if n > head:
+            segments.append((0, n - head, head))
+        return segments
+
+    def readable(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Views of the samples published but not yet consumed (consumer side).
+
+        Returns:
+            list[tuple[np.ndarray, np.ndarray]]: Up to two (timestamps, raw) segments in sample order.
+                                                 Call `consume` once they have been used.
+        """
+        r = int(self._header[_READ])
+        n = self._load(_WRITE) - r
+        return [(self.timestamps[start:stop], self.raw[start:stop]) for start, stop, _ in self._segments(r, n)]
+
+    def consume(self, n: int) -> None:
+        """Release `n` samples back to the producer (consumer side)."""
+        self._store(_READ, int(self._header[_READ]) + n)
+
+    def close(self, unlink: bool = False) -> None:
+        """
+        Detach from the shared block, and remove it if `unlink` is set (owner side only).
+        """
+        del self._header, self.timestamps, self.raw
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _sampler_main(ring_name: str, ring_lock, capacity: int, raw_bytes: int, duration: float, use_fifo: bool,
+                  address: int, measurement_range: int, odr_hz: float, bus_number: int,
+                  cpu: Optional[int], fifo_priority: Optional[int], results) -> None:
+    """Body of the sampler process; see `SamplerProcess`."""
+    ring = SharedRingBuffer(capacity, raw_bytes, name=ring_name, lock=ring_lock)
+    result = {"missed": 0, "sample_clock": None, "policy": None}
+    if cpu is not None or fifo_priority is not None:
+        result["policy"] = apply_realtime_policy(cpu, fifo_priority)
+    try:
+        bus = open_bus(bus_number)
+        # A freshly opened bus may talk to a device that was never configured (e.g. the emulator)
+        if bus.read_byte_data(address, REG_POWER_CTL) & 0x01:
+            configure_adxl357(bus, address, measurement_range, FilterSettings(odr_hz).register)
+        three_axis = raw_bytes == XYZ_DATA_BYTES
+
+        start_ns = time.monotonic_ns()
+        if use_fifo:
+            arrival_times, arrival_counts = [], []
+            # Overruns are counted in the ring header, where the reader picks them up for its telemetry
+            counter = FifoSampleCounter(odr_hz, on_overrun=ring.count_overrun)
+            for block in collect_fifo_blocks(bus, address, duration, odr_hz, on_overrun=counter.overrun):
+                if ring.stop_requested:
+                    break
+                arrival_ns = time.monotonic_ns()
+                timestamps = counter.timestamps(len(block), arrival_ns)
+                ring.write_block(timestamps, block.reshape(len(block), -1) if three_axis else block[:, 2])
+                arrival_times.append((arrival_ns - start_ns) * 1e-9)
+                arrival_counts.append(counter.n)
+            result["sample_clock"] = fit_sample_clock(arrival_times, arrival_counts, odr_hz, source='fifo').to_dict()
+            result["overruns"] = counter.overruns
+            result["lost"] = counter.lost
+        else:
+            if three_axis:
+                read_raw = lambda: read_xyz_raw(bus, address)
+            else:
+                read_raw = lambda: bus.read_i2c_block_data(address, REG_ZDATA3, 3)
+            pacer = DeadlinePacer(odr_hz)
+            start_ns = pacer.start()
+            errors = 0
+            while not ring.stop_requested and pacer.elapsed() < duration:
+                pacer.wait()
+                try:
+                    raw = read_raw()
+                    ring.write((time.monotonic_ns() - start_ns) * 1e-9, raw)
+                except OSError:
+                    errors += 1
+            result["missed"] = pacer.missed
+            result["errors"] = errors
+        result["start_ns"] = start_ns
+    except Exception as e:
+        result["error"] = repr(e)
+    finally:
+        result["dropped"] = ring.dropped
+        results.put(result)
+        ring.mark_done()
+        ring.close()
+
+
+class SamplerProcess:
+    """
+    Run the ADXL357 sampling loop in a separate process that publishes into a `SharedRingBuffer`.
+
+    The sampler opens its own bus with `open_bus`, so it follows the same
+    ACCEL_BUS_BACKEND selection as the main process. The main process calls
+    `drain` periodically to receive the new samples as views of shared memory.
+
+    Args:
+        duration (float): Capture duration in seconds.
+        use_fifo (bool): Burst-read the sensor FIFO instead of polling the data registers. Defaults to False.
+        three_axis (bool): Record X, Y and Z instead of Z only. Defaults to False.
+        address (int): I2C address of the ADXL357. Defaults to 0x1D.
+        measurement_range (int): Range used if the sampler has to configure the sensor itself. Defaults to 10.
+        odr_hz (float): Sample rate in Hz. Defaults to 4000.
+        bus_number (int): I2C bus the sampler opens. Defaults to 1.
+        cpu (Optional[int]): Core to pin the sampler process to. Defaults to None (no pinning).
+        fifo_priority (Optional[int]): SCHED_FIFO priority for the sampler process, see
+                                       `realtime.apply_realtime_policy`. Defaults to None.
+        ring_seconds (float): Seconds of samples the ring buffer can hold before the reader must drain it. Defaults to 2.
+    """
+
+    def __init__(self, duration: float, use_fifo: bool = False, three_axis: bool = False, address: int = 0x1D,
+                 measurement_range: int = 10, odr_hz: float = DEFAULT_ODR_HZ, bus_number: int = 1,
+                 cpu: Optional[int] = None, fifo_priority: Optional[int] = None, ring_seconds: float = 2.0):
+        raw_bytes = XYZ_DATA_BYTES if three_axis else 3
+        self.ring = SharedRingBuffer(max(int(ring_seconds * odr_hz), 1024), raw_bytes)
+        self._results = MP_CONTEXT.Queue()
+        self.result = None
+        self.process = MP_CONTEXT.Process(
+            target=_sampler_main, daemon=True,
+            args=(self.ring.name, self.ring.lock, self.ring.capacity, raw_bytes, duration, use_fifo, address,
+                  measurement_range, odr_hz, bus_number, cpu, fifo_priority, self._results))
+
+    def start(self) -> None:
+        self.process.start()
+
+    @property
+    def overruns(self) -> int:
+        """FIFO overruns the sampler has reported so far."""
+        return self.ring.overruns
+
+    @property
+    def finished(self) -> bool:
+        return self.ring.done or not self.process.is_alive()
+
+    def drain(self, consumer) -> int:
+        """
+        Hand every published sample to `consumer(timestamps, raw)` and release it.
+
+        The arrays passed to `consumer` are views of shared memory that are
+        reused once this call returns, so the consumer must copy what it keeps.
+
+        Returns:
+            int: Number of samples drained.
+        """
+        n = 0
+        for timestamps, raw in self.ring.readable():
+            consumer(timestamps, raw)
+            n += len(timestamps)
+        self.ring.consume(n)
+        return n
+
+    def stop(self) -> None:
+        """Ask the sampler to finish early."""
+        self.ring.request_stop()
+
+    def join(self, timeout: float = 5.0) -> dict:
+        """
+        Wait for the sampler to exit and release the shared memory.
+
+        Returns:
+            dict: start_ns, missed deadlines, dropped samples, the scheduling policy and, in FIFO mode,
+                  the sample_clock, the overrun count and the estimated samples lost to overruns.
+        """
+        try:
+            self.result = self._results.get(timeout=timeout)
+        except queue.Empty:
+            self.result = {"error": "sampler did not report"}
+        self.process.join(timeout)
+        self.ring.close(unlink=True)
+        return self.result
@@ -0,0 +1,328 @@
+#sim_bus.py
+
+"""
+In-process stand-in for the I2C bus with ADXL357 and LSM6DS3 register-map emulators,
+plus a fake spidev device for the ADXL357 SPI transport.
+
+`SimulatedSMBus` implements the subset of the smbus2.SMBus interface the
+capture scripts use, so acquisition code can be imported, tested and
+profiled without a Raspberry Pi. Select it with `open_bus(backend='sim')`
+or by setting ACCEL_BUS_BACKEND=sim.
+"""
+
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from adxl357 import (
+    FIFO_DEPTH, FIFO_EMPTY, FIFO_X_MARKER, REG_FIFO_DATA, REG_FIFO_ENTRIES, REG_FIFO_SAMPLES,
+    RANGE_CODES, REG_ODR_FILTER, REG_POWER_CTL, REG_RANGE, REG_RESET, REG_STATUS, REG_XDATA3, RESET_CODE,
+    SCALE_FACTORS, STATUS_DATA_RDY, STATUS_FIFO_FULL, STATUS_FIFO_OVR,
+)
+from lsm6ds3 import FULL_SCALE_CODES, REG_CTRL1_XL, REG_OUTX_L_XL, REG_WHO_AM_I, SENSITIVITY_MG, WHO_AM_I_VALUE
+
+# Identification registers and their reset values
+REG_DEVID_AD = 0x00
+REG_DEVID_MST = 0x01
+REG_PARTID = 0x02
+REG_REVID = 0x03
+ADXL357_ID = (0xAD, 0x1D, 0xED, 0x01)
+
+RANGES_BY_CODE = {code: g for g, code in RANGE_CODES.items()}
+FULL_SCALES_BY_CODE = {code: g for g, code in FULL_SCALE_CODES.items()}
+
+# Errno the Linux I2C driver reports when no device acknowledges
+EREMOTEIO = 121
+
+
+def default_signal(t: np.ndarray) -> np.ndarray:
+    """
+    Synthetic test signal in g: gravity on Z plus a decaying 25 Hz beam mode and a weak 180 Hz tone.
+
+    Args:
+        t (np.ndarray): Sample times in seconds.
+
+    Returns:
+        np.ndarray: Accelerations of shape (len(t), 3).
+    """
+    xyz = np.zeros((len(t), 3))
+    xyz[:, 0] = 0.02 * np.sin(2 * np.pi * 180 * t)
+    xyz[:, 2] = 1.0 + 0.8 * np.exp(-0.5 * t) * np.sin(2 * np.pi * 25 * t)
+    return xyz
+
+
+def replay_signal(samples: np.ndarray, odr_hz: float, loop: bool = True) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Build a signal function that replays recorded samples.
+
+    Args:
+        samples (np.ndarray): Recorded accelerations in g, shape (N,) for Z only or (N, 3).
+        odr_hz (float): Rate the samples were recorded at.
+        loop (bool): Start over at the end of the recording instead of holding the last value. Defaults to True.
+
+    Returns:
+        Callable[[np.ndarray], np.ndarray]: Signal function for `SimulatedADXL357`.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 1:
+        xyz = np.zeros((len(samples), 3))
+        xyz[:, 2] = samples
+        samples = xyz
+
+    def signal(t: np.ndarray) -> np.ndarray:
+        index = np.floor(np.asarray(t) * odr_hz).astype(np.int64)
+        index = index % len(samples) if loop else np.minimum(index, len(samples) - 1)
+        return samples[index]
+
+    return signal
+
+
+class SimulatedADXL357:
+    """
+    Register-level ADXL357 emulator.
+
+    Samples are produced at the configured ODR from `signal` as time passes on
+    `clock`, and go both to the XYZ data registers and to a 96-entry FIFO with
+    the X-axis marker, empty flag and overrun status of the real part.
+
+    Args:
+        signal (Callable, optional): Maps sample times in seconds to (n, 3) accelerations in g.
+                                     Defaults to `default_signal`.
+        noise_g (float, optional): Standard deviation of added white noise in g. Defaults to 0.
+        clock (Callable, optional): Time source in seconds. Defaults to time.monotonic.
+        seed (int, optional): Seed for the noise generator. Defaults to None.
+    """
+
+    def __init__(self, signal: Optional[Callable] = None, noise_g: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic, seed: Optional[int] = None):
+        self.signal = signal or default_signal
+        self.noise_g = noise_g
+        self.clock = clock
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        """Return every register to its power-on value and enter standby."""
+        self.registers = bytearray(0x40)
+        self.registers[REG_DEVID_AD:REG_REVID + 1] = bytes(ADXL357_ID)
+        self.registers[REG_FIFO_SAMPLES] = 0x60
+        self.registers[REG_RANGE] = 0x81
+        self.registers[REG_POWER_CTL] = 0x01
+        self.fifo = deque()
+        self.overrun = False
+        self.start_time = None
+        self.produced = 0
+
+    @property
+    def odr_hz(self) -> float:
+        return 4000.0 / (1 << (self.registers[REG_ODR_FILTER] & 0x0F))
+
+    @property
+    def measurement_range(self) -> int:
+        return RANGES_BY_CODE.get(self.registers[REG_RANGE] & 0x03, 10)
+
+    @property
+    def measuring(self) -> bool:
+        return not self.registers[REG_POWER_CTL] & 0x01
+
+    def _advance(self) -> None:
+        """Produce every sample that is due by now."""
+        if not self.measuring:
+            return
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = now
+        due = int((now - self.start_time) * self.odr_hz)
+        n_new = due - self.produced
+        if n_new <= 0:
+            return
+        # Only the most recent FIFO_DEPTH samples can still matter after a long pause
+        first = max(self.produced, due - FIFO_DEPTH)
+        t = (first + np.arange(due - first)) / self.odr_hz
+        g = self.signal(t)
+        if self.noise_g:
+            g = g + self.rng.normal(0.0, self.noise_g, g.shape)
+        counts = np.clip(np.rint(g / SCALE_FACTORS[self.measurement_range]), -(1 << 19), (1 << 19) - 1).astype(np.int64)
+
+        if due - self.produced > len(counts):
+            self.overrun = True
+        for xyz in counts:
+            if len(self.fifo) + 3 > FIFO_DEPTH:
+                self.overrun = True
+                continue  # A full FIFO drops new samples
+            for axis, value in enumerate(xyz):
+                self.fifo.append((int(value), axis == 0))
+
+        # The data registers always hold the newest sample
+        for axis, value in enumerate(counts[-1]):
+            self.registers[REG_XDATA3 + 3 * axis:REG_XDATA3 + 3 * axis + 3] = self._encode(int(value))
+        self.registers[REG_STATUS] |= STATUS_DATA_RDY
+        self.produced = due
+
+    @staticmethod
+    def _encode(value: int, flags: int = 0) -> bytes:
+        raw = value & 0xFFFFF
+        return bytes((raw >> 12, (raw >> 4) & 0xFF, ((raw & 0x0F) << 4) | flags))
+
+    def read_register(self, register: int) -> int:
+        self._advance()
+        if register == REG_STATUS:
+            status = self.registers[REG_STATUS]
+            if len(self.fifo) >= FIFO_DEPTH - 2:
+                status |= STATUS_FIFO_FULL
+            if self.overrun:
+                status |= STATUS_FIFO_OVR
+            # Reading STATUS clears DATA_RDY and the overrun flag
+            self.registers[REG_STATUS] &= ~STATUS_DATA_RDY & 0xFF
+            self.overrun = False
+            return status
+        if register == REG_FIFO_ENTRIES:
+            return len(self.fifo)
+        if register == REG_FIFO_DATA:
+            raise ValueError("FIFO_DATA is read through read_block")
+        return self.registers[register]
+
+    def read_block(self, register: int, length: int) -> list[int]:
+        if register == REG_FIFO_DATA:
+            self._advance()
+            data = []
+            for _ in range(length // 3):
+                if self.fifo:
+                    value, is_x = self.fifo.popleft()
+                    data.extend(self._encode(value, FIFO_X_MARKER if is_x else 0))
+                else:
+                    data.extend(self._encode(0, FIFO_EMPTY))
+            return data
+        return [self.read_register((register + i) & 0x3F) for i in range(length)]
+
+    def write_register(self, register: int, value: int) -> None:
+        if register == REG_RESET:
+            if value == RESET_CODE:
+                self.reset()
+            return
+        was_measuring = self.measuring
+        self.registers[register] = value & 0xFF
+        if register == REG_POWER_CTL and self.measuring and not was_measuring:
+            self.start_time = None
+            self.produced = 0
+            self.fifo.clear()
+
+
+class SimulatedLSM6DS3:
+    """
+    Minimal LSM6DS3 accelerometer emulator: WHO_AM_I, CTRL1_XL and the OUTX/Y/Z_XL data registers.
+
+    The output registers hold the signal at the time they are read; the FIFO is not emulated.
+
+    Args:
+        signal (Callable, optional): Maps sample times in seconds to (n, 3) accelerations in g.
+                                     Defaults to `default_signal`.
+        clock (Callable, optional): Time source in seconds. Defaults to time.monotonic.
+    """
+
+    def __init__(self, signal: Optional[Callable] = None, clock: Callable[[], float] = time.monotonic):
+        self.signal = signal or default_signal
+        self.clock = clock
+        self.registers = bytearray(0x80)
+        self.registers[REG_WHO_AM_I] = WHO_AM_I_VALUE
+        self.start_time = clock()
+
+    def read_register(self, register: int) -> int:
+        if REG_OUTX_L_XL <= register < REG_OUTX_L_XL + 6:
+            self._latch()
+        return self.registers[register]
+
+    def _latch(self) -> None:
+        ctrl1 = self.registers[REG_CTRL1_XL]
+        if not ctrl1 >> 4:
+            return  # Accelerometer powered down
+        g = self.signal(np.array([self.clock() - self.start_time]))[0]
+        lsb = SENSITIVITY_MG[FULL_SCALES_BY_CODE[(ctrl1 >> 2) & 0x03]] / 1000
+        counts = np.clip(np.rint(g / lsb), -32768, 32767).astype('<i2')
+        self.registers[REG_OUTX_L_XL:REG_OUTX_L_XL + 6] = counts.tobytes()
+
+    def read_block(self, register: int, length: int) -> list[int]:
+        return [self.read_register((register + i) & 0x7F) for i in range(length)]
+
+    def write_register(self, register: int, value: int) -> None:
+        self.registers[register] = value & 0xFF
+
+
+class SimulatedSMBus:
+    """
+    Drop-in replacement for smbus2.SMBus backed by emulated devices.
+
+    Args:
+        devices (dict, optional): Maps I2C addresses to emulated devices.
+                                  Defaults to a SimulatedADXL357 at 0x1D and a SimulatedLSM6DS3 at 0x6A.
+        transaction_time (float, optional): Seconds each bus transaction takes, to model a
+                                            400 kHz bus when benchmarking. Defaults to 0.
+    """
+
+    def __init__(self, devices: Optional[dict] = None, transaction_time: float = 0.0):
+        self.devices = devices if devices is not None else {0x1D: SimulatedADXL357(), 0x6A: SimulatedLSM6DS3()}
+        self.transaction_time = transaction_time
+        self.transactions = 0
+
+    def _device(self, address: int):
+        self.transactions += 1
+        if self.transaction_time:
+            end = time.perf_counter() + self.transaction_time
+            while time.perf_counter() < end:
+                pass
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(EREMOTEIO, "Remote I/O error") from None
+
+    def read_byte_data(self, i2c_addr: int, register: int) -> int:
+        return self._device(i2c_addr).read_register(register)
+
+    def write_byte_data(self, i2c_addr: int, register: int, value: int) -> None:
+        self._device(i2c_addr).write_register(register, value)
+
+    def read_i2c_block_data(self, i2c_addr: int, register: int, length: int) -> list[int]:
+        return self._device(i2c_addr).read_block(register, length)
+
+    def write_quick(self, i2c_addr: int) -> None:
+        self._device(i2c_addr)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeSpiDev:
+    """
+    Stand-in for spidev.SpiDev that answers ADXL357 SPI transfers from an emulator.
+
+    Args:
+        device (SimulatedADXL357, optional): The emulated sensor. Defaults to a new SimulatedADXL357.
+    """
+
+    def __init__(self, device: Optional[SimulatedADXL357] = None):
+        self.device = device or SimulatedADXL357()
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.transfers = 0
+
+    def xfer2(self, data: list[int]) -> list[int]:
+        self.transfers += 1
+        register, is_read = data[0] >> 1, data[0] & 0x01
+        if not is_read:
+            for offset, value in enumerate(data[1:]):
+                self.device.write_register(register + offset, value)
+            return [0] * len(data)
+        if len(data) == 2:
+            return [0, self.device.read_register(register)]
+        return [0] + self.device.read_block(register, len(data) - 1)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,194 @@
+#spectral.py
+
+"""
+Spectral computation shared by the analysis scripts, without any plotting.
+
+Accelerometer data is real, so `amplitude_spectrum` uses `rfft` and computes
+only the non-negative half instead of a complex FFT thrown half away. The
+transform length is rounded up to a length scipy.fft factors efficiently
+(`next_fast_len`) unless an exact length is asked for, and runs on
+`FFT_WORKERS` threads (all cores by default, $ACCEL_FFT_WORKERS to override).
+Windows and frequency axes are cached per length, so repeated plots of the
+same run, or runs of the same length, do not rebuild them.
+
+`compute_spectra` runs the whole analysis behind the FFT/STFT plot (spectrum,
+peaks and STFT) and returns a `SpectralResult`; drawing it is left to
+`Plot_STFT_and_FFT.render_spectra`, so scripts that only need numbers never
+import matplotlib.
+"""
+
+import os
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from scipy.fft import next_fast_len, rfft, rfftfreq
+from scipy.signal import find_peaks, get_window, stft
+
+from resampling import nonuniform_spectrum
+
+FFT_WORKERS_ENV = 'ACCEL_FFT_WORKERS'
+FFT_WORKERS = int(os.environ.get(FFT_WORKERS_ENV, 0)) or os.cpu_count() or 1
+CACHE_SIZE = 32  # (length, window) pairs kept per cache
+STFT_SEGMENT = 1024 * 2  # Default samples per STFT segment
+
+
+def fft_length(n_samples: int, zero_padding: Optional[int] = None, exact: bool = False) -> int:
+    """
+    Transform length for `n_samples`, padded to at least `zero_padding`.
+
+    Args:
+        n_samples (int): Number of samples.
+        zero_padding (Optional[int]): Minimum transform length. Ignored if shorter than the data. Defaults to None.
+        exact (bool, optional): Use that length as is instead of the next fast length. Defaults to False.
+
+    Returns:
+        int: The transform length.
+    """
+    length = max(n_samples, zero_padding or 0)
+    return length if exact else next_fast_len(length, real=True)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def window(window_type: str, length: int) -> np.ndarray:
+    """Cached, read-only `scipy.signal.get_window(window_type, length)`."""
+    return _read_only(get_window(window_type, length))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def frequency_axis(length: int, fs: float) -> np.ndarray:
+    """Cached, read-only `rfftfreq(length, 1 / fs)`."""
+    return _read_only(rfftfreq(length, d=1 / fs))
+
+
+def amplitude_spectrum(waveform: np.ndarray, fs: float, window_type: Optional[str] = None,
+                       zero_padding: Optional[int] = None, exact_length: bool = False,
+                       workers: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Single-sided amplitude spectrum of a real signal.
+
+    Amplitudes are scaled by 2 / max(len(waveform), zero_padding), as the
+    plots always have been; rounding up to a fast length only adds bins.
+
+    Args:
+        waveform (np.ndarray): Real samples, shape (N,).
+        fs (float): Sample rate in Hz.
+        window_type (Optional[str]): Window applied before the transform (scipy.signal.get_window name). Defaults to None.
+        zero_padding (Optional[int]): Minimum transform length. Defaults to None.
+        exact_length (bool, optional): Transform exactly max(N, zero_padding) points. Defaults to False.
+        workers (Optional[int]): FFT threads. Defaults to FFT_WORKERS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Frequencies in Hz (0 up to, not including, Nyquist) and amplitudes.
+    """
+    waveform = np.asarray(waveform, dtype=np.float64)
+    if window_type:
+        waveform = waveform * window(window_type, len(waveform))
+    n_fft = fft_length(len(waveform), zero_padding, exact_length)
+    n_bins = n_fft // 2
+    Y = rfft(waveform, n=n_fft, workers=workers or FFT_WORKERS)
+    magnitude = np.abs(Y[:n_bins])
+    magnitude *= 2.0 / max(len(waveform), zero_padding or 0)
+    return frequency_axis(n_fft, fs)[:n_bins], magnitude
+
+
+class SpectralResult:
+    """
+    Spectrum, peaks and STFT of one waveform.
+
+    Args:
+        frequencies (np.ndarray): Positive FFT frequencies in Hz.
+        magnitude (np.ndarray): Single-sided amplitude at each frequency, in the units of the waveform.
+        peaks (np.ndarray): Indices into `frequencies` of the peaks above the threshold, in frequency order.
+        stft_frequencies (np.ndarray): STFT frequencies in Hz.
+        stft_times (np.ndarray): STFT segment times in seconds.
+        stft_magnitude (np.ndarray): |STFT|, shape (len(stft_frequencies), len(stft_times)).
+        fs (float): Sample rate used, in Hz.
+        window_type (Optional[str]): Window applied before the FFT. Defaults to None.
+        zero_padding (Optional[int]): Requested minimum FFT length. Defaults to None.
+    """
+
+    def __init__(self, frequencies: np.ndarray, magnitude: np.ndarray, peaks: np.ndarray,
+                 stft_frequencies: np.ndarray, stft_times: np.ndarray, stft_magnitude: np.ndarray,
+                 fs: float, window_type: Optional[str] = None, zero_padding: Optional[int] = None):
+        self.frequencies = frequencies
+        self.magnitude = magnitude
+        self.peaks = peaks
+        self.stft_frequencies = stft_frequencies
+        self.stft_times = stft_times
+        self.stft_magnitude = stft_magnitude
+        self.fs = fs
+        self.window_type = window_type
+        self.zero_padding = zero_padding
+
+    @property
+    def peak_frequencies(self) -> np.ndarray:
+        return self.frequencies[self.peaks]
+
+    @property
+    def peak_amplitudes(self) -> np.ndarray:
+        return self.magnitude[self.peaks]
+
+    def strongest_peaks(self, count: Optional[int] = None) -> list[dict]:
+        """The `count` highest peaks (all by default) as frequency_hz/amplitude dicts, highest first."""
+        order = np.argsort(self.peak_amplitudes)[::-1][:count]
+        return [{"frequency_hz": float(self.peak_frequencies[i]), "amplitude": float(self.peak_amplitudes[i])}
+                for i in order]
+
+    def stft_dominant_frequencies(self) -> np.ndarray:
+        """Strongest non-zero STFT frequency of every segment."""
+        if len(self.stft_frequencies) < 2:
+            return np.array([])
+        return self.stft_frequencies[1:][np.argmax(self.stft_magnitude[1:], axis=0)]
+
+    def __repr__(self) -> str:
+        return (f"SpectralResult(fs={self.fs:.3f}, bins={len(self.frequencies)}, peaks={len(self.peaks)}, "
+                f"stft={self.stft_magnitude.shape}, window_type={self.window_type!r})")
+
+
+def compute_spectra(timestamps: np.ndarray, waveform: np.ndarray, fs: float, ns: int = STFT_SEGMENT,
+                    threshold: float = 0.005, window_type: Optional[str] = None, zero_padding: Optional[int] = None,
+                    exact_length: bool = False, spectrum: str = 'fft', workers: Optional[int] = None) -> SpectralResult:
+    """
+    FFT, peaks and STFT of a waveform, as plotted by `plot_fft_stft`.
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds (used by the 'nufft' spectrum).
+        waveform (np.ndarray): Real samples, shape (N,).
+        fs (float): Sample rate in Hz.
+        ns (int, optional): Samples per STFT segment, with half overlap. Defaults to 2048.
+        threshold (float, optional): Minimum peak height. Defaults to 0.005.
+        window_type (Optional[str]): Window applied before the FFT. The STFT always uses a Hann window. Defaults to None.
+        zero_padding (Optional[int]): Minimum FFT length. Defaults to None.
+        exact_length (bool, optional): Transform exactly max(N, zero_padding) points. Defaults to False.
+        spectrum (str, optional): 'fft', or 'nufft' to evaluate the spectrum at the actual timestamps
+                                  on the same bins. Defaults to 'fft'.
+        workers (Optional[int]): FFT threads. Defaults to FFT_WORKERS.
+
+    Returns:
+        SpectralResult: The spectrum restricted to positive frequencies, its peaks and the STFT.
+    """
+    waveform = np.asarray(waveform, dtype=np.float64)
+    if spectrum == 'nufft':
+        n_fft = fft_length(len(waveform), zero_padding, exact_length)
+        windowed = waveform * window(window_type, len(waveform)) if window_type else waveform
+        frequencies, magnitude = nonuniform_spectrum(timestamps, windowed, n_fft // 2, fs / n_fft)
+        magnitude *= len(waveform) / max(len(waveform), zero_padding or 0)
+    elif spectrum == 'fft':
+        frequencies, magnitude = amplitude_spectrum(waveform, fs, window_type, zero_padding, exact_length, workers)
+    else:
+        raise ValueError("Spectrum must be 'fft' or 'nufft'.")
+
+    # Non-positive frequencies cannot be shown on a log axis
+    positive = frequencies > 0
+    frequencies, magnitude = frequencies[positive], magnitude[positive]
+    peaks, _ = find_peaks(magnitude, height=threshold)
+
+    ns = min(ns, len(waveform))
+    f, t, Zxx = stft(waveform, fs, noverlap=ns // 2, nperseg=ns, window='hann', nfft=ns * 2)
+    return SpectralResult(frequencies, magnitude, peaks, f, t, np.abs(Zxx), fs, window_type, zero_padding)
@@ -0,0 +1,202 @@
+#spectral_cache.py
+
+"""
+Content-addressed on-disk cache for spectra, STFTs and filtered data.
+
+Entries are keyed by a hash of the input samples plus the parameters that
+change the result (sample rate, window, padding, STFT segment, filter), so the
+same recording analysed again, from any path, hits the cache, while display
+options such as the axis scales or the peak threshold never enter the key.
+Every array is stored as its own .npy file and loaded memory-mapped. The
+total size is kept under a limit by evicting the least recently used entries,
+so the cache cannot fill the Pi's SD card.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from spectral import STFT_SEGMENT, SpectralResult, compute_spectra
+
+CACHE_DIR_ENV = 'ACCEL_SPECTRAL_CACHE'
+CACHE_SIZE_ENV = 'ACCEL_SPECTRAL_CACHE_MB'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'accelerometer_spectra')
+DEFAULT_CACHE_MB = 512
+CACHE_VERSION = 1  # Part of every key; bump when the stored computation changes
+META_FILE = 'meta.json'
+
+
+class SpectralCache:
+    """
+    Size-bounded LRU store of named arrays under a content hash.
+
+    Args:
+        cache_dir (Optional[str]): Cache directory. Defaults to $ACCEL_SPECTRAL_CACHE or ~/.cache/accelerometer_spectra.
+        max_bytes (Optional[int]): Size limit. Defaults to $ACCEL_SPECTRAL_CACHE_MB or 512 MB.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes or int(float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_MB)) * 1024 ** 2)
+
+    @staticmethod
+    def key(*arrays: np.ndarray, **params) -> str:
+        """Hash of the arrays' contents, dtypes and shapes and of the JSON-serializable parameters."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps({"version": CACHE_VERSION, **params}, sort_keys=True).encode())
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode())
+            digest.update(memoryview(array).cast('B'))
+        return digest.hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[tuple[dict, dict]]:
+        """
+        Look up an entry and mark it as recently used.
+
+        Returns:
+            Optional[tuple[dict, dict]]: Memory-mapped arrays by name and the stored metadata, or None on a miss.
+        """
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, META_FILE), 'r') as f:
+                metadata = json.load(f)
+            arrays = {name: np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r') for name in metadata.pop("arrays")}
+            os.utime(entry)  # mtime is the LRU clock; atime is often disabled on the SD card
+        except (OSError, ValueError, KeyError):
+            return None
+        return arrays, metadata
+
+    def put(self, key: str, arrays: dict, metadata: Optional[dict] = None) -> None:
+        """
+        Store arrays under `key`, then evict old entries beyond the size limit.
+
+        The entry is written to a temporary directory and renamed into place, so
+        readers and concurrent writers never see a partial entry.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(staging, f'{name}.npy'), array)
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump({**(metadata or {}), "arrays": list(arrays)}, f)
+            os.replace(staging, self._entry_dir(key))
+        except OSError:
+            # Another process stored the same key first, or the disk is full
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """(last use, size in bytes, path) of every entry, least recently used first."""
+        found = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        for name in names:
+            entry = os.path.join(self.cache_dir, name)
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+                found.append((os.stat(entry).st_mtime, size, entry))
+            except OSError:
+                continue
+        return sorted(found)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            # Staging directories of writers still running are left alone for a minute
+            if os.path.basename(entry).startswith('.tmp-') and time.time() - os.stat(entry).st_mtime < 60:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Remove every entry. Returns the number removed."""
+        return self.evict(0)
+
+
+def cached_spectra(timestamps: np.ndarray, waveform: np.ndarray, fs: float, ns: int = STFT_SEGMENT,
+                   threshold: float = 0.005, window_type: Optional[str] = None, zero_padding: Optional[int] = None,
+                   exact_length: bool = False, spectrum: str = 'fft', workers: Optional[int] = None,
+                   cache: Optional[SpectralCache] = None) -> SpectralResult:
+    """
+    `compute_spectra` through the cache.
+
+    Peaks are found again on every call, so the threshold is not part of the key.
+    The timestamps are only part of the key for the 'nufft' spectrum, the only one that uses them.
+
+    Args:
+        cache (Optional[SpectralCache]): Cache to use. Defaults to `SpectralCache()`.
+        Others: See `compute_spectra`.
+
+    Returns:
+        SpectralResult: The result, with memory-mapped arrays when it came from the cache.
+    """
+    cache = cache or SpectralCache()
+    inputs = (timestamps, waveform) if spectrum == 'nufft' else (waveform,)
+    key = cache.key(*inputs, kind='spectra', fs=float(fs), ns=int(ns), window_type=window_type,
+                    zero_padding=zero_padding, exact_length=exact_length, spectrum=spectrum)
+    hit = cache.get(key)
+    if hit is not None:
+        arrays, metadata = hit
+        peaks, _ = find_peaks(arrays["magnitude"], height=threshold)
+        return SpectralResult(arrays["frequencies"], arrays["magnitude"], peaks, arrays["stft_frequencies"],
+                              arrays["stft_times"], arrays["stft_magnitude"], metadata["fs"], window_type, zero_padding)
+
+    result = compute_spectra(timestamps, waveform, fs, ns, threshold, window_type, zero_padding, exact_length,
+                             spectrum, workers)
+    cache.put(key, {"frequencies": result.frequencies, "magnitude": result.magnitude,
+                    "stft_frequencies": result.stft_frequencies, "stft_times": result.stft_times,
+                    "stft_magnitude": result.stft_magnitude}, {"fs": result.fs})
+    return result
+
+
+def cached_filter(filter_function, data: np.ndarray, *args, cache: Optional[SpectralCache] = None) -> np.ndarray:
+    """
+    `filter_function(data, *args)` through the cache.
+
+    Args:
+        filter_function: A filter such as `low_pass_filter`; its name and `args` are part of the key.
+        data (np.ndarray): Samples to filter.
+        *args: Filter parameters, JSON-serializable.
+        cache (Optional[SpectralCache]): Cache to use. Defaults to `SpectralCache()`.
+
+    Returns:
+        np.ndarray: The filtered samples, memory-mapped when they came from the cache.
+    """
+    cache = cache or SpectralCache()
+    key = cache.key(data, kind='filter', function=filter_function.__name__, args=[float(a) for a in args])
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[0]["data"]
+    filtered = filter_function(data, *args)
+    cache.put(key, {"data": filtered})
+    return filtered
@@ -0,0 +1,62 @@
+#spi_bus.py
+
+"""
+SPI transport for the ADXL357 with the smbus2-style interface the capture code uses.
+
+The ADXL357 SPI protocol sends one command byte, (register << 1) | R/W, and
+then streams data bytes; registers auto-increment except FIFO_DATA. A read of
+any length is a single transfer, so FIFO bursts are not split into 32-byte
+SMBus blocks. Select it with `open_bus(backend='spi')` or ACCEL_BUS_BACKEND=spi.
+"""
+
+from typing import Optional
+
+SPI_READ = 0x01
+SPI_MAX_SPEED_HZ = 10_000_000  # ADXL357 maximum SCLK
+SPI_MAX_TRANSFER = 4096        # spidev default buffer size
+
+
+class SPIBus:
+    """
+    Drop-in replacement for smbus2.SMBus that talks to one ADXL357 over spidev.
+
+    The `i2c_addr` arguments are accepted for compatibility and ignored; the
+    chip select given at construction picks the device.
+
+    Args:
+        bus_number (int, optional): SPI bus, /dev/spidev<bus_number>.<device>. Defaults to 0.
+        device (int, optional): Chip select. Defaults to 0.
+        max_speed_hz (int, optional): SCLK frequency. Defaults to 10 MHz.
+        spi (optional): An already opened spidev.SpiDev compatible object, e.g. `sim_bus.FakeSpiDev`.
+                        Defaults to None, which opens the hardware device.
+    """
+
+    # Longest read that goes out as one transfer; see adxl357.read_register_block
+    max_block_length = SPI_MAX_TRANSFER - 1
+
+    def __init__(self, bus_number: int = 0, device: int = 0, max_speed_hz: int = SPI_MAX_SPEED_HZ, spi=None):
+        if spi is None:
+            import spidev
+            spi = spidev.SpiDev()
+            spi.open(bus_number, device)
+        spi.max_speed_hz = max_speed_hz
+        spi.mode = 0
+        self.spi = spi
+
+    def read_byte_data(self, i2c_addr: Optional[int], register: int) -> int:
+        return self.spi.xfer2([(register << 1) | SPI_READ, 0])[1]
+
+    def write_byte_data(self, i2c_addr: Optional[int], register: int, value: int) -> None:
+        self.spi.xfer2([register << 1, value & 0xFF])
+
+    def read_i2c_block_data(self, i2c_addr: Optional[int], register: int, length: int) -> list[int]:
+        return list(self.spi.xfer2([(register << 1) | SPI_READ] + [0] * length)[1:])
+
+    def close(self) -> None:
+        self.spi.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,214 @@
+#stream_writer.py
+
+"""
+Streaming capture writer that flushes samples to disk while acquisition runs.
+
+Samples are collected into fixed-size chunks; full chunks are handed to a
+background thread that appends them to a raw `.part` file. When the run
+stops, the `.part` file is converted into the usual [timestamps, data] `.npy`
+layout. A `.part` file left behind by a crash can be converted the same way
+with `finalize_part_file`.
+"""
+
+import os
+import queue
+import threading
+
+import numpy as np
+
+PART_SUFFIX = '.part'
+
+
+class ChunkedWriter:
+    """
+    Append-only on-disk sample store with the same append/extend interface as CaptureBuffer.
+
+    Each row of the `.part` file is [timestamp, value_0, ..., value_{channels-1}]
+    as float64. The sampling thread only copies values into the current chunk;
+    all file I/O happens on the writer thread, so SD-card stalls do not show
+    up as gaps in the timestamps.
+
+    Samples can also be appended undecoded (e.g. raw register bytes) by giving
+    `raw_shape`, `raw_dtype` and a vectorized `decode` function, which the
+    writer thread applies to each full chunk before writing it.
+
+    At most `max_pending` full chunks wait for the writer thread; when the disk
+    falls further behind than that, the sampling thread blocks on the next full
+    chunk instead of queueing memory without bound.
+
+    If decoding or writing fails, the writer thread stops and the error is
+    raised from every later `append`/`extend` and from `close`, which then
+    leaves the `.part` file in place.
+
+    Args:
+        npy_file_path (str): Path of the final `.npy` file. Data is streamed to `npy_file_path + '.part'`.
+        channels (int, optional): Decoded values per sample. Defaults to 1.
+        chunk_size (int, optional): Samples per chunk written to disk. Defaults to 4096.
+        raw_shape (tuple, optional): Shape of one appended sample. Defaults to (channels,).
+        raw_dtype (np.dtype, optional): Type of the appended samples. Defaults to np.float64.
+        decode (callable, optional): Maps a (k, *raw_shape) block to k x channels float values. Defaults to None.
+        max_pending (int, optional): Full chunks that may wait for the writer thread. Defaults to 64.
+    """
+
+    def __init__(self, npy_file_path: str, channels: int = 1, chunk_size: int = 4096,
+                 raw_shape: tuple = None, raw_dtype=np.float64, decode=None, max_pending: int = 64):
+        self.npy_file_path = npy_file_path
+        self.part_path = npy_file_path + PART_SUFFIX
+        self.channels = channels
+        self.chunk_size = chunk_size
+        self.raw_shape = raw_shape or (channels,)
+        self.raw_dtype = raw_dtype
+        self.decode = decode
+        self._file = open(self.part_path, 'wb')
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._free = queue.SimpleQueue()
+        self._timestamps, self._values = self._new_chunk()
+        self._fill = 0
+        self._n = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _new_chunk(self) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return (np.empty(self.chunk_size, dtype=np.float64),
+                    np.empty((self.chunk_size,) + self.raw_shape, dtype=self.raw_dtype))
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Streaming to {self.part_path} failed: {self._error!r}") from self._error
+
+    def _put(self, item) -> None:
+        # Block while the queue is full, but not forever if the writer thread has died meanwhile
+        while True:
+            try:
+                self._pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                self._check()
+
+    def _submit(self) -> None:
+        self._check()
+        if self._fill:
+            self._put((self._timestamps, self._values, self._fill))
+            self._timestamps, self._values = self._new_chunk()
+            self._fill = 0
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            timestamps, values, fill = item
+            try:
+                rows = np.empty((fill, 1 + self.channels), dtype=np.float64)
+                rows[:, 0] = timestamps[:fill]
+                decoded = self.decode(values[:fill]) if self.decode else values[:fill]
+                rows[:, 1:] = np.reshape(decoded, (fill, self.channels))
+                self._file.write(rows.tobytes())
+                self._file.flush()
+            except Exception as e:
+                # Kept for the producer thread; later chunks are not written
+                self._error = e
+                break
+            self._free.put((timestamps, values))
+
+    def __len__(self) -> int:
+        return self._n
+
+    def append(self, timestamp: float, value) -> None:
+        """
+        Store one sample.
+
+        Args:
+            timestamp (float): Sample time in seconds.
+            value: Sample value, or a sequence matching `raw_shape`.
+        """
+        if self._error is not None:
+            self._check()
+        fill = self._fill
+        self._timestamps[fill] = timestamp
+        self._values[fill] = value
+        self._fill = fill + 1
+        self._n += 1
+        if self._fill == self.chunk_size:
+            self._submit()
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """
+        Store a block of samples.
+
+        Args:
+            timestamps (np.ndarray): Sample times in seconds, shape (k,).
+            values (np.ndarray): Sample values, shape (k, *raw_shape) or (k,) for a single channel.
+        """
+        self._check()
+        values = np.asarray(values).reshape((len(timestamps),) + self.raw_shape)
+        start = 0
+        while start < len(timestamps):
+            take = min(self.chunk_size - self._fill, len(timestamps) - start)
+            self._timestamps[self._fill:self._fill + take] = timestamps[start:start + take]
+            self._values[self._fill:self._fill + take] = values[start:start + take]
+            self._fill += take
+            self._n += take
+            start += take
+            if self._fill == self.chunk_size:
+                self._submit()
+
+    def close(self) -> str:
+        """
+        Flush the remaining samples, stop the writer thread and convert the `.part` file to `.npy`.
+
+        Returns:
+            str: Path of the finalized `.npy` file.
+
+        Raises:
+            RuntimeError: If the writer thread failed; the `.part` file holds the chunks written before that.
+        """
+        try:
+            if self._fill:
+                self._put((self._timestamps, self._values, self._fill))
+                self._fill = 0
+            self._put(None)
+        except RuntimeError:
+            pass  # The writer thread has stopped; raised below, once the file is closed
+        self._thread.join()
+        self._file.close()
+        self._check()
+        return finalize_part_file(self.part_path, self.channels, self.npy_file_path)
+
+
+def finalize_part_file(part_path: str, channels: int = 1, npy_file_path: str = None,
+                       block_size: int = 1 << 20) -> str:
+    """
+    Convert a streamed `.part` file into a (1 + channels, N) float64 `.npy` file.
+
+    Rows are copied in blocks through memory maps, so this works for captures
+    larger than RAM. A trailing partial row left by a crash is ignored.
+
+    Args:
+        part_path (str): Path of the `.part` file.
+        channels (int, optional): Values per sample the file was written with. Defaults to 1.
+        npy_file_path (str, optional): Destination path. Defaults to `part_path` without the `.part` suffix.
+        block_size (int, optional): Samples copied per step. Defaults to 2**20.
+
+    Returns:
+        str: Path of the `.npy` file.
+    """
+    if npy_file_path is None:
+        npy_file_path = part_path[:-len(PART_SUFFIX)] if part_path.endswith(PART_SUFFIX) else part_path + '.npy'
+
+    row_bytes = (1 + channels) * np.dtype(np.float64).itemsize
+    n = os.path.getsize(part_path) // row_bytes
+    out = np.lib.format.open_memmap(npy_file_path, mode='w+', dtype=np.float64, shape=(1 + channels, n))
+    if n:
+        rows = np.memmap(part_path, dtype=np.float64, mode='r', shape=(n, 1 + channels))
+        for start in range(0, n, block_size):
+            out[:, start:start + block_size] = rows[start:start + block_size].T
+        del rows
+    out.flush()
+    del out
+    os.remove(part_path)
+    return npy_file_path
@@ -0,0 +1,342 @@
+#sweep_stream.py
+
+"""
+Streaming sine-sweep excitation.
+
+The chirp is generated block by block inside a sounddevice output callback,
+so playback starts immediately and uses constant memory whatever the sweep
+length. Only the sweep parameters are stored with a run; the waveform can be
+regenerated exactly from them with `regenerate_sweep`.
+
+The callback also logs PortAudio's stream times, which `SweepPlayer.timing`
+maps onto the monotonic clock the accelerometer timestamps use, so the sweep
+can be lined up with the response without cross-correlation.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from sample_clock import fit_sample_clock
+
+SWEEP_FILE = 'sweep.json'
+
+
+class SweepParameters:
+    """
+    Everything needed to reproduce a sweep.
+
+    Args:
+        start_freq (float): Start frequency in Hz.
+        end_freq (float): End frequency in Hz.
+        duration (float): Sweep length in seconds.
+        sample_rate (int): Audio sample rate in Hz. Defaults to 44100.
+        volume (float): Amplitude scale (0-1). Defaults to 1.
+        method (str): Frequency law, 'linear' or 'logarithmic'. Defaults to 'linear'.
+    """
+
+    def __init__(self, start_freq: float, end_freq: float, duration: float, sample_rate: int = 44100,
+                 volume: float = 1.0, method: str = 'linear'):
+        if method not in ('linear', 'logarithmic'):
+            raise ValueError("Sweep method must be 'linear' or 'logarithmic'.")
+        self.start_freq = float(start_freq)
+        self.end_freq = float(end_freq)
+        self.duration = float(duration)
+        self.sample_rate = int(sample_rate)
+        self.volume = float(volume)
+        self.method = method
+
+    @property
+    def n_frames(self) -> int:
+        return int(round(self.duration * self.sample_rate))
+
+    def to_dict(self) -> dict:
+        return {
+            "start_freq": self.start_freq,
+            "end_freq": self.end_freq,
+            "duration": self.duration,
+            "sample_rate": self.sample_rate,
+            "volume": self.volume,
+            "method": self.method,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "SweepParameters":
+        return cls(**values)
+
+    def __repr__(self) -> str:
+        return (f"SweepParameters({self.start_freq} -> {self.end_freq} Hz over {self.duration} s, "
+                f"{self.method}, fs={self.sample_rate}, volume={self.volume})")
+
+
+def sweep_phase(params: SweepParameters, t: np.ndarray) -> np.ndarray:
+    """
+    Instantaneous phase of the sweep in radians, in closed form so every block continues the previous one exactly.
+
+    Uses the same phase law as scipy.signal.chirp.
+
+    Args:
+        params (SweepParameters): The sweep.
+        t (np.ndarray): Times in seconds from the start of the sweep.
+
+    Returns:
+        np.ndarray: Phase in radians.
+    """
+    f0, f1, t1 = params.start_freq, params.end_freq, params.duration
+    if params.method == 'linear':
+        return 2 * np.pi * (f0 * t + 0.5 * (f1 - f0) / t1 * t * t)
+    if f0 == f1:
+        return 2 * np.pi * f0 * t
+    beta = t1 / np.log(f1 / f0)
+    return 2 * np.pi * beta * f0 * (np.power(f1 / f0, t / t1) - 1.0)
+
+
+def sweep_frequency(params: SweepParameters, t: np.ndarray) -> np.ndarray:
+    """
+    Instantaneous excitation frequency in Hz at times `t` seconds into the sweep.
+    """
+    f0, f1, t1 = params.start_freq, params.end_freq, params.duration
+    if params.method == 'linear':
+        return f0 + (f1 - f0) * np.asarray(t) / t1
+    return f0 * np.power(f1 / f0, np.asarray(t) / t1)
+
+
+def chirp_block(params: SweepParameters, start_frame: int, n_frames: int, dtype=np.float32) -> np.ndarray:
+    """
+    Generate frames start_frame..start_frame+n_frames-1 of the sweep, zero past its end.
+
+    Args:
+        params (SweepParameters): The sweep.
+        start_frame (int): Index of the first frame.
+        n_frames (int): Number of frames.
+        dtype (np.dtype, optional): Output type. Defaults to np.float32, what the audio stream plays.
+
+    Returns:
+        np.ndarray: The block, scaled by the sweep volume.
+    """
+    frames = start_frame + np.arange(n_frames)
+    block = np.cos(sweep_phase(params, frames / params.sample_rate)) * params.volume
+    block[frames >= params.n_frames] = 0.0
+    return block.astype(dtype, copy=False)
+
+
+def regenerate_sweep(params: SweepParameters, start: float = 0.0, stop: Optional[float] = None
+                     ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rebuild (part of) a stored sweep for analysis.
+
+    Args:
+        params (SweepParameters): The sweep.
+        start (float, optional): First second to generate. Defaults to 0.
+        stop (Optional[float]): Last second to generate. Defaults to the end of the sweep.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The waveform (float64) and its times in seconds.
+    """
+    first = int(start * params.sample_rate)
+    last = params.n_frames if stop is None else min(int(stop * params.sample_rate), params.n_frames)
+    waveform = chirp_block(params, first, max(last - first, 0), dtype=np.float64)
+    return waveform, (first + np.arange(len(waveform))) / params.sample_rate
+
+
+def save_sweep_parameters(run_dir: str, params: SweepParameters, **extra) -> str:
+    """
+    Write the sweep parameters next to the data files of a run.
+
+    Args:
+        run_dir (str): Directory of the run.
+        params (SweepParameters): The sweep.
+        **extra: Further JSON-serializable values to store with them.
+
+    Returns:
+        str: Path of the written JSON file.
+    """
+    path = os.path.join(run_dir, SWEEP_FILE)
+    with open(path, 'w') as f:
+        json.dump(dict(params.to_dict(), **extra), f, indent=2)
+    return path
+
+
+def load_sweep_playback(run_dir: str) -> Optional[dict]:
+    """
+    Read the playback timing stored with a run by `SweepPlayer.timing`.
+
+    Returns:
+        Optional[dict]: The timing, or None for runs without it.
+    """
+    path = os.path.join(run_dir, SWEEP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f).get("playback")
+
+
+def playback_on_sample_index(playback: dict, clock) -> dict:
+    """
+    Move playback timing from the run clock onto index-based accelerometer timestamps.
+
+    FIFO captures are stamped k / nominal ODR, so they start at 0 however long
+    the first burst took to arrive, and run at the nominal rate rather than the
+    real one. The sample clock fitted to the burst arrivals gives sample k at
+    offset + k / effective_rate on the run clock; this maps the sweep start and
+    DAC rate through it so `excitation_frequency` works on the stored timestamps.
+
+    Args:
+        playback (dict): Timing from `SweepPlayer.timing`, on the run clock.
+        clock (SampleClock): Sample clock of the capture.
+
+    Returns:
+        dict: The timing with start_time and dac_rate on the sample-index time base. The run-clock values and
+              the clock offset are kept as run_clock_start_time, run_clock_dac_rate and accelerometer_offset.
+    """
+    scale = clock.effective_rate / clock.nominal_rate
+    return dict(
+        playback,
+        start_time=(playback["start_time"] - clock.offset) * scale,
+        dac_rate=playback["dac_rate"] / scale,
+        time_base='sample_index',
+        run_clock_start_time=playback["start_time"],
+        run_clock_dac_rate=playback["dac_rate"],
+        accelerometer_offset=clock.offset,
+    )
+
+
+def excitation_frequency(params: SweepParameters, playback: dict, timestamps: np.ndarray) -> np.ndarray:
+    """
+    Instantaneous excitation frequency at each accelerometer timestamp.
+
+    Args:
+        params (SweepParameters): The sweep.
+        playback (dict): Timing from `SweepPlayer.timing` / `load_sweep_playback`.
+        timestamps (np.ndarray): Accelerometer sample times in seconds, on the time base the playback
+            timing was stored for (see `playback_on_sample_index`).
+
+    Returns:
+        np.ndarray: Frequency in Hz, NaN where no sweep was playing.
+    """
+    # Sweep time of each sample, corrected for the real DAC rate
+    t = (np.asarray(timestamps) - playback["start_time"]) * playback["dac_rate"] / params.sample_rate
+    frequency = sweep_frequency(params, t)
+    return np.where((t >= 0) & (t <= params.duration), frequency, np.nan)
+
+
+def load_sweep_parameters(run_dir: str) -> Optional[SweepParameters]:
+    """
+    Read the sweep parameters of a run.
+
+    Returns:
+        Optional[SweepParameters]: The sweep, or None if the run has no `sweep.json`.
+    """
+    path = os.path.join(run_dir, SWEEP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        values = json.load(f)
+    keys = ('start_freq', 'end_freq', 'duration', 'sample_rate', 'volume', 'method')
+    return SweepParameters(**{key: values[key] for key in keys if key in values})
+
+
+class SweepPlayer:
+    """
+    Plays a sweep through a sounddevice OutputStream whose callback generates each block on demand.
+
+    Args:
+        params (SweepParameters): The sweep to play.
+        blocksize (int, optional): Frames per callback; 0 lets PortAudio choose. Defaults to 0.
+        device (optional): Output device passed to sounddevice. Defaults to the system default.
+    """
+
+    def __init__(self, params: SweepParameters, blocksize: int = 0, device=None):
+        self.params = params
+        self.blocksize = blocksize
+        self.device = device
+        self.frame = 0
+        self.underflows = 0
+        self._finished = threading.Event()
+        self._stream = None
+        self._stop = None
+        self.latency = 0.0  # Nominal output latency of the stream in seconds, kept after it is closed
+        # One entry per callback: host monotonic ns, stream currentTime, outputBufferDacTime, first frame
+        self._callback_times = []
+
+    def _callback(self, outdata, frames, time_info, status) -> None:
+        self._callback_times.append((time.monotonic_ns(), time_info.currentTime, time_info.outputBufferDacTime, self.frame))
+        if status.output_underflow:
+            self.underflows += 1
+        outdata[:, 0] = chirp_block(self.params, self.frame, frames)
+        self.frame += frames
+        if self.frame >= self.params.n_frames:
+            raise self._stop
+
+    def start(self) -> None:
+        """Open the output stream and start playing."""
+        import sounddevice as sd
+
+        self._stop = sd.CallbackStop
+        self.frame = 0
+        self._callback_times = []
+        self._finished.clear()
+        self._stream = sd.OutputStream(samplerate=self.params.sample_rate, channels=1, dtype='float32',
+                                       blocksize=self.blocksize, device=self.device, callback=self._callback,
+                                       finished_callback=self._finished.set)
+        self.latency = float(self._stream.latency)
+        self._stream.start()
+
+    def wait(self) -> None:
+        """Block until the whole sweep has been played, then close the stream."""
+        self._finished.wait()
+        self._stream.close()
+        if self.underflows:
+            print(f"Warning: {self.underflows} audio output underflows during the sweep.")
+
+    def play(self) -> None:
+        """Play the whole sweep and return when it has finished."""
+        self.start()
+        self.wait()
+
+    def timing(self, start_ns: int) -> Optional[dict]:
+        """
+        When the sweep actually reached the DAC, on the accelerometer's run clock.
+
+        PortAudio reports, per callback, the stream time now and the stream time
+        at which the block's first frame will be played. The smallest difference
+        between the host monotonic clock and the stream clock over all callbacks
+        (i.e. the callback that ran with the least scheduling delay) maps stream
+        time onto monotonic time. A line fitted through the DAC times of all
+        blocks then gives the sweep start and the real DAC rate.
+
+        Args:
+            start_ns (int): Start of the accelerometer capture in monotonic ns; its timestamps are relative to it.
+
+        Returns:
+            Optional[dict]: start_time (s on the run clock at which frame 0 was played), dac_rate (Hz),
+                            output_latency (s), stream_offset (s), n_callbacks and the residual std of the fit,
+                            or None if nothing was played.
+        """
+        if not self._callback_times:
+            return None
+        host_ns, current, dac, frames = (np.array(column, dtype=np.float64) for column in zip(*self._callback_times))
+        host = (host_ns - start_ns) * 1e-9
+        if np.any(dac > 0):
+            stream_offset = float(np.min(host - current))
+            output_latency = float(np.median(dac - current))
+            dac_times = dac + stream_offset
+        else:
+            # Host APIs without stream timestamps report zeros; fall back to the nominal latency
+            stream_offset = None
+            output_latency = self.latency
+            dac_times = host + output_latency
+        clock = fit_sample_clock(dac_times, frames, self.params.sample_rate, source='dac')
+        return {
+            "start_time": clock.offset,
+            "dac_rate": clock.effective_rate,
+            "output_latency": output_latency,
+            "stream_offset": stream_offset,
+            "n_callbacks": len(frames),
+            "residual_std": clock.residual_std,
+            "underflows": self.underflows,
+        }
@@ -0,0 +1,154 @@
+#telemetry.py
+
+"""
+Rate-limited status reporting for acquisition loops.
+
+The sampling loop only updates a few counters in `AcquisitionStats`; a
+separate low-priority `TelemetryReporter` thread reads them a few times a
+second and prints a one-line status, so no console I/O happens per sample.
+"""
+
+import os
+import sys
+import threading
+from typing import Optional
+
+
+class AcquisitionStats:
+    """
+    Counters shared between the sampling loop and the telemetry thread.
+
+    `record` and `error` are cheap enough to call once per sample. The
+    interval sums are reset at every `snapshot`, so the reported rate and
+    jitter describe the last reporting window only.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_timestamp = None
+        self._window_n = 0
+        self._window_sum = 0.0
+        self._window_sumsq = 0.0
+
+    def record(self, timestamp: float) -> None:
+        """
+        Count one sample taken at `timestamp` seconds.
+
+        Args:
+            timestamp (float): Sample time in seconds on any monotonic clock.
+        """
+        if self.last_timestamp is not None:
+            interval = timestamp - self.last_timestamp
+            self._window_n += 1
+            self._window_sum += interval
+            self._window_sumsq += interval * interval
+        self.last_timestamp = timestamp
+        self.count += 1
+
+    def record_block(self, n_samples: int, timestamp: float) -> None:
+        """
+        Count a block of `n_samples` samples delivered at once (e.g. a FIFO burst).
+
+        Args:
+            n_samples (int): Number of samples in the block.
+            timestamp (float): Time of the last sample in the block in seconds.
+        """
+        if self.last_timestamp is not None and n_samples:
+            interval = (timestamp - self.last_timestamp) / n_samples
+            self._window_n += n_samples
+            self._window_sum += interval * n_samples
+            self._window_sumsq += interval * interval * n_samples
+        self.last_timestamp = timestamp
+        self.count += n_samples
+
+    def error(self, exc: Exception) -> None:
+        """Count a failed read and keep the exception for the next status line."""
+        self.errors += 1
+        self.last_error = exc
+
+    def snapshot(self) -> dict:
+        """
+        Read the current state and start a new reporting window.
+
+        Returns:
+            dict: count, errors, rate (Hz) and jitter (standard deviation of the interval in µs)
+                  over the window since the previous snapshot.
+        """
+        n, total, total_sq = self._window_n, self._window_sum, self._window_sumsq
+        self._window_n, self._window_sum, self._window_sumsq = 0, 0.0, 0.0
+
+        rate = n / total if total > 0 else 0.0
+        jitter_us = 0.0
+        if n > 1:
+            mean = total / n
+            jitter_us = max(total_sq / n - mean * mean, 0.0) ** 0.5 * 1e6
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rate": rate,
+            "jitter_us": jitter_us,
+        }
+
+
+class TelemetryReporter(threading.Thread):
+    """
+    Daemon thread that prints a one-line acquisition status at a fixed interval.
+
+    Args:
+        stats (AcquisitionStats): Counters updated by the sampling loop.
+        interval (float, optional): Seconds between status lines. None or 0 disables output. Defaults to 0.5.
+        stream: File object to write to. Defaults to sys.stdout.
+    """
+
+    def __init__(self, stats: AcquisitionStats, interval: Optional[float] = 0.5, stream=None):
+        super().__init__(daemon=True)
+        self.stats = stats
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        if not self.interval:
+            return
+        try:
+            # Lowest CPU priority for this thread only; Linux applies setpriority per thread id
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        while not self._stop_event.wait(self.interval):
+            self._print_status()
+
+    def _print_status(self) -> None:
+        snap = self.stats.snapshot()
+        line = (f"Samples: {snap['count']}, Rate: {snap['rate']:.1f} Hz, "
+                f"Jitter: {snap['jitter_us']:.1f} us, Errors: {snap['errors']}")
+        if self.stats.last_error is not None:
+            line += f" (last: {self.stats.last_error})"
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def stop(self) -> None:
+        """Stop the thread and print a final status line."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+            self._print_status()
+
+
+def start_telemetry(interval: Optional[float] = 0.5) -> tuple[AcquisitionStats, TelemetryReporter]:
+    """
+    Create the shared counters and start a reporter thread for them.
+
+    Args:
+        interval (float, optional): Seconds between status lines. None or 0 keeps the console silent.
+
+    Returns:
+        tuple[AcquisitionStats, TelemetryReporter]: The counters to update and the running reporter.
+    """
+    stats = AcquisitionStats()
+    reporter = TelemetryReporter(stats, interval)
+    reporter.start()
+    return stats, reporter
@@ -0,0 +1,349 @@
+#triggered_capture.py
+
+"""
+Armed capture for impact and free-decay (tap) tests.
+
+While armed, samples only pass through a pre-trigger ring buffer. When the
+acceleration leaves the resting level by more than a threshold, or changes
+faster than a slope limit, the ring contents and everything after the
+trigger are kept until a post-trigger length has passed or the response has
+decayed back to the noise floor. Only that event is saved, so there is no
+need to crop everything before the largest peak afterwards, and repeated
+taps can be recorded back to back as separate events.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+from adxl357 import (REG_ZDATA3, SCALE_FACTORS, XYZ_DATA_BYTES, FifoSampleCounter, FilterSettings, collect_fifo_blocks,
+                     configure_adxl357, decode_raw_counts, decode_raw_to_g, decode_xyz_raw_to_g, read_xyz_raw,
+                     wait_data_ready)
+from capture_buffer import CaptureBuffer, RingBuffer
+from device_discovery import find_address
+from i2c_bus import open_bus
+from run_format import save_run
+from sample_clock import SAMPLE_CLOCK_FILE, SampleClock, fit_sample_clock, save_sample_clock
+from sample_pacer import DeadlinePacer
+from telemetry import start_telemetry
+
+I2C_ADDRESS = 0x1D
+TRIGGER_FILE = 'trigger.json'
+CHECK_INTERVAL = 0.005  # Seconds of polled samples evaluated together
+
+ARMED, TRIGGERED, DONE = 'armed', 'triggered', 'done'
+
+
+class TriggeredRecorder:
+    """
+    Trigger detection and event buffering, fed with blocks of raw samples.
+
+    The resting level and noise floor are measured over the first
+    `calibration` seconds after arming; the trigger cannot fire before that.
+
+    Args:
+        rate_hz (float): Sample rate in Hz.
+        raw_bytes (int): Bytes per raw sample.
+        to_g (Callable): Converts a (k, raw_bytes) uint8 block to the (k,) acceleration in g the trigger watches.
+        pre_trigger (float, optional): Seconds kept before the trigger. Defaults to 0.5.
+        post_trigger (float, optional): Maximum seconds kept after the trigger. Defaults to 5.0.
+        level_g (Optional[float]): Trigger when |a - resting level| reaches this many g. Defaults to None.
+        slope_g_per_s (Optional[float]): Trigger when |da/dt| reaches this many g/s. Defaults to None.
+        decay_factor (Optional[float]): Stop early once the RMS over `decay_window` falls to this multiple
+                                        of the noise floor. None records the full post-trigger length.
+                                        Defaults to None.
+        decay_window (float, optional): Window of the decay RMS in seconds. Defaults to 0.1.
+        calibration (float, optional): Seconds used to measure the resting level and noise floor. Defaults to 0.5.
+    """
+
+    def __init__(self, rate_hz: float, raw_bytes: int, to_g: Callable[[np.ndarray], np.ndarray],
+                 pre_trigger: float = 0.5, post_trigger: float = 5.0, level_g: Optional[float] = None,
+                 slope_g_per_s: Optional[float] = None, decay_factor: Optional[float] = None,
+                 decay_window: float = 0.1, calibration: float = 0.5):
+        if level_g is None and slope_g_per_s is None:
+            raise ValueError("Set a trigger level (level_g), a slope (slope_g_per_s), or both.")
+        self.rate_hz = rate_hz
+        self.raw_bytes = raw_bytes
+        self.to_g = to_g
+        self.pre_trigger = pre_trigger
+        self.post_trigger = post_trigger
+        self.level_g = level_g
+        self.slope_g_per_s = slope_g_per_s
+        self.decay_factor = decay_factor
+        self.decay_window = decay_window
+
+        self.state = ARMED
+        self.stop_reason = None
+        self.trigger_time = None
+        self.trigger_kind = None
+        self.baseline_g = None
+        self.noise_g = None
+        self.peak_g = 0.0
+        self.record = None
+        self._ring = RingBuffer(pre_trigger * rate_hz + 1, channels=raw_bytes, dtype=np.uint8)
+        self._calibration = RingBuffer(calibration * rate_hz, dtype=np.float64)
+        self._decay = RingBuffer(decay_window * rate_hz, dtype=np.float64)
+        self._last_g = None
+
+    @property
+    def triggered(self) -> bool:
+        return self.state != ARMED
+
+    def _find_trigger(self, g: np.ndarray) -> Optional[int]:
+        hits = np.zeros(len(g), dtype=bool)
+        if self.level_g is not None:
+            hits |= np.abs(g - self.baseline_g) >= self.level_g
+        if self.slope_g_per_s is not None:
+            previous = g[0] if self._last_g is None else self._last_g
+            hits |= np.abs(np.diff(g, prepend=previous)) * self.rate_hz >= self.slope_g_per_s
+        if not hits.any():
+            return None
+        index = int(np.argmax(hits))
+        if self.level_g is not None and abs(g[index] - self.baseline_g) >= self.level_g:
+            self.trigger_kind = 'level'
+        else:
+            self.trigger_kind = 'slope'
+        return index
+
+    def feed(self, timestamps: np.ndarray, raw: np.ndarray) -> bool:
+        """
+        Process a block of samples.
+
+        Args:
+            timestamps (np.ndarray): Sample times in seconds, shape (k,).
+            raw (np.ndarray): Raw samples, uint8 of shape (k, raw_bytes).
+
+        Returns:
+            bool: True once the event is complete and no more samples are needed.
+        """
+        if self.state == DONE or not len(timestamps):
+            return self.state == DONE
+        g = self.to_g(raw)
+
+        if self.state == ARMED:
+            if len(self._calibration) < self._calibration.capacity:
+                self._calibration.extend(timestamps, g)
+                self._ring.extend(timestamps, raw)
+                self._last_g = g[-1]
+                if len(self._calibration) == self._calibration.capacity:
+                    resting = self._calibration.values
+                    self.baseline_g, self.noise_g = float(np.mean(resting)), float(np.std(resting))
+                return False
+
+            index = self._find_trigger(g)
+            if index is None:
+                self._ring.extend(timestamps, raw)
+                self._last_g = g[-1]
+                return False
+            self._ring.extend(timestamps[:index], raw[:index])
+            self.trigger_time = float(timestamps[index])
+            self.state = TRIGGERED
+            self.record = CaptureBuffer.for_duration(self.pre_trigger + self.post_trigger, self.rate_hz,
+                                                     channels=self.raw_bytes, dtype=np.uint8)
+            self.record.extend(self._ring.timestamps, self._ring.values)
+            timestamps, raw, g = timestamps[index:], raw[index:], g[index:]
+
+        # Triggered: keep samples up to the end of the post-trigger window
+        keep = int(np.searchsorted(timestamps, self.trigger_time + self.post_trigger))
+        self.record.extend(timestamps[:keep], raw[:keep])
+        deviation = g[:keep] - self.baseline_g
+        if keep:
+            self.peak_g = max(self.peak_g, float(np.max(np.abs(deviation))))
+        if keep < len(timestamps):
+            self.state, self.stop_reason = DONE, 'post_trigger'
+        elif self.decay_factor is not None:
+            self._decay.extend(timestamps[:keep], deviation)
+            settled = timestamps[-1] - self.trigger_time >= self.decay_window
+            if settled and np.sqrt(np.mean(self._decay.values ** 2)) <= self.decay_factor * self.noise_g:
+                self.state, self.stop_reason = DONE, 'decay'
+        return self.state == DONE
+
+    def metadata(self) -> dict:
+        """Trigger settings and what happened, for the run metadata."""
+        return {
+            "trigger_time": self.trigger_time,
+            "trigger_kind": self.trigger_kind,
+            "level_g": self.level_g,
+            "slope_g_per_s": self.slope_g_per_s,
+            "baseline_g": self.baseline_g,
+            "noise_g": self.noise_g,
+            "peak_g": self.peak_g,
+            "pre_trigger": self.pre_trigger,
+            "post_trigger": self.post_trigger,
+            "decay_factor": self.decay_factor,
+            "decay_window": self.decay_window,
+            "stop_reason": self.stop_reason,
+        }
+
+
+def collect_triggered_data(
+        events: int = 1,
+        custom_name: str = 'tap',
+        timeout: float = 60.0,
+        measurement_range: int = 10,
+        pre_trigger: float = 0.5,
+        post_trigger: float = 5.0,
+        level_g: Optional[float] = 0.05,
+        slope_g_per_s: Optional[float] = None,
+        decay_factor: Optional[float] = 3.0,
+        decay_window: float = 0.1,
+        use_fifo: bool = True,
+        three_axis: bool = False,
+        axis: int = 2,
+        sensor_filter: Optional[FilterSettings] = None,
+        compact_format: bool = False,
+        telemetry_interval: Optional[float] = 0.5,
+        i2c_bus=None,
+        address: Optional[int] = None
+    ) -> list[str]:
+    """
+    Arm the ADXL357 and record one or more triggered events into a new run directory.
+
+    Each event is saved as event_<n>.npy ([timestamps, z] or [timestamps, x, y, z] rows, seconds since
+    that event was armed) or event_<n>.npz with `compact_format`. The trigger details of every event
+    are listed in trigger.json, including the FIFO overruns and the estimated number of samples they lost.
+
+    Every event carries a sample clock for analysis: the nominal ODR for FIFO events, whose timestamps
+    are already sample index / ODR, and for polled events a fit of the read times against the pacer
+    tick each read belongs to, so skipped deadlines do not stretch the period. It is stored in the .npz metadata and in trigger.json; for .npy events, the first
+    event's clock is also written to sample_clock.json, which `sample_rate_for` reads.
+
+    Args:
+        events (int, optional): Number of events to record back to back. Defaults to 1.
+        custom_name (str, optional): Appended to the run directory name. Defaults to 'tap'.
+        timeout (float, optional): Seconds to wait for each trigger before giving up. Defaults to 60.
+        measurement_range (int, optional): The measurement range in g (10, 20, or 40). Defaults to 10.
+        pre_trigger (float, optional): Seconds kept before each trigger. Defaults to 0.5.
+        post_trigger (float, optional): Maximum seconds kept after each trigger. Defaults to 5.0.
+        level_g (Optional[float]): Level trigger threshold in g from the resting level. Defaults to 0.05.
+        slope_g_per_s (Optional[float]): Rate-of-change trigger in g/s. Defaults to None.
+        decay_factor (Optional[float]): End an event once its RMS is back within this multiple of the noise
+                                        floor. None always records `post_trigger` seconds. Defaults to 3.
+        decay_window (float, optional): Window of the decay RMS in seconds. Defaults to 0.1.
+        use_fifo (bool, optional): Burst-read the sensor FIFO instead of polling. Defaults to True.
+        three_axis (bool, optional): Record X, Y and Z instead of Z only. Defaults to False.
+        axis (int, optional): Axis the trigger watches in three-axis captures (0=X, 1=Y, 2=Z). Defaults to 2.
+        sensor_filter (Optional[FilterSettings]): ODR and filter corners, e.g. `FilterSettings.for_band(...)`.
+                                                  Defaults to 4000 Hz without high-pass.
+        compact_format (bool, optional): Save compact .npz run files. Defaults to False.
+        telemetry_interval (Optional[float]): Seconds between console status lines. None or 0 is silent. Defaults to 0.5.
+        i2c_bus (optional): Bus to use instead of opening bus 1, e.g. a SimulatedSMBus. Defaults to None.
+        address (Optional[int]): I2C address of the ADXL357. Defaults to the one found by `find_address`.
+
+    Returns:
+        list[str]: Paths of the saved event files; shorter than `events` if a trigger timed out.
+    """
+    bus = i2c_bus or open_bus(1)
+    address = address if address is not None else find_address('adxl357', bus, default=I2C_ADDRESS)
+    sensor_filter = sensor_filter or FilterSettings()
+    rate_hz = sensor_filter.odr_hz
+    configure_adxl357(bus, address, measurement_range, sensor_filter.register)
+    # The first polled reads would otherwise return zeros and inflate the calibrated noise floor
+    wait_data_ready(bus, address)
+
+    if three_axis:
+        raw_bytes = XYZ_DATA_BYTES
+        decode = decode_xyz_raw_to_g
+        to_g = lambda raw: decode_xyz_raw_to_g(raw, measurement_range)[:, axis]
+    else:
+        raw_bytes = 3
+        decode = decode_raw_to_g
+        to_g = lambda raw: decode_raw_to_g(raw, measurement_range)
+
+    run_time = datetime.now().strftime(f'%m-%d_%H-%M-%S_{custom_name}')
+    os.makedirs(run_time, exist_ok=True)
+    stats, reporter = start_telemetry(telemetry_interval)
+    saved, summary = [], []
+
+    try:
+        for event in range(1, events + 1):
+            recorder = TriggeredRecorder(rate_hz, raw_bytes, to_g, pre_trigger, post_trigger, level_g, slope_g_per_s,
+                                         decay_factor, decay_window)
+            print(f"Event {event}/{events}: armed, waiting for a trigger...")
+            if use_fifo:
+                # Index / ODR timestamps that skip the samples lost in overruns, so later samples
+                # (and the trigger) are not stamped early
+                counter = FifoSampleCounter(rate_hz, on_overrun=stats.error)
+                blocks = collect_fifo_blocks(bus, address, timeout + post_trigger, rate_hz,
+                                             on_overrun=counter.overrun)
+                for block in blocks:
+                    arrival_ns = time.monotonic_ns()
+                    timestamps = counter.timestamps(len(block), arrival_ns)
+                    stats.record_block(len(block), arrival_ns * 1e-9)
+                    raw = block.reshape(len(block), -1) if three_axis else block[:, 2]
+                    if recorder.feed(timestamps, raw) or (not recorder.triggered and timestamps[-1] >= timeout):
+                        break
+            else:
+                block_n = max(int(rate_hz * CHECK_INTERVAL), 1)
+                timestamps = np.empty(block_n, dtype=np.float64)
+                raw = np.empty((block_n, raw_bytes), dtype=np.uint8)
+                read = (lambda: read_xyz_raw(bus, address)) if three_axis else \
+                    (lambda: bus.read_i2c_block_data(address, REG_ZDATA3, 3))
+                reads = CaptureBuffer.for_duration(timeout + post_trigger, rate_hz, dtype=np.int64)
+                pacer = DeadlinePacer(rate_hz)
+                start_ns = pacer.start()
+                i = 0
+                while recorder.triggered or pacer.elapsed() < timeout:
+                    tick = pacer.wait()
+                    try:
+                        raw[i] = read()
+                    except OSError as e:
+                        stats.error(e)
+                        continue
+                    timestamps[i] = (time.monotonic_ns() - start_ns) * 1e-9
+                    reads.append(timestamps[i], tick)
+                    stats.record(timestamps[i])
+                    i += 1
+                    if i == block_n:
+                        i = 0
+                        if recorder.feed(timestamps, raw):
+                            break
+
+            if not recorder.triggered:
+                print(f"Event {event}: no trigger within {timeout} s.")
+                break
+            meta = recorder.metadata()
+            if use_fifo:
+                meta.update(fifo_overruns=counter.overruns, fifo_lost_samples=counter.lost)
+            print(f"Event {event}: {meta['trigger_kind']} trigger at {meta['trigger_time']:.4f} s, "
+                  f"peak {meta['peak_g']:.4f} g, {len(recorder.record)} samples, stopped by {meta['stop_reason']}")
+
+            record = recorder.record
+            if use_fifo:
+                clock = SampleClock(rate_hz, rate_hz, float(record.timestamps[0]), source='fifo')
+            else:
+                clock = fit_sample_clock(reads.timestamps, reads.values, rate_hz)
+            meta["sample_clock"] = clock.to_dict()
+            if compact_format:
+                counts = decode_raw_counts(record.values.reshape(len(record), -1, 3))
+                file_path = save_run(os.path.join(run_time, f'event_{event:03d}.npz'),
+                                     counts if three_axis else counts[:, 0], SCALE_FACTORS[measurement_range],
+                                     rate_hz, measurement_range, timestamps=record.timestamps, notes=custom_name,
+                                     trigger=meta, sample_clock=meta["sample_clock"],
+                                     sensor_filter=sensor_filter.to_dict())
+            else:
+                values = np.reshape(decode(record.values, measurement_range), (len(record), -1))
+                file_path = os.path.join(run_time, f'event_{event:03d}.npy')
+                np.save(file_path, np.vstack([record.timestamps, values.T]))
+                if not os.path.exists(os.path.join(run_time, SAMPLE_CLOCK_FILE)):
+                    save_sample_clock(run_time, clock)
+            saved.append(file_path)
+            summary.append(dict(meta, file=os.path.basename(file_path)))
+    except KeyboardInterrupt:
+        print("Triggered capture interrupted.")
+    reporter.stop()
+
+    with open(os.path.join(run_time, TRIGGER_FILE), 'w') as f:
+        json.dump({"odr_hz": rate_hz, "sensor_filter": sensor_filter.to_dict(), "events": summary}, f, indent=2)
+    print(f"{len(saved)} event(s) saved to directory: {run_time}")
+    return saved
+
+
+if __name__ == "__main__":
+    # Five taps on the beam, each kept from 0.2 s before the hit until it has rung down
+    paths = collect_triggered_data(events=5, pre_trigger=0.2, post_trigger=10.0, level_g=0.05, decay_factor=3.0)
+    print(f"Events saved at: {paths}")